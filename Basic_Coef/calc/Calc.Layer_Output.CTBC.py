@@ -6,14 +6,18 @@ Output shapefiles for CTBC EUI prediction
 
 import pandas as pd
 import geopandas as gpd
-import os
+import sys
 
-def Get_Shapefile(Spacial_Area='Merge'):
+sys.path.append('../..')
+from Common.Geometry import Read_Level
+from Common.Reader import Read_Table
+from Common.Output import Get_Output_Format, Get_Output_Profile, Output_Layer
+from Common.Profiler import Profile_Stages
 
-	# Read shapefile: Building America and IECC Climate Zones by U.S. County Boundaries
-	gdf = gpd.read_file('../data/Shapefile/world-administrative-boundaries/world-administrative-boundaries.shp')
+def Get_Shapefile(Spacial_Area='Merge', Tolerance=0):
 
-	# Remove unnecessary columns
+	# Read shapefile (simplified at the tolerance, from the geometry pyramid), only the necessary columns
+	gdf = Read_Level('../data/Shapefile/world-administrative-boundaries/world-administrative-boundaries.shp', 'World', Tolerance=Tolerance, Columns=['name', 'iso_3166_1_'])
 	gdf = gdf[['name', 'iso_3166_1_', 'geometry']].rename(columns={'iso3': 'ISO_3', 'iso_3166_1_': 'ISO_2'})
 	
 	if (Spacial_Area == 'Merge'):
@@ -49,8 +53,8 @@ def Get_Shapefile(Spacial_Area='Merge'):
 def Get_EUI():
 
 	# Get CTBC space-class and collateral-class data
-	df_Mapping_SpaceClass      = pd.read_csv('../data/EEWH_EUI/Mapping.CTBC.Space.Mean.csv')[['空間代號', 'EUI_Mean']]
-	df_Mapping_CollateralClass = pd.read_csv('../data/EEWH_EUI/Mapping.CTBC.Collateral.Mean.csv')[['擔保品細項', 'EUI_Mean']]
+	df_Mapping_SpaceClass      = Read_Table('../data/EEWH_EUI/Mapping.CTBC.Space.Mean.csv', Columns=['空間代號', 'EUI_Mean'])[['空間代號', 'EUI_Mean']]
+	df_Mapping_CollateralClass = Read_Table('../data/EEWH_EUI/Mapping.CTBC.Collateral.Mean.csv', Columns=['擔保品細項', 'EUI_Mean'])[['擔保品細項', 'EUI_Mean']]
 
 	df_Mapping_CollateralClass['擔保品細項'] = df_Mapping_CollateralClass['擔保品細項'].astype(int).astype(str).str.zfill(2)
 
@@ -83,28 +87,34 @@ def Mapping_EUI(gdf_Country, df_EUI, df_Coef_CIE):
 	gdf_Country = gdf_Country.reset_index()
 
 	# Mapping data
-	# Merge all columns in df_EUI to gdf_Country
-	gdf_Country[list(df_EUI.columns)] = df_EUI.loc[df_EUI.index.repeat(len(gdf_Country))].reset_index(drop=True)
+	# Broadcast the single row of df_EUI to all countries (without building a repeated copy of the table)
+	gdf_Country = gdf_Country.assign(**df_EUI.iloc[0])
 
 	# Remove unnecessary columns
 	gdf_Country = gdf_Country.drop(columns=['ISO_2'])
 
 	return gdf_Country
 
-def Output_Shapefile(gdf, Output_Path, Output_Name):
-
-	# Set output path
-	if not os.path.exists(Output_Path):	os.makedirs(Output_Path)
+def Output_Shapefile(gdf, Output_Path, Output_Name, Output_Format='Shapefile', Output_Profile=False):
 
 	# Round the number columns to 1 digits
 	gdf = gdf.round(1)
 
-	gdf.to_file(Output_Path + Output_Name, encoding='utf-8')
+	# Output in the selected format (Shapefile, GeoParquet or FlatGeobuf)
+	# With the profile table, the EUI columns are written once per distinct profile instead of once per polygon
+	Output_Layer(gdf, Output_Path, Output_Name, Output_Format=Output_Format, Profile_Columns=([i for i in gdf.columns if i.startswith(('EUI_', 'Lower_', 'Upper_'))] if (Output_Profile) else None))
 
 	return
 
 if (__name__ == '__main__'):
 
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
+
+	# Get the output format (and whether to output the profile table) selected in Config.json
+	Output_Format = Get_Output_Format()
+	Output_Profile = Get_Output_Profile()
+
 	# Get shapefile
 	gdf_Country = Get_Shapefile()
 
@@ -118,9 +128,11 @@ if (__name__ == '__main__'):
 	gdf_Country = Mapping_EUI(gdf_Country, df_EUI, df_Coef_CIE)
 
 	# ==================================================================================================
-	# Output geopandas dataframe to shape file
+	# Output geopandas dataframe to shape file (or the output format selected in Config.json)
 	Output_Shapefile(\
 		gdf_Country, \
 		'../output/output_result/Shapefile/EUI.Prediction.CTBC.Global/', \
 		'EUI.Prediction.CTBC.Global.Basic_Coef.shp', \
+		Output_Format=Output_Format, \
+		Output_Profile=Output_Profile, \
 	)
\ No newline at end of file
@@ -0,0 +1,287 @@
+"""
+calc.Benchmark.py
+=================
+Benchmark the stages on synthetic data of increasing size (generated by Common/Synthetic.py):
+(1) JP: Read_Data (Get_Data), Calc_Group, Mapping_to_SpaceClass, Mapping_to_CollateralClass, Mapping_EUI,
+(2) US: Calc_NormalizedEUI, Calc_Adjusted, Mapping_to_SpaceClass, Mapping_to_CollateralClass, Mapping_EUI,
+(3) Basic_Coef: Mapping_EUI, and Layer_Output: Combine_Shapefile.
+The wall time (the best of n_Repeat runs) and the peak memory (allocations traced by tracemalloc) of each stage and size
+are appended to a history file with the commit of the tree, and compared with the previous commit to show the regressions.
+"""
+
+import pandas as pd
+import numpy as np
+import subprocess
+import tracemalloc
+import tempfile
+import datetime
+import time
+import gc
+import os
+import sys
+
+sys.path.append('../..')
+from Common import Synthetic
+from Common.Script import Load_Script
+
+def Get_Stages():
+
+	"""
+	Get the benchmarked stages.
+	==================================================================================================
+	Output:
+
+		Dict_Stage: The size type ("Row" or "Polygon") and the setup function of each stage.
+			The setup function takes the size and a temporary directory, and returns the function and its arguments.
+	"""
+
+	JP_DECC    = Load_Script('../../JP/calc/calc.DECC.py', Prefix='Benchmark')
+	JP_Mapping = Load_Script('../../JP/calc/calc.Mapping.CTBC.py', Prefix='Benchmark')
+	JP_Layer   = Load_Script('../../JP/calc/Calc.Layer_Output.CTBC.py', Prefix='Benchmark')
+	US_EUI     = Load_Script('../../US/calc/calc.EUI.ClimateAdjusted.py', Prefix='Benchmark')
+	US_Mapping = Load_Script('../../US/calc/calc.Mapping.CTBC.py', Prefix='Benchmark')
+	US_Layer   = Load_Script('../../US/calc/Calc.Layer_Output.CTBC.py', Prefix='Benchmark')
+	Basic      = Load_Script('../../Basic_Coef/calc/Calc.Layer_Output.CTBC.py', Prefix='Benchmark')
+	Merge      = Load_Script('../../Layer_Output/calc/calc.Layer_Output.Merge.py', Prefix='Benchmark')
+
+	List_Country = ['JP', 'US'] + [i + j for i in 'ABCDEFGHIKLMNOPRSTVZ' for j in 'ABCDEFGHIJ']
+
+	def Setup_Read_Data(n, Temp_Path):
+
+		File_Path = os.path.join(Temp_Path, 'DECC.{}.csv'.format(n))
+		Synthetic.Get_DECC(n).to_csv(File_Path, encoding='shift_jisx0213', index=False)
+
+		return JP_DECC.Read_Data, (File_Path,)
+
+	def Setup_Calc_Group(n, Temp_Path):
+
+		return JP_DECC.Calc_Group, (JP_DECC.Clean_Data(Synthetic.Get_DECC(n)),)
+
+	def Setup_Calc_NormalizedEUI(n, Temp_Path):
+
+		return US_EUI.Calc_NormalizedEUI, (Synthetic.Get_ClimateStatistical(n),)
+
+	def Setup_Calc_Adjusted(n, Temp_Path):
+
+		df_Factor = US_EUI.Calc_Factor(US_EUI.Calc_NormalizedEUI(Synthetic.Get_ClimateStatistical(2 * len(Synthetic.List_Zone))))
+
+		return US_EUI.Calc_Adjusted, (Synthetic.Get_EnergyStar(n), df_Factor.loc['2010'])
+
+	def Setup_Mapping(Module, List_Region, Label_Columns, Is_Collateral):
+
+		def Setup(n, Temp_Path):
+
+			df_Source, df_Mapping_SpaceClass, df_Mapping_CollateralClass = Synthetic.Get_Mapping(n, List_Region, Label_Columns)
+
+			if not (Is_Collateral): return Module.Mapping_to_SpaceClass, (df_Mapping_SpaceClass, df_Source)
+
+			return Module.Mapping_to_CollateralClass, (df_Mapping_CollateralClass, Module.Mapping_to_SpaceClass(df_Mapping_SpaceClass, df_Source))
+
+		return Setup
+
+	def Setup_Basic_Mapping_EUI(n, Temp_Path):
+
+		gdf_Country = Synthetic.Get_Layer(n, {'REGNAME': 'Country', 'ISO_2': List_Country})
+		gdf_Country['COUNTRY'] = gdf_Country['ISO_2'] + '-' + gdf_Country['REGNAME']
+		df_Coef_CIE = pd.DataFrame({'國家/地區代號': List_Country, '電力排碳係數_公斤CO2e/度': np.linspace(0.1, 0.9, len(List_Country))})
+
+		return Basic.Mapping_EUI, (gdf_Country, Synthetic.Get_Group_EUI(['Mean']).reset_index(drop=True), df_Coef_CIE)
+
+	def Setup_JP_Mapping_EUI(n, Temp_Path):
+
+		return JP_Layer.Mapping_EUI, (Synthetic.Get_Layer(n, {'COUNTRY': 'JP-日本', 'REGNAME': Synthetic.List_Prefecture}), Synthetic.Get_Group_EUI(Synthetic.List_JP_Region))
+
+	def Setup_US_Mapping_EUI(n, Temp_Path):
+
+		return US_Layer.Mapping_EUI, (Synthetic.Get_Layer(n, {'COUNTRY': 'US-美國', 'REGNAME': 'County', 'CLIMATEZONE': Synthetic.List_ClimateZone}), Synthetic.Get_Group_EUI(Synthetic.List_US_Region))
+
+	def Setup_Combine_Shapefile(n, Temp_Path):
+
+		# The layer of basic CIE coef method (n polygons), and the layers of country EUI method (n/10 polygons each)
+		df_EUI = Synthetic.Get_Group_EUI(['Mean'])
+
+		gdf_BasicCIE = Synthetic.Get_Layer(n, {'COUNTRY': [i + '-Country' for i in List_Country], 'REGNAME': 'Country', 'Coef_CIE': np.linspace(0.1, 0.9, n)})
+		gdf_BasicCIE = gdf_BasicCIE.join(df_EUI.loc[df_EUI.index.repeat(n)].set_axis(gdf_BasicCIE.index))
+		gdf_BasicCIE = gdf_BasicCIE[['COUNTRY', 'REGNAME', 'Coef_CIE'] + list(df_EUI.columns) + ['geometry']]
+
+		gdf_CountryEUI = {}
+		for i_Country in ['JP', 'US']:
+			gdf = Synthetic.Get_Layer(max(1, n // 10), {'COUNTRY': i_Country + '-Country', 'REGNAME': 'Region'})
+			gdf_CountryEUI[i_Country] = gdf.join(df_EUI.loc[df_EUI.index.repeat(len(gdf))].set_axis(gdf.index))
+
+		return Merge.Combine_Shapefile, (gdf_BasicCIE, gdf_CountryEUI)
+
+	return {\
+		'JP.Read_Data': ('Row', Setup_Read_Data), \
+		'JP.Calc_Group': ('Row', Setup_Calc_Group), \
+		'US.Calc_NormalizedEUI': ('Row', Setup_Calc_NormalizedEUI), \
+		'US.Calc_Adjusted': ('Row', Setup_Calc_Adjusted), \
+		'JP.Mapping_to_SpaceClass': ('Row', Setup_Mapping(JP_Mapping, Synthetic.List_JP_Region, ['建物用途'], False)), \
+		'JP.Mapping_to_CollateralClass': ('Row', Setup_Mapping(JP_Mapping, Synthetic.List_JP_Region, ['建物用途'], True)), \
+		'US.Mapping_to_SpaceClass': ('Row', Setup_Mapping(US_Mapping, Synthetic.List_US_Region, ['建物分類', '建物用途'], False)), \
+		'US.Mapping_to_CollateralClass': ('Row', Setup_Mapping(US_Mapping, Synthetic.List_US_Region, ['建物分類', '建物用途'], True)), \
+		'Basic_Coef.Mapping_EUI': ('Polygon', Setup_Basic_Mapping_EUI), \
+		'JP.Mapping_EUI': ('Polygon', Setup_JP_Mapping_EUI), \
+		'US.Mapping_EUI': ('Polygon', Setup_US_Mapping_EUI), \
+		'Layer_Output.Combine_Shapefile': ('Polygon', Setup_Combine_Shapefile), \
+	}
+
+def Copy_Args(Args):
+
+	"""
+	Copy the dataframes of the arguments (some stages modify their input), so that every run starts from the same input.
+	"""
+
+	return tuple(\
+		i.copy() if isinstance(i, pd.DataFrame) else \
+		{j: k.copy() for j, k in i.items()} if isinstance(i, dict) else \
+		i for i in Args \
+	)
+
+def Measure(Function, Args, n_Repeat=3):
+
+	"""
+	Measure the wall time (the best of n_Repeat runs) and the peak memory (MB, allocations traced during one more run) of a function.
+	"""
+
+	Time = np.inf
+
+	for _ in range(n_Repeat):
+
+		Args_Copy = Copy_Args(Args)
+		gc.collect()
+
+		Time_Start = time.perf_counter()
+		Function(*Args_Copy)
+		Time = min(Time, time.perf_counter() - Time_Start)
+
+		del Args_Copy
+
+	Args_Copy = Copy_Args(Args)
+	gc.collect()
+
+	tracemalloc.start()
+	Memory_Start = tracemalloc.get_traced_memory()[0]
+	Function(*Args_Copy)
+	Memory_Peak = tracemalloc.get_traced_memory()[1] - Memory_Start
+	tracemalloc.stop()
+
+	return Time, Memory_Peak / 1024 ** 2
+
+def Run_Benchmark(Dict_Stage, List_nRow, List_nPolygon, n_Repeat=3):
+
+	"""
+	Run the stages over the size sweeps.
+	==================================================================================================
+	Input:
+
+		Dict_Stage: The stages (see Get_Stages).
+
+		List_nRow: The sizes (number of rows) of the stages on tables.
+
+		List_nPolygon: The sizes (number of polygons) of the stages on layers.
+
+		n_Repeat: The number of timed runs of each stage and size.
+
+	Output:
+
+		df_Result: The time (s) and peak memory (MB) of each stage and size.
+	"""
+
+	List_Result = []
+
+	with tempfile.TemporaryDirectory() as Temp_Path:
+
+		for i_Stage, (Size_Type, Setup) in Dict_Stage.items():
+
+			for i_Size in (List_nRow if (Size_Type == 'Row') else List_nPolygon):
+
+				Function, Args = Setup(i_Size, Temp_Path)
+				Time, Memory = Measure(Function, Args, n_Repeat=n_Repeat)
+				del Function, Args
+
+				print('[Benchmark] {} ({} {}s): {:.4f}s, {:.1f} MB'.format(i_Stage, i_Size, Size_Type, Time, Memory))
+				List_Result.append({'Stage': i_Stage, 'Size_Type': Size_Type, 'Size': i_Size, 'Time': Time, 'Peak_Memory': Memory})
+
+	return pd.DataFrame(List_Result)
+
+def Get_Commit():
+
+	"""
+	Get the commit of the tree ("-dirty" if there are uncommitted changes), or "unknown" outside a git repository.
+	"""
+
+	try:
+		return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return 'unknown'
+
+def Output_Benchmark(df_Result, Commit, Output_File='../output/output_data/Benchmark.csv'):
+
+	"""
+	Append the results of the run to the history file.
+	==================================================================================================
+	Output:
+
+		df_History: The results of all runs (including this one).
+	"""
+
+	if not os.path.exists(os.path.dirname(Output_File)): os.makedirs(os.path.dirname(Output_File))
+
+	df_Result = df_Result.copy()
+	df_Result.insert(0, 'Date', datetime.datetime.now().isoformat(timespec='seconds'))
+	df_Result.insert(0, 'Commit', Commit)
+
+	df_History = pd.concat([pd.read_csv(Output_File), df_Result], ignore_index=True) if os.path.exists(Output_File) else df_Result
+	df_History.round({'Time': 6, 'Peak_Memory': 3}).to_csv(Output_File + '.tmp', index=False)
+	os.replace(Output_File + '.tmp', Output_File)
+
+	return df_History
+
+def Compare_Benchmark(df_History, Commit, Threshold=1.2):
+
+	"""
+	Compare the latest run of the commit with the latest run of the previous commit, and report the stages slower (or larger) by more than Threshold times.
+	"""
+
+	# The latest run of each commit, and the commit run before this one
+	df_History  = df_History.drop_duplicates(['Commit', 'Stage', 'Size'], keep='last')
+	List_Commit = list(dict.fromkeys(df_History['Commit']))
+	List_Commit = [i for i in List_Commit if (i != Commit)]
+
+	if (len(List_Commit) == 0):
+		print('[Benchmark] No previous commit to compare with')
+		return None
+
+	df_Compare = df_History[df_History['Commit'] == Commit].merge(\
+		df_History[df_History['Commit'] == List_Commit[-1]], \
+		on=['Stage', 'Size'], \
+		suffixes=('', '_Previous'), \
+	)
+	df_Compare['Ratio_Time']   = df_Compare['Time'] / df_Compare['Time_Previous']
+	df_Compare['Ratio_Memory'] = df_Compare['Peak_Memory'] / df_Compare['Peak_Memory_Previous']
+
+	print('[Benchmark] Compared with {}'.format(List_Commit[-1]))
+	for _, i_Row in df_Compare[(df_Compare['Ratio_Time'] > Threshold) | (df_Compare['Ratio_Memory'] > Threshold)].iterrows():
+		print('[Benchmark] Regression {} ({}): time x{:.2f} ({:.4f}s -> {:.4f}s), memory x{:.2f}'.format(i_Row['Stage'], i_Row['Size'], i_Row['Ratio_Time'], i_Row['Time_Previous'], i_Row['Time'], i_Row['Ratio_Memory']))
+
+	return df_Compare
+
+if (__name__ == '__main__'):
+
+	# Set the size sweeps (may be extended, e.g. to 10,000,000 rows and 100,000 polygons)
+	List_nRow     = [1000, 10000, 100000, 1000000]
+	List_nPolygon = [100, 1000, 10000]
+
+	# Set the number of timed runs of each stage and size, and the ratio reported as a regression
+	n_Repeat  = 3
+	Threshold = 1.2
+
+	# Run the benchmark
+	df_Result = Run_Benchmark(Get_Stages(), List_nRow, List_nPolygon, n_Repeat=n_Repeat)
+
+	# ==================================================================================================
+	# Save the results to the history file, and compare with the previous commit
+	Commit     = Get_Commit()
+	df_History = Output_Benchmark(df_Result, Commit)
+	Compare_Benchmark(df_History, Commit, Threshold=Threshold)
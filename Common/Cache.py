@@ -0,0 +1,132 @@
+"""
+Cache.py
+========
+Columnar (Parquet) cache of the cleaned input dataframes.
+Each cache file is keyed by the content hash of the source file, the cleaning parameters and the source of the calc script,
+so it is reused until any of them changes.
+"""
+
+import pandas as pd
+import hashlib
+import inspect
+import json
+import os
+import time
+
+try:
+	import pyarrow
+	Is_Parquet_Available = True
+except ImportError:
+	Is_Parquet_Available = False
+
+def Hash_File(Source_File, Block_Size=1<<20):
+
+	"""
+	Calculate the content hash of files.
+	==================================================================================================
+	Input:
+
+		Source_File: The path (or list of paths) of the files.
+
+		Block_Size: The number of bytes read at a time.
+
+	Output:
+
+		The SHA-256 hex digest of the contents of all files.
+	"""
+
+	if isinstance(Source_File, str): Source_File = [Source_File]
+
+	Hash = hashlib.sha256()
+
+	for i_File in Source_File:
+
+		with open(i_File, 'rb') as f:
+			for Block in iter(lambda: f.read(Block_Size), b''): Hash.update(Block)
+
+	return Hash.hexdigest()
+
+def Get_Key(Parser, Source_File, Params):
+
+	"""
+	Get the cache key of a parser, a source file and the cleaning parameters.
+	"""
+
+	Hash = hashlib.sha256()
+	Hash.update(Hash_File(Source_File).encode())
+	Hash.update(json.dumps(Params, sort_keys=True, default=str, ensure_ascii=False).encode())
+
+	# The source of the calc script (any edit of the cleaning code invalidates the cache)
+	try:
+		Hash.update(inspect.getsource(inspect.getmodule(Parser)).encode())
+	except (OSError, TypeError):
+		Hash.update(Parser.__name__.encode())
+
+	return Hash.hexdigest()[:16]
+
+def Read_Cached(Parser, Source_File, Cache_Name, Cache_Path='../output/output_cache/', **Params):
+
+	"""
+	Get the dataframe returned by Parser(Source_File, **Params), reusing the cached Parquet file if the source is unchanged.
+	The cold (parse) and warm (cache read) time are both reported (the cold time of a warm read only if its timing file is readable).
+	==================================================================================================
+	Input:
+
+		Parser: The function that reads and cleans the source file.
+
+		Source_File: The path of the source file.
+
+		Cache_Name: The name of the cache file.
+
+		Cache_Path: The directory of the cache files.
+
+		Params: The cleaning parameters passed to Parser.
+
+	Output:
+
+		df: The cleaned dataframe.
+	"""
+
+	# Without pyarrow, parse the source file every time
+	if not (Is_Parquet_Available): return Parser(Source_File, **Params)
+
+	Key        = Get_Key(Parser, Source_File, Params)
+	Cache_File = Cache_Path + '{}.{}.parquet'.format(Cache_Name, Key)
+	Time_File  = Cache_Path + '{}.{}.json'.format(Cache_Name, Key)
+
+	if (os.path.exists(Cache_File)):
+
+		Time_Start = time.perf_counter()
+		df = pd.read_parquet(Cache_File)
+		Time_Warm = time.perf_counter() - Time_Start
+
+		# The cold time is reported only if known (the timing file is written after the cache file, and may be missing)
+		try:
+			with open(Time_File, 'r', encoding='utf-8') as f: Time_Cold = float(json.load(f)['Time_Cold'])
+		except (OSError, ValueError, KeyError, TypeError):
+			Time_Cold = None
+
+		if (Time_Cold is None):
+			print('[Cache] {}: warm {:.3f}s'.format(Cache_Name, Time_Warm))
+		else:
+			print('[Cache] {}: warm {:.3f}s (cold {:.3f}s, {:.1f}x faster)'.format(Cache_Name, Time_Warm, Time_Cold, Time_Cold / max(Time_Warm, 1e-9)))
+
+		return df
+
+	Time_Start = time.perf_counter()
+	df = Parser(Source_File, **Params)
+	Time_Cold = time.perf_counter() - Time_Start
+
+	# Remove the out-of-date cache files and save the new one
+	if not os.path.exists(Cache_Path): os.makedirs(Cache_Path)
+	for i_File in os.listdir(Cache_Path):
+		if i_File.startswith(Cache_Name + '.') and (i_File.split('.')[-2] != Key): os.remove(Cache_Path + i_File)
+
+	# Written to a temporary file first, so that an interrupted write never leaves a partial cache file
+	df.to_parquet(Cache_File + '.tmp')
+	os.replace(Cache_File + '.tmp', Cache_File)
+	with open(Time_File, 'w', encoding='utf-8') as f: json.dump({'Source_File': Source_File, 'Time_Cold': Time_Cold}, f)
+
+	print('[Cache] {}: cold {:.3f}s'.format(Cache_Name, Time_Cold))
+
+	return df
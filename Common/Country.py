@@ -0,0 +1,400 @@
+"""
+Country.py
+==========
+Country engine of country EUI method: the stages shared by all countries (the mapping of the source EUI table to CTBC
+space-class and collateral-class, the group EUI, the EUI of each region of the layer, the dissolve and the output),
+with the behaviour of each country supplied by its configuration file Layer_Output/Country/<country code>.json:
+	Country: The country code and name of the layer (COUNTRY column), e.g. "JP-日本".
+	Directory: The directory of the country (its data/, output/ and calc/, relative to the repository root), e.g. "JP".
+	Layer: The boundary layer, {"File", "Cache", "Tolerance", "Columns"} (the columns read, renamed, one of them to REGNAME),
+		or a plugin {"Script", "Function"} (a function of a calc script of the country returning the layer).
+	Source: The source EUI table, {"File"} (建物用途序號, the label columns and the EUI_<region> columns),
+		or a plugin {"Script", "Function"} (a function of a calc script of the country returning the table).
+	Region_Column: The column of the layer keying the region of the source EUI table (e.g. REGNAME, CLIMATEZONE).
+	Region: The region of the source EUI table of each value of Region_Column.
+	Region_Drop: Whether Region_Column is removed from the output layer.
+	Dissolve: The column of the region in the lookup table of the dissolved layer (null: the layer is not dissolved).
+	Mapping_Config: The directory of the mapping configurations.
+The paths are relative to the repository root; the outputs are those of the stages of the country
+(<Directory>/output/output_data/Mapping.CTBC/ and <Directory>/output/output_result/Shapefile/EUI.Prediction.CTBC.Global/).
+"""
+
+import pandas as pd
+import os
+import json
+
+from Common.Mapping import Mapping_Group
+from Common.Geometry import Read_Level, Union_Group
+from Common.Output import Output_Layer
+from Common.Reader import Read_Table
+from Common.Script import Load_Script, In_Directory
+
+# The repository root, and the directory of the configuration files of the countries
+Root_Path           = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '')
+Config_Path_Default = os.path.join(Root_Path, 'Layer_Output', 'Country', '')
+
+# The label of the mean rows, and the key of the source EUI table
+Label_Mean = '全部平均'
+Source_Key = '建物用途序號'
+
+# The calc scripts of the plugins, loaded once per process
+Dict_Module = {}
+
+def List_Country_Config(Config_Path=Config_Path_Default):
+
+	"""
+	Get the countries with a configuration file (the countries of country EUI method run by the country engine).
+	"""
+
+	if not os.path.exists(Config_Path): return []
+
+	return sorted(os.path.splitext(i)[0] for i in os.listdir(Config_Path) if i.endswith('.json'))
+
+def Get_Country_Config(Country, Config_Path=Config_Path_Default):
+
+	"""
+	Get the configuration of a country.
+	==================================================================================================
+	Input:
+
+		Country: The country code, e.g. "JP".
+
+		Config_Path: The directory of the configuration files of the countries.
+
+	Output:
+
+		Config: The configuration of the country (see the keys above), with its country code as "Code".
+	"""
+
+	Config_File = Config_Path + '{}.json'.format(Country)
+	if not os.path.exists(Config_File): raise FileNotFoundError('No configuration of country {} ({})'.format(Country, Config_File))
+
+	with open(Config_File, 'r', encoding='utf-8') as f: Config = json.load(f)
+
+	for i_Key in ['Country', 'Directory', 'Layer', 'Source', 'Region_Column', 'Region', 'Mapping_Config']:
+		if (i_Key not in Config): raise ValueError('No "{}" in the configuration of country {}'.format(i_Key, Country))
+
+	Config['Code'] = Country
+	Config.setdefault('Region_Drop', False)
+	Config.setdefault('Dissolve', None)
+
+	return Config
+
+def Get_Country_Path(Config, Sub_Path=''):
+
+	# A path under the directory of the country
+	return os.path.join(Root_Path, Config['Directory'], Sub_Path)
+
+def Run_Plugin(Config, Plugin, **Params):
+
+	"""
+	Call a plugin of a country: a function of a calc script of the country, run in its calc directory.
+	The scripts are loaded once per process.
+	"""
+
+	Script_Path = Get_Country_Path(Config, 'calc/' + Plugin['Script'])
+	if (Script_Path not in Dict_Module): Dict_Module[Script_Path] = Load_Script(Script_Path, Prefix='Country')
+
+	with In_Directory(os.path.dirname(Script_Path)):
+		return getattr(Dict_Module[Script_Path], Plugin['Function'])(**Params)
+
+def Read_Country_Layer(Config, Tolerance=None):
+
+	"""
+	Read the boundary layer of a country, with its COUNTRY and REGNAME columns.
+	==================================================================================================
+	Input:
+
+		Config: The configuration of the country.
+
+		Tolerance: The simplification tolerance (None: that of the configuration; only for a layer read from a file).
+
+	Output:
+
+		gdf: The layer of the country.
+	"""
+
+	Layer = Config['Layer']
+
+	if ('Script' in Layer): return Run_Plugin(Config, Layer)
+
+	# Simplified at the tolerance (cached in the geometry pyramid of the country), only the configured columns are read
+	gdf = Read_Level(\
+		os.path.join(Root_Path, Layer['File']), \
+		Layer.get('Cache', Config['Code']), \
+		Tolerance=(Layer.get('Tolerance', 0) if (Tolerance is None) else Tolerance), \
+		Columns=list(Layer['Columns']), \
+		Cache_Path=Get_Country_Path(Config, 'output/output_cache/'), \
+	)
+	gdf = gdf[list(Layer['Columns']) + [gdf.geometry.name]].rename(columns=Layer['Columns'])
+
+	# Create COUNTRYNAME (ISO 3166-1 alpha-2 code + country name) column
+	gdf.insert(0, 'COUNTRY', Config['Country'])
+
+	return gdf
+
+def Read_Country_Source(Config):
+
+	"""
+	Read the source EUI table of a country (one row per source building type, one EUI_<region> column per region).
+	"""
+
+	Source = Config['Source']
+
+	if ('Script' in Source): return Run_Plugin(Config, Source)
+
+	df_Source = Read_Table(os.path.join(Root_Path, Source['File']))
+
+	# Convert the columns that contain "EUI" to float
+	EUI_Columns            = df_Source.columns[df_Source.columns.str.contains('EUI')]
+	df_Source[EUI_Columns] = df_Source[EUI_Columns].astype(float)
+
+	return df_Source
+
+def Get_Mapping(Config_Path='../data/Mapping.Config/'):
+
+	"""
+	Get the mapping configurations of CTBC space-class and collateral-class (from the directory of the configuration files).
+	"""
+
+	df_Mapping_SpaceClass      = pd.read_csv(Config_Path + 'Mapping.CTBC.Space.Config.csv')
+	df_Mapping_CollateralClass = pd.read_csv(Config_Path + 'Mapping.CTBC.Collateral.Config.csv')
+
+	return df_Mapping_SpaceClass, df_Mapping_CollateralClass
+
+def Get_Label_Columns(df_Source):
+
+	# The label columns of the source EUI table (e.g. 建物用途, or 建物分類 and 建物用途), other than the key and the EUI columns
+	return [i for i in df_Source.columns if (i != Source_Key) and not (i.startswith('EUI_'))]
+
+def Mapping_to_SpaceClass(df_Mapping, df_Source):
+
+	"""
+	Mapping the source EUI table of a country to CTBC space-class.
+	==================================================================================================
+	Input:
+
+		df_Mapping: The mapping configurations of CTBC space-class.
+
+		df_Source: The source EUI table (e.g. DECC building type mean, or the climate-adjusted EUI).
+
+	Output:
+
+		df_EUI: The source EUI mapped to CTBC space-class (with group-mean).
+	"""
+
+	# Join the source table to the exploded mapping configurations and calculate all group means at once
+	df_EUI = Mapping_Group(df_Mapping, '建築能耗原始分區', df_Source, Source_Key, Get_Label_Columns(df_Source)).round(2)
+
+	# Rearrange columns
+	df_EUI = df_EUI[['空間代號', '使用空間名稱'] + [i for i in df_Source.columns if (i != Source_Key)]]
+
+	return df_EUI
+
+def Mapping_to_CollateralClass(df_Mapping_CollateralClass, df_EUI_SpaceClass):
+
+	# Join the space-class (group-mean rows only) to the exploded mapping configurations and calculate all group means at once
+	df_EUI_SpaceClass = df_EUI_SpaceClass[df_EUI_SpaceClass['建物用途']==Label_Mean]
+	df_EUI_SpaceClass = df_EUI_SpaceClass.drop(columns=[i for i in Get_Label_Columns(df_EUI_SpaceClass) if (i not in ['空間代號', '使用空間名稱'])])
+	df_EUI = Mapping_Group(df_Mapping_CollateralClass, '空間代號', df_EUI_SpaceClass, '空間代號', ['使用空間名稱'], Fill_Empty=False)
+	df_EUI['擔保品細項'] = df_EUI['擔保品細項'].astype(int).astype(str).str.zfill(2)
+	df_EUI['細項名稱'] = df_EUI['細項名稱'].astype(str)
+	df_EUI = df_EUI.round(2)
+
+	# Rearrange columns
+	df_EUI = df_EUI[['擔保品細項', '細項名稱', '使用空間名稱'] + [i for i in df_EUI_SpaceClass.columns if i.startswith('EUI_')]]
+
+	return df_EUI
+
+def Save_Output(df_EUI, Output_File, Output_Path='../output/output_data/Mapping.CTBC/'):
+
+	"""
+	Save the output data.
+	==================================================================================================
+	Input:
+
+		df_EUI: The output dataframe.
+
+		Output_File: The output file name.
+
+		Output_Path: The output directory.
+	"""
+
+	if not os.path.exists(Output_Path): os.makedirs(Output_Path)
+	df_EUI.to_csv(Output_Path + Output_File, index=False, encoding='utf-8-sig')
+
+	return
+
+def Get_Group_EUI(df_Mapping_SpaceClass=None, df_Mapping_CollateralClass=None, Output_Path='../output/output_data/Mapping.CTBC/'):
+
+	# Get CTBC space-class and collateral-class data
+	# (read from the output of calc.Mapping.CTBC.py, unless the mapped tables are given, e.g. by the scenario engine)
+	if (df_Mapping_SpaceClass is None): df_Mapping_SpaceClass = pd.read_csv(Output_Path + 'Mapping.CTBC.Space.Mean.csv')
+	if (df_Mapping_CollateralClass is None): df_Mapping_CollateralClass = pd.read_csv(Output_Path + 'Mapping.CTBC.Collateral.Mean.csv')
+
+	# Filter the data
+	df_Mapping_SpaceClass      = df_Mapping_SpaceClass[df_Mapping_SpaceClass['建物用途']==Label_Mean].drop(columns=['使用空間名稱', '建物用途'])
+	df_Mapping_CollateralClass = df_Mapping_CollateralClass[df_Mapping_CollateralClass['使用空間名稱']==Label_Mean].drop(columns=['細項名稱', '使用空間名稱'])
+	df_Mapping_CollateralClass['擔保品細項'] = df_Mapping_CollateralClass['擔保品細項'].astype(str).str.zfill(2)
+
+	# Transpose the data can concatenate along the column
+	df_Mapping_SpaceClass['空間代號']        = 'EUI_' + df_Mapping_SpaceClass['空間代號']
+	df_Mapping_CollateralClass['擔保品細項'] = 'EUI_' + df_Mapping_CollateralClass['擔保品細項']
+
+	df_EUI = pd.concat([df_Mapping_SpaceClass.set_index('空間代號').T, df_Mapping_CollateralClass.set_index('擔保品細項').T], axis=1)
+
+	return df_EUI
+
+def Mapping_EUI(gdf, df_Group_EUI, Config):
+
+	"""
+	Attach the group EUI of its region to each feature of the layer of a country.
+	==================================================================================================
+	Input:
+
+		gdf: The layer of the country (see Read_Country_Layer).
+
+		df_Group_EUI: The group EUI of each region (see Get_Group_EUI).
+
+		Config: The configuration of the country (Region_Column, Region and Region_Drop).
+
+	Output:
+
+		gdf: The layer with the EUI columns (and the Lower_/Upper_ columns of the approximate confidence interval, if calculated).
+	"""
+
+	# Resolve the region of the source EUI table of each feature once
+	Region_Key = 'EUI_' + gdf[Config['Region_Column']].map(Config['Region'])
+
+	# Report all values without EUI at once (the EUI columns of their features are left empty)
+	Is_Unmapped = ~Region_Key.isin(df_Group_EUI.index)
+	if (Is_Unmapped.any()): print('[Mapping_EUI] {}: No EUI for {}: {} ({} features)'.format(Config['Code'], Config['Region_Column'], ', '.join(gdf.loc[Is_Unmapped, Config['Region_Column']].astype(str).unique()), Is_Unmapped.sum()))
+
+	# Attach all EUI columns with one keyed lookup
+	gdf = gdf.join(df_Group_EUI.reindex(Region_Key).set_axis(gdf.index).infer_objects())
+
+	# Attach the confidence interval of the EUI (Lower_/Upper_ columns, if calculated, e.g. by calc.DECC.py)
+	# The interval of a mapped class is the mean of the bounds of its source building types, not a bootstrap interval of the class mean:
+	# it is a conservative approximation, wider than the interval of the mean of the building types (whose errors partly cancel out)
+	for i_Bound in ['Lower', 'Upper']:
+
+		if not (df_Group_EUI.index.str.startswith('EUI_{}_'.format(i_Bound)).any()): continue
+
+		df_Bound = df_Group_EUI.reindex(Region_Key.str.replace('EUI_', 'EUI_{}_'.format(i_Bound), n=1, regex=False)).set_axis(gdf.index).infer_objects()
+		gdf = gdf.join(df_Bound.rename(columns=lambda i: i.replace('EUI_', i_Bound + '_', 1)))
+
+	# Remove unnecessary columns
+	if (Config['Region_Drop']): gdf = gdf.drop(columns=[Config['Region_Column']])
+
+	return gdf
+
+def Get_Lookup(gdf, Config):
+
+	# The region of each feature (the features of the values without region are left empty)
+	df_Lookup = pd.DataFrame({\
+		'REGNAME': gdf['REGNAME'].to_numpy(), \
+		Config['Region_Column']: gdf[Config['Region_Column']].to_numpy(), \
+		Config['Dissolve']: gdf[Config['Region_Column']].map(Config['Region']).to_numpy(), \
+	})
+
+	return df_Lookup
+
+def Dissolve_Region(gdf, df_Lookup, Config, gs_Region=None):
+
+	"""
+	Dissolve the features of the layer of a country into one feature per region.
+	==================================================================================================
+	Input:
+
+		gdf: The features with their EUI (see Mapping_EUI), in the order of df_Lookup.
+
+		df_Lookup: The region of each feature (see Get_Lookup).
+
+		Config: The configuration of the country (Dissolve).
+
+		gs_Region: The dissolved geometry of each region (None: unioned from the features, see Union_Group),
+			e.g. shared by the scenarios of the scenario engine.
+
+	Output:
+
+		gdf_Region: One feature per region (REGNAME: the region), with the EUI of its features.
+	"""
+
+	if (gs_Region is None): gs_Region = Union_Group(gdf.geometry, df_Lookup[Config['Dissolve']])
+
+	# The EUI are the same in all features of a region, so the first feature of each region is kept
+	Is_First   = ~df_Lookup[Config['Dissolve']].duplicated().to_numpy()
+	gdf_Region = gdf[Is_First].copy()
+	gdf_Region['REGNAME'] = df_Lookup[Config['Dissolve']].to_numpy()[Is_First]
+
+	return gdf_Region.set_geometry(gs_Region.reindex(pd.Index(gdf_Region['REGNAME'])).to_numpy())
+
+def Get_Lookup_File(Output_Path, Output_Name):
+
+	# The lookup table is written next to the layer
+	return Output_Path + os.path.splitext(Output_Name)[0] + '.Lookup.csv'
+
+def Output_Lookup(df_Lookup, Lookup_File):
+
+	# Output the region of each feature of a dissolved layer (the lookup table of a previous dissolved output is removed otherwise)
+	if (df_Lookup is not None):
+		if not os.path.exists(os.path.dirname(Lookup_File)): os.makedirs(os.path.dirname(Lookup_File))
+		df_Lookup.to_csv(Lookup_File, encoding='utf-8-sig', index=False)
+	elif (os.path.exists(Lookup_File)):
+		os.remove(Lookup_File)
+
+	return
+
+def Get_Output_Layer(Config):
+
+	# The output directory and file name of the layer of a country
+	return Get_Country_Path(Config, 'output/output_result/Shapefile/EUI.Prediction.CTBC.Global/'), 'EUI.Prediction.CTBC.Global.{}.shp'.format(Config['Country'])
+
+def Output_Shapefile(gdf, Output_Path, Output_Name, Output_Format='Shapefile', Output_Profile=False):
+
+	# Round the number columns to 1 digits
+	gdf = gdf.round(1)
+
+	# Output in the selected format (Shapefile, GeoParquet or FlatGeobuf)
+	# With the profile table, the EUI columns are written once per distinct profile instead of once per polygon
+	Output_Layer(gdf, Output_Path, Output_Name, Output_Format=Output_Format, Profile_Columns=([i for i in gdf.columns if i.startswith(('EUI_', 'Lower_', 'Upper_'))] if (Output_Profile) else None))
+
+	return
+
+def Calc_Country(Config, df_Source, df_Mapping_SpaceClass, df_Mapping_CollateralClass, gdf, Output_Dissolve=False, gs_Region=None):
+
+	"""
+	Run the stages of country EUI method of a country on the data in memory.
+	==================================================================================================
+	Input:
+
+		Config: The configuration of the country.
+
+		df_Source: The source EUI table (see Read_Country_Source).
+
+		df_Mapping_SpaceClass, df_Mapping_CollateralClass: The mapping configurations (see Get_Mapping).
+
+		gdf: The layer of the country (see Read_Country_Layer).
+
+		Output_Dissolve: Whether the features are dissolved into the regions (only if "Dissolve" is configured).
+
+		gs_Region: The dissolved geometry of each region (see Dissolve_Region).
+
+	Output:
+
+		df_EUI_SpaceClass, df_EUI_CollateralClass: The mapped tables (the outputs of calc.Mapping.CTBC.py).
+
+		gdf: The layer with the EUI of each feature.
+
+		df_Lookup: The region of each feature of the dissolved layer (None if not dissolved).
+	"""
+
+	df_EUI_SpaceClass      = Mapping_to_SpaceClass(df_Mapping_SpaceClass, df_Source)
+	df_EUI_CollateralClass = Mapping_to_CollateralClass(df_Mapping_CollateralClass, df_EUI_SpaceClass)
+
+	df_Lookup = Get_Lookup(gdf, Config) if (Output_Dissolve) and (Config['Dissolve'] is not None) else None
+
+	gdf = Mapping_EUI(gdf, Get_Group_EUI(df_EUI_SpaceClass, df_EUI_CollateralClass), Config)
+	if (df_Lookup is not None): gdf = Dissolve_Region(gdf, df_Lookup, Config, gs_Region=gs_Region)
+
+	return df_EUI_SpaceClass, df_EUI_CollateralClass, gdf, df_Lookup
@@ -0,0 +1,155 @@
+"""
+Geometry.py
+===========
+Multi-resolution geometry pyramid of the boundary layers.
+Each source layer is simplified once at several tolerances and cached on disk as GeoParquet,
+keyed by the content hash of the source files, the tolerance and the source of this module, so that re-runs skip the geometry work entirely;
+the levels are written with the bbox covering column, and read with the columns, bounding box and filters pushed into the reader.
+Union_Group dissolves the features of a layer by a key, with the unions spread across processes.
+"""
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Common.Cache import Hash_File, Is_Parquet_Available
+from Common.Reader import Read_Geometry
+
+# Default simplification levels (0: the original geometry)
+List_Tolerance_Default = [0, 0.001, 0.01, 0.05]
+
+def Get_Source_Files(Source_File):
+
+	"""
+	Get the files of a layer (the shapefile and its sidecar files).
+	"""
+
+	Stem = os.path.splitext(Source_File)[0]
+
+	return [Stem + i for i in ['.shp', '.shx', '.dbf', '.prj', '.cpg'] if os.path.exists(Stem + i)]
+
+def Build_Pyramid(Source_File, Cache_Name, List_Tolerance=List_Tolerance_Default, Cache_Path='../output/output_cache/'):
+
+	"""
+	Simplify the source layer at each tolerance and cache the levels that are not cached yet.
+	==================================================================================================
+	Input:
+
+		Source_File: The path of the source layer.
+
+		Cache_Name: The name of the cache files.
+
+		List_Tolerance: The simplification tolerances (in the unit of the layer CRS, 0: the original geometry).
+
+		Cache_Path: The directory of the cache files.
+
+	Output:
+
+		Dict_Level: The path of the cache file of each tolerance.
+	"""
+
+	Key        = Hash_File(Get_Source_Files(Source_File) + [os.path.abspath(__file__)])[:16]
+	Dict_Level = {i: Cache_Path + '{}.{}.{}.parquet'.format(Cache_Name, Key, i) for i in List_Tolerance}
+	List_Build = [i for i in List_Tolerance if not os.path.exists(Dict_Level[i])]
+
+	if (len(List_Build) == 0): return Dict_Level
+
+	# Remove the out-of-date levels
+	if not os.path.exists(Cache_Path): os.makedirs(Cache_Path)
+	for i_File in os.listdir(Cache_Path):
+		if i_File.startswith(Cache_Name + '.') and (i_File.split('.')[1] != Key): os.remove(Cache_Path + i_File)
+
+	# Read the source layer once and save each level
+	Time_Start = time.perf_counter()
+	gdf = Read_Geometry(Source_File)
+
+	for i_Tolerance in List_Build:
+
+		gdf_Level = gdf.copy()
+		if (i_Tolerance > 0): gdf_Level['geometry'] = gdf_Level['geometry'].simplify(i_Tolerance, preserve_topology=True)
+		gdf_Level.to_parquet(Dict_Level[i_Tolerance], write_covering_bbox=True)
+
+	print('[Cache] {}: built levels {} in {:.3f}s'.format(Cache_Name, List_Build, time.perf_counter() - Time_Start))
+
+	return Dict_Level
+
+def Read_Level(Source_File, Cache_Name, Tolerance=0, Columns=None, Bbox=None, Filters=None, List_Tolerance=List_Tolerance_Default, Cache_Path='../output/output_cache/'):
+
+	"""
+	Get the source layer simplified at the tolerance, from the geometry pyramid.
+	==================================================================================================
+	Input:
+
+		Source_File: The path of the source layer.
+
+		Cache_Name: The name of the cache files.
+
+		Tolerance: The simplification tolerance (0: the original geometry).
+
+		Columns, Bbox, Filters: The attribute columns, the bounding box and the attribute filters of the features to read (see Read_Geometry).
+
+		List_Tolerance: The levels built together when the pyramid is out of date.
+
+		Cache_Path: The directory of the cache files.
+
+	Output:
+
+		gdf: The simplified layer.
+	"""
+
+	# Without pyarrow, read and simplify the source layer every time
+	if not (Is_Parquet_Available):
+
+		gdf = Read_Geometry(Source_File, Columns=Columns, Bbox=Bbox, Filters=Filters)
+		if (Tolerance > 0): gdf['geometry'] = gdf['geometry'].simplify(Tolerance, preserve_topology=True)
+
+		return gdf
+
+	if (Tolerance not in List_Tolerance): List_Tolerance = list(List_Tolerance) + [Tolerance]
+	Dict_Level = Build_Pyramid(Source_File, Cache_Name, List_Tolerance=List_Tolerance, Cache_Path=Cache_Path)
+
+	return Read_Geometry(Dict_Level[Tolerance], Columns=Columns, Bbox=Bbox, Filters=Filters)
+
+def Union_Group(Geometry, Group, Chunk_Size=256, n_Worker=os.cpu_count()):
+
+	"""
+	Union the geometries of each group (a parallel unary union).
+	The geometries of each group are split into chunks, unioned by the worker processes, and the unions of the chunks of each group
+	are unioned at last, so that a large group is spread across the workers as well.
+	==================================================================================================
+	Input:
+
+		Geometry: The geometries (GeoSeries).
+
+		Group: The group of each geometry (the missing groups are a group of their own).
+
+		Chunk_Size: The number of geometries unioned by a worker at a time.
+
+		n_Worker: The number of worker processes.
+
+	Output:
+
+		gs_Group: The union of each group (GeoSeries indexed by the group, in the order of first appearance).
+	"""
+
+	Code, Label = pd.factorize(pd.Series(Group).to_numpy(), use_na_sentinel=False)
+
+	# Sort the geometries by group, and split each group into chunks
+	Order      = np.argsort(Code, kind='stable')
+	Array      = Geometry.to_numpy()[Order]
+	Size       = np.bincount(Code, minlength=len(Label))
+	Start      = np.cumsum(Size) - Size
+	List_Chunk = [(i, j, min(j + Chunk_Size, Start[i] + Size[i])) for i in range(len(Label)) for j in range(Start[i], Start[i] + Size[i], Chunk_Size)]
+
+	with ProcessPoolExecutor(max_workers=n_Worker) as Executor:
+
+		List_Future = [(i, Executor.submit(shapely.union_all, Array[j:k])) for i, j, k in List_Chunk]
+
+	List_Part = [[] for i in range(len(Label))]
+	for i_Group, i_Future in List_Future: List_Part[i_Group].append(i_Future.result())
+
+	return gpd.GeoSeries([shapely.union_all(i) for i in List_Part], index=Label, crs=Geometry.crs)
@@ -0,0 +1,145 @@
+"""
+Lookup.py
+=========
+Bulk lookup of the EUI and CIE coef of geocoded buildings from the merged global layer (output of calc.Layer_Output.Merge.py).
+The layer is loaded once and indexed with an STRtree; each batch of points is located with one vectorized query,
+and points falling outside every polygon (e.g. on the coast) fall back to the nearest polygon within a distance.
+
+	from Common.Lookup import Get_Lookup, Lookup_EUI
+	Lookup = Get_Lookup()
+	df = Lookup_EUI(Lookup, Latitude, Longitude, Class)    # Class: collateral class ("01", 2, ...) or space class ("K1", ...)
+"""
+
+import numpy as np
+import pandas as pd
+import shapely
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from Common.Output import Get_Layer_File, Read_Layer
+
+# The directory of the merged global layer
+Layer_Path_Default = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Layer_Output', 'output', 'output_result', 'Shapefile', 'EUI.Prediction.CTBC.Global', '')
+
+# The lookup table held by each worker process
+Dict_Worker = {}
+
+def Get_Lookup(Layer_Path=Layer_Path_Default, Output_Format='Shapefile'):
+
+	"""
+	Load the merged global layer and build its spatial index.
+	==================================================================================================
+	Input:
+
+		Layer_Path: The directory of the merged global layer.
+
+		Output_Format: The output format preferred if the layer exists in several formats.
+
+	Output:
+
+		Lookup: The geometry (EPSG:4326), spatial index, attributes (COUNTRY, REGNAME, Coef_CIE) and EUI table of the polygons,
+			and the column of the EUI table of each class.
+	"""
+
+	gdf = Read_Layer(Get_Layer_File(Layer_Path, Output_Format=Output_Format))
+	if (gdf.crs is not None) and (gdf.crs.to_epsg() != 4326): gdf = gdf.to_crs('epsg:4326')
+
+	Geometry   = gdf['geometry'].to_numpy()
+	EUI_Column = [i for i in gdf.columns if i.startswith('EUI_')]
+
+	# Prepare the polygons once (the point-in-polygon tests of every batch reuse them)
+	shapely.prepare(Geometry)
+
+	return {\
+		'Geometry': Geometry, \
+		'Tree': shapely.STRtree(Geometry), \
+		'Attribute': gdf[['COUNTRY', 'REGNAME', 'Coef_CIE']].reset_index(drop=True), \
+		'EUI': gdf[EUI_Column].to_numpy(dtype=float), \
+		'Column': {i[len('EUI_'):]: j for j, i in enumerate(EUI_Column)}, \
+	}
+
+def Lookup_EUI(Lookup, Latitude, Longitude, Class, Max_Distance=0.1):
+
+	"""
+	Look up the EUI of the class and the CIE coef at each point.
+	==================================================================================================
+	Input:
+
+		Lookup: The lookup table (see Get_Lookup).
+
+		Latitude, Longitude: The coordinates of the points (degree).
+
+		Class: The class of each point (collateral class such as "01" or 1, or space class such as "K1").
+
+		Max_Distance: The maximum distance (degree) to the nearest polygon for the points outside every polygon (0: no fallback).
+
+	Output:
+
+		df: COUNTRY, REGNAME, Coef_CIE and EUI of each point (in the order of the points),
+			with Distance (0 inside a polygon, the distance to the nearest polygon otherwise, NaN if not found).
+	"""
+
+	Latitude  = np.asarray(Latitude, dtype=float)
+	Longitude = np.asarray(Longitude, dtype=float)
+	Point     = shapely.points(Longitude, Latitude)
+
+	# Locate the polygon containing each point (a point on a shared border takes the first polygon)
+	Index_Point, Index_Polygon = Lookup['Tree'].query(Point, predicate='intersects')
+	Order = np.lexsort((Index_Polygon, Index_Point))
+	Index_Point, Index_First = np.unique(Index_Point[Order], return_index=True)
+
+	Polygon  = np.full(len(Point), -1)
+	Distance = np.full(len(Point), np.nan)
+	Polygon[Index_Point]  = Index_Polygon[Order][Index_First]
+	Distance[Index_Point] = 0
+
+	# Fall back to the nearest polygon within the distance
+	Index_Outside = np.flatnonzero((Polygon < 0) & ~shapely.is_empty(Point))
+
+	if (Max_Distance > 0) and (len(Index_Outside) > 0):
+
+		(Index_Point, Index_Polygon), Distance_Nearest = Lookup['Tree'].query_nearest(Point[Index_Outside], max_distance=Max_Distance, return_distance=True, all_matches=False)
+		Polygon[Index_Outside[Index_Point]]  = Index_Polygon
+		Distance[Index_Outside[Index_Point]] = Distance_Nearest
+
+	# Pick the EUI column of the class of each point
+	Class  = pd.Series(np.asarray(Class)).astype(str).str.zfill(2)
+	Column = Class.map(Lookup['Column']).fillna(-1).to_numpy(dtype=int)
+	Is_Valid = (Polygon >= 0) & (Column >= 0)
+
+	EUI = np.full(len(Point), np.nan)
+	EUI[Is_Valid] = Lookup['EUI'][Polygon[Is_Valid], Column[Is_Valid]]
+
+	df = Lookup['Attribute'].reindex(Polygon).reset_index(drop=True)
+	df['EUI']      = EUI
+	df['Distance'] = Distance
+
+	return df
+
+def Init_Worker(Layer_Path, Output_Format):
+
+	Dict_Worker['Lookup'] = Get_Lookup(Layer_Path, Output_Format=Output_Format)
+
+	return
+
+def Lookup_EUI_Chunk(Latitude, Longitude, Class, Max_Distance):
+
+	return Lookup_EUI(Dict_Worker['Lookup'], Latitude, Longitude, Class, Max_Distance=Max_Distance)
+
+def Lookup_EUI_Parallel(Latitude, Longitude, Class, Max_Distance=0.1, Layer_Path=Layer_Path_Default, Output_Format='Shapefile', Chunk_Size=500000, n_Worker=os.cpu_count()):
+
+	"""
+	Look up the points in chunks in parallel processes (each process loads the layer once); see Lookup_EUI.
+	"""
+
+	Latitude  = np.asarray(Latitude, dtype=float)
+	Longitude = np.asarray(Longitude, dtype=float)
+	Class     = np.asarray(Class)
+
+	List_Chunk = [slice(i, i + Chunk_Size) for i in range(0, max(len(Latitude), 1), Chunk_Size)]
+
+	with ProcessPoolExecutor(max_workers=n_Worker, initializer=Init_Worker, initargs=(Layer_Path, Output_Format)) as Executor:
+
+		List_df = list(Executor.map(Lookup_EUI_Chunk, [Latitude[i] for i in List_Chunk], [Longitude[i] for i in List_Chunk], [Class[i] for i in List_Chunk], [Max_Distance] * len(List_Chunk)))
+
+	return pd.concat(List_df, ignore_index=True)
@@ -0,0 +1,113 @@
+"""
+Mapping.py
+==========
+Mapping engine shared by the calc.Mapping.CTBC scripts of each country.
+The comma-separated codes of the mapping configurations are exploded once, joined to the source table in one operation,
+and the group means of all mapping rows are calculated at once.
+"""
+
+import numpy as np
+import pandas as pd
+
+def Mean_Group(Values, Group, n_Group):
+
+	"""
+	Calculate the column means of each group, ignoring NaN.
+	The records of each group are summed one after another (the same order as DataFrame.mean),
+	so that the rounded means are identical to those calculated group by group.
+	==================================================================================================
+	Input:
+
+		Values: The 2-D array of values (one row per record).
+
+		Group: The group number (0 to n_Group-1) of each record, with records of the same group in the order to be summed.
+
+		n_Group: The number of groups.
+
+	Output:
+
+		Mean: The 2-D array of means (one row per group, NaN for a group without any value).
+	"""
+
+	Order  = np.argsort(Group, kind='stable')
+	Filled = np.nan_to_num(Values[Order], nan=0.0)
+	Valid  = ~np.isnan(Values[Order])
+
+	Size  = np.bincount(Group, minlength=n_Group)
+	Start = np.cumsum(Size) - Size
+	Sum   = np.zeros((n_Group, Values.shape[1]))
+	Count = np.zeros((n_Group, Values.shape[1]))
+
+	# Add the i-th record of all groups at once
+	for i_Record in range(Size.max(initial=0)):
+
+		Index_Group = np.flatnonzero(Size > i_Record)
+		Sum[Index_Group]   += Filled[Start[Index_Group] + i_Record]
+		Count[Index_Group] += Valid[Start[Index_Group] + i_Record]
+
+	with np.errstate(invalid='ignore', divide='ignore'): Mean = np.where(Count > 0, Sum / Count, np.nan)
+
+	return Mean
+
+def Mapping_Group(df_Mapping, Mapping_Key, df_Source, Source_Key, Label_Columns, Fill_Empty=True, Label_Mean='全部平均'):
+
+	"""
+	Mapping the rows of the source table to each row of the mapping configurations.
+	==================================================================================================
+	Input:
+
+		df_Mapping: The mapping configurations.
+
+		Mapping_Key: The column of df_Mapping containing the source code(s), e.g. "2, 3, 5" for a group of codes.
+
+		df_Source: The source table.
+
+		Source_Key: The column of df_Source matched against the source code(s).
+
+		Label_Columns: The label columns set to Label_Mean in the mean row of each mapping row.
+
+		Fill_Empty: Whether a single-code mapping row without any matched source row yields a row of NaN.
+
+		Label_Mean: The label of the mean row.
+
+	Output:
+
+		df: For a group of codes, the group mean (labelled Label_Mean) followed by the matched source rows;
+			for a single code, the matched source row(s) (labelled Label_Mean).
+			The rows follow the order of df_Mapping and then the order of df_Source, and the other columns of df_Mapping are attached.
+	"""
+
+	df_Mapping = df_Mapping.reset_index(drop=True)
+
+	# Explode the source codes (one row per mapping row and source code)
+	Code     = df_Mapping[Mapping_Key].astype(str)
+	Is_Group = Code.str.contains(', ', regex=False).to_numpy()
+	df_Code  = pd.DataFrame({'_Mapping': df_Mapping.index, Source_Key: Code.str.split(', ')}).explode(Source_Key).drop_duplicates()
+
+	# Join the source table in one operation (keeping the row order of the source table)
+	df_Source = df_Source.assign(_Order=np.arange(len(df_Source)))
+	df_Member = df_Code.merge(df_Source, on=Source_Key, how='inner').drop(columns=[Source_Key])
+	df_Member = df_Member.sort_values(['_Mapping', '_Order'], kind='stable', ignore_index=True)
+
+	# The matched row of a single code is labelled as the mean row
+	df_Member.loc[~Is_Group[df_Member['_Mapping'].to_numpy()], Label_Columns] = Label_Mean
+
+	# Calculate the mean of all groups at once (a group without any matched row yields NaN)
+	Is_Head = Is_Group.copy()
+	if (Fill_Empty): Is_Head = Is_Head | ~np.isin(df_Mapping.index, df_Member['_Mapping'])
+
+	Numeric_Columns = [i for i in df_Source.select_dtypes('number').columns if i not in [Source_Key, '_Order']]
+	df_Head = pd.DataFrame(\
+		Mean_Group(df_Member[Numeric_Columns].to_numpy(dtype=float), df_Member['_Mapping'].to_numpy(), len(df_Mapping)), \
+		columns=Numeric_Columns, \
+	)
+	df_Head.loc[~Is_Group] = np.nan
+	df_Head = df_Head.loc[Is_Head].rename_axis('_Mapping').reset_index()
+	df_Head[Label_Columns] = Label_Mean
+	df_Head['_Order']      = -1
+
+	# Combine the mean rows and the matched rows, and attach the mapping configurations
+	df = pd.concat([df_Head, df_Member], ignore_index=True).sort_values(['_Mapping', '_Order'], kind='stable')
+	df = df.join(df_Mapping.drop(columns=[Mapping_Key]), on='_Mapping')
+
+	return df.drop(columns=['_Mapping', '_Order']).reset_index(drop=True)
@@ -0,0 +1,265 @@
+"""
+Output.py
+=========
+Output backend of the layers created by each stage.
+The layers can be written as ESRI Shapefile (for legacy consumers), GeoParquet or FlatGeobuf;
+the latter two keep the full column names and are written with a spatial index
+(the bounding box covering columns of GeoParquet, the packed Hilbert R-tree of FlatGeobuf,
+which stores the features in the order of the index rather than the order of the dataframe).
+The format is selected per run by "Output_Format" in Layer_Output/Config.json.
+With "Output_Profile", the layer is written with a REGION key (the position of the feature, independent of the EUI)
+in place of the EUI columns; the distinct EUI profiles are written once to a sidecar table (<layer file>.Profile.csv)
+and the profile of each region to <layer file>.Profile.Region.csv, joined again on load. The layer file itself is
+rewritten only when its content hash (kept in <layer file>.Profile.json) changes, so an EUI-only change rewrites only the tables.
+With "Output_Dissolve", the countries whose EUI depends only on a coarser region (US: the climate regions) write one feature
+per region instead of one per administrative unit, with a lookup table of the units next to the layer.
+"""
+
+import pandas as pd
+import geopandas as gpd
+import shapely
+import hashlib
+import json
+import os
+
+from Common.Cache import Is_Parquet_Available
+
+# The file extension of each output format
+Dict_Extension = {\
+	'Shapefile': '.shp', \
+	'GeoParquet': '.parquet', \
+	'FlatGeobuf': '.fgb', \
+}
+
+def Get_Output_Format(Config_File='../../Layer_Output/Config.json'):
+
+	"""
+	Get the output format selected in Config.json (Shapefile if not set).
+	GeoParquet falls back to Shapefile when pyarrow is not available.
+	"""
+
+	with open(Config_File, 'r', encoding='utf-8') as f: config = json.load(f)
+
+	Output_Format = config.get('Output_Format', 'Shapefile')
+
+	if (Output_Format not in Dict_Extension): raise ValueError('Unknown output format: {} (available: {})'.format(Output_Format, ', '.join(Dict_Extension)))
+
+	if (Output_Format == 'GeoParquet') and not (Is_Parquet_Available):
+		print('[Output] pyarrow is not available, GeoParquet falls back to Shapefile')
+		Output_Format = 'Shapefile'
+
+	return Output_Format
+
+def Get_Output_Profile(Config_File='../../Layer_Output/Config.json'):
+
+	"""
+	Get whether the layers are output with a sidecar profile table (see Split_Profile), False if not set in Config.json.
+	"""
+
+	with open(Config_File, 'r', encoding='utf-8') as f: config = json.load(f)
+
+	return bool(config.get('Output_Profile', False))
+
+def Get_Output_Dissolve(Config_File='../../Layer_Output/Config.json'):
+
+	"""
+	Get whether the layers of the countries are dissolved into the regions of their EUI (where supported), False if not set in Config.json.
+	"""
+
+	with open(Config_File, 'r', encoding='utf-8') as f: config = json.load(f)
+
+	return bool(config.get('Output_Dissolve', False))
+
+def Get_Profile_File(File_Path):
+
+	# One table per layer file (the layer may exist in several output formats, written in different runs)
+	return File_Path + '.Profile.csv'
+
+def Get_Profile_Region_File(File_Path):
+
+	# The profile of each region of the layer file
+	return File_Path + '.Profile.Region.csv'
+
+def Get_Profile_Hash_File(File_Path):
+
+	# The content hash of the layer file written with the profile tables
+	return File_Path + '.Profile.json'
+
+def Split_Profile(gdf, Profile_Columns):
+
+	"""
+	Split the profile columns from the layer.
+	==================================================================================================
+	Input:
+
+		gdf: The layer.
+
+		Profile_Columns: The columns of the profile (contiguous columns, e.g. the EUI columns).
+
+	Output:
+
+		gdf: The layer with the REGION key (the position of each row) in place of the profile columns.
+
+		df_Profile: The distinct profiles (one row per PROFILE, in the order of first appearance).
+
+		df_Region: The PROFILE of each REGION.
+	"""
+
+	# Number the distinct rows of the profile columns
+	Code, _ = pd.factorize(pd.util.hash_pandas_object(gdf[Profile_Columns], index=False))
+	Is_First = ~pd.Series(Code).duplicated().to_numpy()
+
+	df_Profile = gdf.loc[Is_First, Profile_Columns].reset_index(drop=True)
+	df_Profile.insert(0, 'PROFILE', range(len(df_Profile)))
+
+	df_Region = pd.DataFrame({'REGION': range(len(gdf)), 'PROFILE': Code})
+
+	# The key of the layer does not depend on the profiles, so that the layer is the same if only the profiles change
+	Position = list(gdf.columns).index(Profile_Columns[0])
+	gdf = gdf.drop(columns=Profile_Columns)
+	gdf.insert(Position, 'REGION', range(len(gdf)))
+
+	return gdf, df_Profile, df_Region
+
+def Join_Profile(gdf, df_Profile, df_Region):
+
+	"""
+	Join the profiles to the layer in place of the REGION key (the inverse of Split_Profile).
+	"""
+
+	df_Profile  = df_Profile.set_index('PROFILE')
+	Profile     = df_Region.set_index('REGION')['PROFILE'].reindex(gdf['REGION'].to_numpy()).to_numpy()
+	Position    = list(gdf.columns).index('REGION')
+	List_Column = list(gdf.columns[:Position]) + list(df_Profile.columns) + list(gdf.columns[Position+1:])
+
+	return gdf.join(df_Profile.reindex(Profile).set_axis(gdf.index))[List_Column]
+
+def Hash_Layer(gdf):
+
+	"""
+	Calculate the content hash of a layer (the columns, the CRS, the attribute values and the geometry).
+	"""
+
+	Hash = hashlib.sha256()
+	Hash.update(json.dumps([[str(i), str(j)] for i, j in gdf.dtypes.items()], ensure_ascii=False).encode())
+	Hash.update((gdf.crs.to_wkt() if (gdf.crs is not None) else '').encode())
+	Hash.update(pd.util.hash_pandas_object(pd.DataFrame(gdf.drop(columns=[gdf.geometry.name])), index=False).to_numpy().tobytes())
+	Hash.update(b''.join((i if (i is not None) else b'') for i in shapely.to_wkb(gdf.geometry.to_numpy())))
+
+	return Hash.hexdigest()
+
+def Is_Layer_Unchanged(Output_File, Layer_Hash):
+
+	"""
+	Whether the layer file exists with the content hash (as written with the profile tables).
+	"""
+
+	if not (os.path.exists(Output_File)) or not (os.path.exists(Get_Profile_Hash_File(Output_File))): return False
+
+	try:
+		with open(Get_Profile_Hash_File(Output_File), 'r', encoding='utf-8') as f: return (json.load(f).get('Hash') == Layer_Hash)
+	except (OSError, ValueError):
+		return False
+
+def Output_Layer(gdf, Output_Path, Output_Name, Output_Format='Shapefile', Profile_Columns=None):
+
+	"""
+	Output the layer in the output format.
+	==================================================================================================
+	Input:
+
+		gdf: The layer.
+
+		Output_Path: The output directory.
+
+		Output_Name: The output file name (the extension is replaced by that of the output format).
+
+		Output_Format: "Shapefile", "GeoParquet" or "FlatGeobuf".
+
+		Profile_Columns: The columns written to the sidecar profile table (None: all columns are written to the layer).
+
+	Output:
+
+		Output_File: The path of the output file.
+	"""
+
+	if not os.path.exists(Output_Path): os.makedirs(Output_Path)
+
+	Output_File = Output_Path + os.path.splitext(Output_Name)[0] + Dict_Extension[Output_Format]
+
+	# Write the profiles to the sidecar tables (or remove the tables of the previous run)
+	Layer_Hash = None
+	if (Profile_Columns is not None) and (len(Profile_Columns) > 0):
+
+		gdf, df_Profile, df_Region = Split_Profile(gdf, Profile_Columns)
+		df_Profile.to_csv(Get_Profile_File(Output_File), index=False, encoding='utf-8-sig')
+		df_Region.to_csv(Get_Profile_Region_File(Output_File), index=False, encoding='utf-8-sig')
+
+		# The layer file is kept if its content is unchanged (e.g. only the EUI changed)
+		Layer_Hash = Hash_Layer(gdf)
+		if (Is_Layer_Unchanged(Output_File, Layer_Hash)):
+			print('[Output] {}: layer unchanged, only the profile tables are written'.format(os.path.basename(Output_File)))
+			return Output_File
+
+	else:
+
+		for i_File in [Get_Profile_File(Output_File), Get_Profile_Region_File(Output_File)]:
+			if os.path.exists(i_File): os.remove(i_File)
+
+	# The hash of the previous layer file is removed first, so that an interrupted write is not taken as unchanged
+	if os.path.exists(Get_Profile_Hash_File(Output_File)): os.remove(Get_Profile_Hash_File(Output_File))
+
+	if (Output_Format == 'Shapefile'):
+		gdf.to_file(Output_File, encoding='utf-8')
+
+	elif (Output_Format == 'GeoParquet'):
+		gdf.to_parquet(Output_File, write_covering_bbox=True)
+
+	elif (Output_Format == 'FlatGeobuf'):
+		gdf.to_file(Output_File, driver='FlatGeobuf', SPATIAL_INDEX='YES')
+
+	if (Layer_Hash is not None):
+		with open(Get_Profile_Hash_File(Output_File), 'w', encoding='utf-8') as f: json.dump({'Hash': Layer_Hash}, f)
+
+	return Output_File
+
+def Get_Layer_File(Layer_Path, Output_Format='Shapefile'):
+
+	"""
+	Get the layer file under the directory, preferring the output format
+	(a directory written before the format was changed, or never rebuilt, still yields its layer in another format).
+	"""
+
+	List_File = os.listdir(Layer_Path)
+
+	for i_Format in [Output_Format] + [i for i in Dict_Extension if (i != Output_Format)]:
+
+		List_Layer = sorted(i for i in List_File if i.endswith(Dict_Extension[i_Format]))
+		if (len(List_Layer) > 0): return Layer_Path + List_Layer[0]
+
+	raise FileNotFoundError('No layer under {}'.format(Layer_Path))
+
+def Read_Layer(File_Path, Is_Join_Profile=True):
+
+	"""
+	Read the layer in any of the output formats (with the Arrow-based reader of pyogrio if pyarrow is available).
+	The geometry column is always the last column, as read from a shapefile.
+	A layer written with the profile tables is joined with them, unless Is_Join_Profile is False (the REGION key is kept).
+	"""
+
+	if (File_Path.endswith('.parquet')):
+		gdf = gpd.read_parquet(File_Path)
+	elif (Is_Parquet_Available):
+		gdf = gpd.read_file(File_Path, encoding='utf-8', engine='pyogrio', use_arrow=True)
+	else:
+		gdf = gpd.read_file(File_Path, encoding='utf-8')
+
+	gdf = gdf[[i for i in gdf.columns if (i != gdf.geometry.name)] + [gdf.geometry.name]]
+
+	if (Is_Join_Profile) and ('REGION' in gdf.columns) and (os.path.exists(Get_Profile_File(File_Path))):
+
+		if not os.path.exists(Get_Profile_Region_File(File_Path)): raise FileNotFoundError('No profile region table of {}'.format(File_Path))
+
+		gdf = Join_Profile(gdf, pd.read_csv(Get_Profile_File(File_Path), encoding='utf-8-sig'), pd.read_csv(Get_Profile_Region_File(File_Path), encoding='utf-8-sig'))
+
+	return gdf
@@ -0,0 +1,224 @@
+"""
+Profiler.py
+===========
+Lightweight instrumentation of the stages of the calc scripts.
+Profile_Stages(globals()) at the start of the main block wraps the Get_*, Calc_*, Mapping_* and Output_* functions defined in the script
+or imported by it from the modules of Common (e.g. the stages of the country engine, Common/Country.py);
+each call records its wall time, CPU time (including the worker processes joined during the call), peak RSS and rows in/out,
+and the records are written as a JSON run report (../output/output_log/<script>.Profile.json) when the script exits.
+The instrumentation is switched by "Profiling" in Layer_Output/Config.json; with "Profiling_Dump", the slowest top-level stage
+is also profiled with cProfile and dumped next to the report (<script>.<stage>.prof, readable by pstats or snakeviz).
+"""
+
+import pandas as pd
+import cProfile
+import functools
+import threading
+import inspect
+import datetime
+import atexit
+import json
+import time
+import os
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+# The prefixes of the instrumented functions
+List_Prefix = ('Get_', 'Calc_', 'Mapping_', 'Output_')
+
+# The records of the calls, and the profile of the slowest top-level stage
+State = {\
+	'Record': [], \
+	'Lock': threading.Lock(), \
+	'Local': threading.local(), \
+	'Pid': None, \
+	'Dump': False, \
+	'Slowest': None, \
+	'Time_Start': None, \
+}
+
+def Get_Peak_RSS():
+
+	"""
+	Get the peak resident set size (MB) of the process (since the last Reset_Peak_RSS on Linux, since the start of the process elsewhere).
+	"""
+
+	try:
+		with open('/proc/self/status', 'r') as f:
+			for i_Line in f:
+				if i_Line.startswith('VmHWM:'): return int(i_Line.split()[1]) / 1024
+	except OSError:
+		pass
+
+	if (resource is None): return None
+
+	# ru_maxrss is in kB on Linux and in bytes on macOS
+	Peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+	return Peak / 1024 ** 2 if (Peak > 1 << 32) else Peak / 1024
+
+def Reset_Peak_RSS():
+
+	try:
+		with open('/proc/self/clear_refs', 'w') as f: f.write('5')
+	except OSError:
+		pass
+
+	return
+
+def Get_CPU_Time():
+
+	"""
+	Get the CPU time of the process and its joined child processes (s).
+	"""
+
+	Times = os.times()
+
+	return Times.user + Times.system + Times.children_user + Times.children_system
+
+def Count_Rows(Value):
+
+	"""
+	Count the rows of the dataframes in a value (a dataframe, or a tuple, list or dict of dataframes); None if there is no dataframe.
+	"""
+
+	if isinstance(Value, (pd.DataFrame, pd.Series)): return len(Value)
+
+	if isinstance(Value, dict): Value = list(Value.values())
+
+	if isinstance(Value, (tuple, list)):
+
+		List_Row = [i for i in (Count_Rows(j) for j in Value) if (i is not None)]
+		return sum(List_Row) if (len(List_Row) > 0) else None
+
+	return None
+
+def Wrap_Stage(Function):
+
+	"""
+	Wrap a function to record its calls (see Profile_Stages).
+	"""
+
+	@functools.wraps(Function)
+	def Wrapper(*args, **kwargs):
+
+		# The calls in worker processes are not recorded
+		if (os.getpid() != State['Pid']): return Function(*args, **kwargs)
+
+		Depth   = getattr(State['Local'], 'Depth', 0)
+		Is_Main = (Depth == 0) and (threading.current_thread() is threading.main_thread())
+
+		# The peak RSS is measured from the start of each top-level stage
+		if (Is_Main): Reset_Peak_RSS()
+
+		Profiler = None
+		if (Is_Main) and (State['Dump']):
+			Profiler = cProfile.Profile()
+			Profiler.enable()
+
+		Time_Start = time.perf_counter()
+		CPU_Start  = Get_CPU_Time()
+		Status     = 'Failed'
+
+		State['Local'].Depth = Depth + 1
+
+		try:
+			Result = Function(*args, **kwargs)
+			Status = 'Done'
+		finally:
+			State['Local'].Depth = Depth
+			if (Profiler is not None): Profiler.disable()
+
+			Time_Wall = time.perf_counter() - Time_Start
+
+			with State['Lock']:
+
+				State['Record'].append({\
+					'Stage': Function.__name__, \
+					'Depth': Depth, \
+					'Status': Status, \
+					'Start': round(Time_Start - State['Time_Start'], 6), \
+					'Wall': round(Time_Wall, 6), \
+					'CPU': round(Get_CPU_Time() - CPU_Start, 6), \
+					'Peak_RSS': Get_Peak_RSS(), \
+					'Rows_In': Count_Rows(list(args) + list(kwargs.values())), \
+					'Rows_Out': Count_Rows(Result) if (Status == 'Done') else None, \
+				})
+
+				if (Profiler is not None) and ((State['Slowest'] is None) or (Time_Wall > State['Slowest'][1])): State['Slowest'] = (Function.__name__, Time_Wall, Profiler)
+
+		return Result
+
+	return Wrapper
+
+def Output_Report(Script, Log_Path):
+
+	"""
+	Output the JSON run report of the script (and the cProfile dump of the slowest top-level stage).
+	"""
+
+	if not os.path.exists(Log_Path): os.makedirs(Log_Path)
+
+	Profile_File = None
+	if (State['Slowest'] is not None):
+		Profile_File = Log_Path + '{}.{}.prof'.format(Script, State['Slowest'][0])
+		State['Slowest'][2].dump_stats(Profile_File)
+
+	List_Record = sorted(State['Record'], key=lambda i: i['Start'])
+	List_Top    = [i for i in List_Record if (i['Depth'] == 0)]
+
+	Report = {\
+		'Script': Script, \
+		'Date': datetime.datetime.now().isoformat(timespec='seconds'), \
+		'Wall': round(time.perf_counter() - State['Time_Start'], 6), \
+		'CPU': round(Get_CPU_Time(), 6), \
+		'Slowest': max(List_Top, key=lambda i: i['Wall'])['Stage'] if (len(List_Top) > 0) else None, \
+		'Profile_File': Profile_File, \
+		'Stage': List_Record, \
+	}
+
+	with open(Log_Path + Script + '.Profile.json', 'w', encoding='utf-8') as f: json.dump(Report, f, ensure_ascii=False, indent=4)
+
+	return
+
+def Profile_Stages(Namespace, Config_File='../../Layer_Output/Config.json', Log_Path='../output/output_log/'):
+
+	"""
+	Instrument the stages of a script.
+	==================================================================================================
+	Input:
+
+		Namespace: The global namespace of the script (globals()), whose Get_*, Calc_*, Mapping_* and Output_* functions are wrapped,
+			both those defined in the script and those imported from Common (the generator functions, e.g. chunk readers, are not wrapped).
+
+		Config_File: The configuration file ("Profiling": record the run report, "Profiling_Dump": dump the cProfile of the slowest stage).
+
+		Log_Path: The directory of the run report.
+
+	Output:
+
+		None
+	"""
+
+	with open(Config_File, 'r', encoding='utf-8') as f: config = json.load(f)
+
+	if not (config.get('Profiling', False)) and not (config.get('Profiling_Dump', False)): return
+
+	State['Pid']        = os.getpid()
+	State['Dump']       = bool(config.get('Profiling_Dump', False))
+	State['Time_Start'] = time.perf_counter()
+
+	for i_Name, i_Function in list(Namespace.items()):
+
+		# The functions defined in the script, or imported by it from Common (wrapped in the namespace of the script only)
+		if not (inspect.isfunction(i_Function)) or not ((i_Function.__module__ == Namespace['__name__']) or (str(i_Function.__module__).startswith('Common.'))): continue
+		if not (i_Name.startswith(List_Prefix)) or (inspect.isgeneratorfunction(i_Function)): continue
+
+		Namespace[i_Name] = Wrap_Stage(i_Function)
+
+	atexit.register(Output_Report, os.path.splitext(os.path.basename(Namespace['__file__']))[0], Log_Path)
+
+	return
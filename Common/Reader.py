@@ -0,0 +1,176 @@
+"""
+Reader.py
+=========
+Shared reader layer of the inputs of the stages.
+The selection is pushed into the underlying reader: the CSV parser converts only the selected columns, and GDAL (pyogrio)
+and the GeoParquet reader read only the selected fields of the features in the bounding box that pass the attribute filters.
+The compact dtypes (e.g. category for the labels repeated over the rows) are applied by the parser rather than after the read,
+and the bytes read and the memory of the result are reported per input.
+"""
+
+import pandas as pd
+import geopandas as gpd
+import os
+import time
+
+from Common.Cache import Is_Parquet_Available
+
+if (Is_Parquet_Available): import pyarrow.parquet
+
+# The SQL operators of GDAL of the filters (the other operators are the same in both)
+Dict_SQL_Operator = {\
+	'==': '=', \
+	'in': 'IN', \
+	'not in': 'NOT IN', \
+}
+
+def Get_Bytes_Read(File_Path, Columns=None):
+
+	"""
+	Get the bytes read from a file: the compressed column chunks of the selected columns of a Parquet file,
+	otherwise the whole file (a CSV is scanned in full even if only some columns are converted; a shapefile with its .shx and .dbf).
+	"""
+
+	if (File_Path.endswith('.parquet')) and (Is_Parquet_Available):
+
+		Metadata = pyarrow.parquet.ParquetFile(File_Path).metadata
+
+		return sum(\
+			Metadata.row_group(i).column(j).total_compressed_size \
+			for i in range(Metadata.num_row_groups) for j in range(Metadata.num_columns) \
+			if (Columns is None) or (Metadata.row_group(i).column(j).path_in_schema.split('.')[0] in Columns) \
+		)
+
+	if (File_Path.endswith('.shp')): return sum(os.path.getsize(os.path.splitext(File_Path)[0] + i) for i in ['.shp', '.shx', '.dbf'] if os.path.exists(os.path.splitext(File_Path)[0] + i))
+
+	return os.path.getsize(File_Path)
+
+def Report_Read(File_Path, df, Bytes_Read, Time_Read):
+
+	print('[Reader] {}: {:.2f} MB read, {} rows x {} columns, {:.2f} MB in memory ({:.3f}s)'.format(\
+		os.path.basename(File_Path), \
+		Bytes_Read / 2**20, \
+		len(df), \
+		df.shape[1], \
+		df.memory_usage(deep=True).sum() / 2**20, \
+		Time_Read, \
+	))
+
+	return
+
+def Read_Table(File_Path, Columns=None, Dtype=None, Encoding='utf-8', **Params):
+
+	"""
+	Read a CSV file, converting only the selected columns, with compact dtypes.
+	==================================================================================================
+	Input:
+
+		File_Path: The path of the CSV file.
+
+		Columns: The columns to read (a list, or a function of the column name, as usecols of pandas.read_csv; None: all columns).
+			The columns are returned in the order of the file.
+
+		Dtype: The dtype of each column (e.g. "category" for a label repeated over the rows).
+
+		Encoding: The encoding of the CSV file.
+
+		Params: The other parameters of pandas.read_csv (with chunksize, an iterator of the chunks is returned, see Iter_Table).
+
+	Output:
+
+		df: The selected columns.
+	"""
+
+	if ('chunksize' in Params): return Iter_Table(File_Path, Columns=Columns, Dtype=Dtype, Encoding=Encoding, **Params)
+
+	Time_Start = time.perf_counter()
+	df = pd.read_csv(File_Path, usecols=Columns, dtype=Dtype, encoding=Encoding, **Params)
+
+	Report_Read(File_Path, df, Get_Bytes_Read(File_Path), time.perf_counter() - Time_Start)
+
+	return df
+
+def Iter_Table(File_Path, Columns=None, Dtype=None, Encoding='utf-8', **Params):
+
+	"""
+	Read a CSV file chunk by chunk (see Read_Table), reporting the input once after the last chunk (the memory of the largest chunk).
+	"""
+
+	Time_Start = time.perf_counter()
+	n_Row      = 0
+	df_Largest = None
+
+	for df in pd.read_csv(File_Path, usecols=Columns, dtype=Dtype, encoding=Encoding, **Params):
+
+		n_Row += len(df)
+		if (df_Largest is None) or (len(df) > len(df_Largest)): df_Largest = df
+
+		yield df
+
+	if (df_Largest is None): return
+
+	print('[Reader] {}: {:.2f} MB read, {} rows x {} columns in chunks, {:.2f} MB in memory per chunk ({:.3f}s)'.format(\
+		os.path.basename(File_Path), \
+		Get_Bytes_Read(File_Path) / 2**20, \
+		n_Row, \
+		df_Largest.shape[1], \
+		df_Largest.memory_usage(deep=True).sum() / 2**20, \
+		time.perf_counter() - Time_Start, \
+	))
+
+def Get_SQL_Value(Value):
+
+	# The value of a filter as an SQL literal
+	if isinstance(Value, str): return "'" + Value.replace("'", "''") + "'"
+	if isinstance(Value, (list, tuple, set)): return '(' + ', '.join(Get_SQL_Value(i) for i in Value) + ')'
+
+	return str(Value)
+
+def Get_Where(Filters):
+
+	# The filters as the SQL WHERE clause of GDAL (the filters are combined by AND)
+	return ' AND '.join('"{}" {} {}'.format(i, Dict_SQL_Operator.get(j, j), Get_SQL_Value(k)) for i, j, k in Filters)
+
+def Read_Geometry(File_Path, Columns=None, Bbox=None, Filters=None):
+
+	"""
+	Read a geometry layer (a shapefile or any layer of GDAL, or a GeoParquet file), with the selection pushed into the reader
+	(GDAL through the default reader of geopandas, which decodes the attributes of the source layers as before).
+	==================================================================================================
+	Input:
+
+		File_Path: The path of the layer.
+
+		Columns: The attribute columns to read (None: all columns), the geometry is always read.
+
+		Bbox: The bounding box (minx, miny, maxx, maxy, in the CRS of the layer) of the features to read (None: all features).
+			A GeoParquet file needs the bbox covering column (written by Output_Layer and Build_Pyramid).
+
+		Filters: The attribute filters of the features to read, as a list of (column, operator, value) combined by AND,
+			with the operators "==", "!=", "<", "<=", ">", ">=", "in" and "not in" (None: all features).
+
+	Output:
+
+		gdf: The layer.
+	"""
+
+	# The columns of the filters are read as well, and dropped after the read
+	Columns_Read = None if (Columns is None) else list(dict.fromkeys(list(Columns) + [i[0] for i in (Filters or [])]))
+
+	Time_Start = time.perf_counter()
+
+	if (File_Path.endswith('.parquet')):
+		gdf = gpd.read_parquet(File_Path, columns=(None if (Columns_Read is None) else Columns_Read + ['geometry']), bbox=Bbox, filters=Filters)
+	else:
+		gdf = gpd.read_file(\
+			File_Path, \
+			columns=Columns_Read, \
+			bbox=Bbox, \
+			where=(None if (Filters is None) else Get_Where(Filters)), \
+		)
+
+	if (Columns_Read is not None): gdf = gdf.drop(columns=[i for i in Columns_Read if (i not in Columns)])
+
+	Report_Read(File_Path, gdf, Get_Bytes_Read(File_Path, Columns=(None if (Columns_Read is None) else Columns_Read + ['geometry'] + (['bbox'] if (Bbox is not None) else []))), time.perf_counter() - Time_Start)
+
+	return gdf
@@ -0,0 +1,261 @@
+"""
+Scenario.py
+===========
+Scenario cube of the merged global layer: the EUI of every scenario, region and class in one N-D store
+(Zarr, or NetCDF if zarr is not available), instead of one layer file per run.
+The store holds the variables Coef_CIE (Scenario x Region) and EUI, Lower, Upper (Scenario x Region x Class; Lower and Upper
+only if the confidence interval is calculated), chunked by scenario and compressed; the regions are the features of the
+merged layer, whose geometry is written once next to the store (<store>.Region.<ext>, keyed by REGION).
+A single scenario is exported to a layer on demand by Output_Scenario_Layer.
+The store is selected by "Scenario_Store" in Layer_Output/Config.json.
+"""
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import json
+import os
+
+from Common.Output import Dict_Extension, Read_Layer, Output_Layer
+
+try:
+	import xarray as xr
+	Is_Xarray_Available = True
+except ImportError:
+	Is_Xarray_Available = False
+
+try:
+	import zarr
+	Is_Zarr_Available = True
+except ImportError:
+	Is_Zarr_Available = False
+
+# The file extension of each store
+Dict_Store_Extension = {\
+	'Zarr': '.zarr', \
+	'NetCDF': '.nc', \
+}
+
+# The variables over the classes, and the prefix of their columns in the layer
+Dict_Class_Variable = {\
+	'EUI': 'EUI_', \
+	'Lower': 'Lower_', \
+	'Upper': 'Upper_', \
+}
+
+def Get_Scenario_Store(Config_File='../../Layer_Output/Config.json'):
+
+	"""
+	Get the store of the scenario cube selected in Config.json (Zarr if not set).
+	Zarr falls back to NetCDF when zarr is not available.
+	"""
+
+	with open(Config_File, 'r', encoding='utf-8') as f: config = json.load(f)
+
+	Scenario_Store = config.get('Scenario_Store', 'Zarr')
+
+	if (Scenario_Store not in Dict_Store_Extension): raise ValueError('Unknown scenario store: {} (available: {})'.format(Scenario_Store, ', '.join(Dict_Store_Extension)))
+
+	if not (Is_Xarray_Available): raise ImportError('The scenario cube requires xarray')
+
+	if (Scenario_Store == 'Zarr') and not (Is_Zarr_Available):
+		print('[Scenario] zarr is not available, Zarr falls back to NetCDF')
+		Scenario_Store = 'NetCDF'
+
+	return Scenario_Store
+
+def Get_Region_File(Cube_File, Output_Format='Shapefile'):
+
+	# The geometry of the regions, written once next to the store
+	return os.path.splitext(Cube_File)[0] + '.Region' + Dict_Extension[Output_Format]
+
+def Get_Region_Layer_File(Cube_File, Output_Format='Shapefile'):
+
+	"""
+	Get the geometry file of the regions of the store, preferring the output format.
+	"""
+
+	for i_Format in [Output_Format] + [i for i in Dict_Extension if (i != Output_Format)]:
+
+		if os.path.exists(Get_Region_File(Cube_File, i_Format)): return Get_Region_File(Cube_File, i_Format)
+
+	raise FileNotFoundError('No region geometry of {}'.format(Cube_File))
+
+def Calc_Cube(Dict_Layer, Dict_Attribute=None):
+
+	"""
+	Arrange the merged layers of the scenarios as a cube.
+	==================================================================================================
+	Input:
+
+		Dict_Layer: The merged layer of each scenario (the same features in the same order, e.g. built on shared geometry).
+
+		Dict_Attribute: The definition of each scenario (a dict of strings/numbers per scenario), stored as coordinates along Scenario.
+
+	Output:
+
+		Cube: The cube (xarray Dataset).
+	"""
+
+	List_Scenario = list(Dict_Layer.keys())
+	gdf_First     = Dict_Layer[List_Scenario[0]]
+
+	# The label columns (e.g. COUNTRY, REGNAME) are the coordinates of the regions, and must be the same in all scenarios
+	List_Label = [i for i in gdf_First.columns if (i != 'Coef_CIE') and not (i.startswith(tuple(Dict_Class_Variable.values()))) and (i != gdf_First.geometry.name)]
+	df_Label   = pd.DataFrame(gdf_First[List_Label]).reset_index(drop=True)
+
+	for i_Scenario in List_Scenario[1:]:
+
+		if not (df_Label.equals(pd.DataFrame(Dict_Layer[i_Scenario][List_Label]).reset_index(drop=True))): raise ValueError('The regions of scenario {} differ from those of scenario {}'.format(i_Scenario, List_Scenario[0]))
+
+	# The columns of the layers (in the order of first appearance), and the classes of all variables
+	List_Column = list(dict.fromkeys(i for j in Dict_Layer.values() for i in j.columns if (i != j.geometry.name)))
+	List_Class  = list(dict.fromkeys(i[len(j):] for i in List_Column for j in Dict_Class_Variable.values() if i.startswith(j)))
+
+	Dict_Variable = {'Coef_CIE': (['Scenario', 'Region'], np.stack([\
+		(Dict_Layer[i]['Coef_CIE'].to_numpy(dtype=np.float32) if ('Coef_CIE' in Dict_Layer[i].columns) else np.full(len(df_Label), np.nan, dtype=np.float32)) for i in List_Scenario \
+	]))}
+
+	for i_Variable, i_Prefix in Dict_Class_Variable.items():
+
+		if not (any(i.startswith(i_Prefix) for i in List_Column)): continue
+
+		# Classes missing from a scenario are left empty
+		Dict_Variable[i_Variable] = (['Scenario', 'Region', 'Class'], np.stack([\
+			pd.DataFrame(Dict_Layer[i][[j for j in Dict_Layer[i].columns if j.startswith(i_Prefix)]]).rename(columns=lambda j: j[len(i_Prefix):]).reindex(columns=List_Class).to_numpy(dtype=np.float32) \
+			for i in List_Scenario \
+		]))
+
+	Dict_Coord = {\
+		'Scenario': List_Scenario, \
+		'Region': np.arange(len(df_Label)), \
+		'Class': List_Class, \
+	}
+
+	# The labels of the regions (the missing labels are stored as empty strings)
+	Dict_Coord.update({i: ('Region', df_Label[i].where(df_Label[i].notna(), '').astype(str).to_numpy()) for i in List_Label})
+
+	# The definition of the scenarios
+	if (Dict_Attribute is not None):
+		for i_Key in dict.fromkeys(j for i in Dict_Attribute.values() for j in i):
+			Dict_Coord[i_Key] = ('Scenario', [json.dumps(Dict_Attribute[i].get(i_Key), ensure_ascii=False) if isinstance(Dict_Attribute[i].get(i_Key), (dict, list)) else str(Dict_Attribute[i].get(i_Key)) for i in List_Scenario])
+
+	Cube = xr.Dataset(Dict_Variable, coords=Dict_Coord)
+
+	# The columns of the layer of each scenario (restored on export), and the label columns
+	Cube.coords['Layer_Columns'] = ('Scenario', [json.dumps([j for j in Dict_Layer[i].columns if (j != Dict_Layer[i].geometry.name)], ensure_ascii=False) for i in List_Scenario])
+	Cube.attrs['Label_Columns'] = json.dumps(List_Label, ensure_ascii=False)
+
+	return Cube
+
+def Output_Cube(Cube, gdf_Region, Output_Path, Output_Name, Scenario_Store='Zarr', Output_Format='Shapefile'):
+
+	"""
+	Output the cube to the store (chunked by scenario, compressed), and the geometry of its regions next to it.
+	==================================================================================================
+	Input:
+
+		Cube: The cube (see Calc_Cube).
+
+		gdf_Region: A merged layer of the cube (whose geometry is written, keyed by REGION).
+
+		Output_Path: The output directory.
+
+		Output_Name: The output file name (the extension is replaced by that of the store).
+
+		Scenario_Store: "Zarr" or "NetCDF".
+
+		Output_Format: The output format of the geometry of the regions.
+
+	Output:
+
+		Output_File: The path of the store.
+	"""
+
+	if not os.path.exists(Output_Path): os.makedirs(Output_Path)
+
+	Output_File = Output_Path + os.path.splitext(Output_Name)[0] + Dict_Store_Extension[Scenario_Store]
+
+	# One chunk per scenario (a scenario is read or exported as a whole)
+	Dict_Encoding = {}
+	for i_Variable in Cube.data_vars:
+
+		Chunk = (1,) + Cube[i_Variable].shape[1:]
+		Dict_Encoding[i_Variable] = {'chunks': Chunk} if (Scenario_Store == 'Zarr') else {'zlib': True, 'complevel': 4, 'chunksizes': Chunk}
+
+	if (Scenario_Store == 'Zarr'):
+		Cube.to_zarr(Output_File, mode='w', encoding=Dict_Encoding)
+	else:
+		Cube.to_netcdf(Output_File, encoding=Dict_Encoding)
+
+	# The geometry of the regions (the features are keyed by REGION, since FlatGeobuf reorders them)
+	gdf_Region = gpd.GeoDataFrame({'REGION': np.arange(len(gdf_Region))}, geometry=gdf_Region.geometry.to_numpy(), crs=gdf_Region.crs)
+	Output_Layer(gdf_Region, os.path.dirname(Output_File) + '/', os.path.basename(Get_Region_File(Output_File, Output_Format)), Output_Format=Output_Format)
+
+	return Output_File
+
+def Read_Cube(Cube_File):
+
+	"""
+	Read the cube from the store (lazily, a scenario is loaded when selected).
+	"""
+
+	if (Cube_File.endswith('.zarr')): return xr.open_zarr(Cube_File)
+
+	return xr.open_dataset(Cube_File)
+
+def Get_Scenario_Layer(Cube_File, Scenario, Output_Format='Shapefile'):
+
+	"""
+	Get the merged layer of a scenario from the cube.
+	==================================================================================================
+	Input:
+
+		Cube_File: The path of the store.
+
+		Scenario: The name of the scenario.
+
+		Output_Format: The output format preferred for the geometry of the regions.
+
+	Output:
+
+		gdf: The merged layer of the scenario.
+	"""
+
+	Cube = Read_Cube(Cube_File)
+
+	if (Scenario not in Cube.indexes['Scenario']): raise KeyError('No scenario {} in {} (available: {})'.format(Scenario, Cube_File, ', '.join(Cube.indexes['Scenario'])))
+
+	Cube = Cube.sel(Scenario=Scenario).load()
+
+	# The label columns, the CIE coef and the columns of the class variables
+	df = pd.DataFrame({i: pd.Series(Cube[i].to_numpy().astype(object)).replace('', None) for i in json.loads(Cube.attrs['Label_Columns'])})
+	df['Coef_CIE'] = Cube['Coef_CIE'].to_numpy().astype(np.float64)
+
+	for i_Variable, i_Prefix in Dict_Class_Variable.items():
+
+		if (i_Variable not in Cube.data_vars): continue
+
+		df = pd.concat([df, pd.DataFrame(Cube[i_Variable].to_numpy().astype(np.float64), columns=[i_Prefix + i for i in Cube.indexes['Class']])], axis=1)
+
+	# Restore the values written to the layer (1 digit) from the 32-bit floats of the store, and the columns of the layer of the scenario
+	df[df.select_dtypes('number').columns] = df.select_dtypes('number').round(1)
+	df = df[json.loads(str(Cube['Layer_Columns'].item()))]
+
+	# Attach the geometry of the regions
+	gdf_Region = Read_Layer(Get_Region_Layer_File(Cube_File, Output_Format=Output_Format))
+	gdf_Region = gdf_Region.set_index('REGION').reindex(Cube.indexes['Region'])
+
+	gdf = gpd.GeoDataFrame(df, geometry=gdf_Region.geometry.to_numpy(), crs=gdf_Region.crs)
+
+	return gdf
+
+def Output_Scenario_Layer(Cube_File, Scenario, Output_Path, Output_Name, Output_Format='Shapefile', Output_Profile=False):
+
+	"""
+	Export a scenario of the cube to a layer in the output format (see Output_Layer).
+	"""
+
+	gdf = Get_Scenario_Layer(Cube_File, Scenario, Output_Format=Output_Format)
+
+	return Output_Layer(gdf, Output_Path, Output_Name, Output_Format=Output_Format, Profile_Columns=([i for i in gdf.columns if i.startswith(tuple(Dict_Class_Variable.values()))] if (Output_Profile) else None))
@@ -0,0 +1,43 @@
+"""
+Script.py
+=========
+Loading the calc scripts of the stages as modules, to call their functions from another script in the same process
+(e.g. the scenario engine and the benchmarks). The calc scripts read and write their files relative to their own calc/
+directory, so their functions are called inside In_Directory(<calc directory>).
+"""
+
+import importlib.util
+import contextlib
+import os
+import sys
+
+def Load_Script(Script_Path, Prefix='Script'):
+
+	"""
+	Load a stage script (whose file name is not a valid module name) as a module, without running its main block.
+	"""
+
+	Name   = Prefix + '_' + os.path.splitext(os.path.basename(Script_Path))[0].replace('.', '_') + '_' + os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(Script_Path))))
+	Spec   = importlib.util.spec_from_file_location(Name, Script_Path)
+	Module = importlib.util.module_from_spec(Spec)
+
+	# Registered so that the functions of the module can be sent to worker processes
+	sys.modules[Name] = Module
+	Spec.loader.exec_module(Module)
+
+	return Module
+
+@contextlib.contextmanager
+def In_Directory(Path):
+
+	"""
+	Change the working directory for the duration of the block (the calc directory of the script whose functions are called).
+	"""
+
+	Path_Previous = os.getcwd()
+	os.chdir(Path)
+
+	try:
+		yield
+	finally:
+		os.chdir(Path_Previous)
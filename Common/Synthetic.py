@@ -0,0 +1,209 @@
+"""
+Synthetic.py
+============
+Synthetic data generators of configurable size for benchmarking the stages (see Benchmark/calc/calc.Benchmark.py).
+The generated tables have the columns and value domains of the real inputs, so that every stage runs its full code path,
+and the same size and seed always yield the same data.
+"""
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# The building types of DECC
+List_DECC_BuildingType = [\
+	'その他', 'その他物販', 'コンビニ', 'スポーツ施設', 'デパート・スーパー', 'ホテル・旅館', '一般小売', '事務所', \
+	'劇場・ホール', '大学・専門学校', '官公庁', '家電量販店', '小・中学校', '展示施設', '幼稚園・保育園', '病院', \
+	'研究機関', '福祉施設', '複合施設', '郊外大型店舗', '電算・情報センター', '飲食店', '高校', \
+]
+
+# The prefectures of Japan
+List_Prefecture = [\
+	'北海道', '青森県', '岩手県', '宮城県', '秋田県', '山形県', '福島県', '茨城県', '栃木県', '群馬県', '埼玉県', '千葉県', \
+	'東京都', '神奈川県', '新潟県', '富山県', '石川県', '福井県', '山梨県', '長野県', '岐阜県', '静岡県', '愛知県', '三重県', \
+	'滋賀県', '京都府', '大阪府', '兵庫県', '奈良県', '和歌山県', '鳥取県', '島根県', '岡山県', '広島県', '山口県', '徳島県', \
+	'香川県', '愛媛県', '高知県', '福岡県', '佐賀県', '長崎県', '熊本県', '大分県', '宮崎県', '鹿児島県', '沖縄県', \
+]
+
+# The IECC climate zones of the U.S. counties
+List_ClimateZone = ['1A', '2A', '2B', '3A', '3B', '3C', '4A', '4B', '4C', '5A', '5B', '6A', '6B', '7', '8']
+
+# The market sectors of Energy Star (the first one is the residential sector)
+List_EnergyStar_Sector = [\
+	'Lodging/Residential', 'Banking/Financial Services', 'Education', 'Public Assembly', 'Food Sales & Service', 'Healthcare', \
+	'Mixed Use', 'Office', 'Public Services', 'Retail', 'Technology/Science', 'Services', 'Utility', 'Warehouse/Storage', \
+]
+
+# The climate zones of the climate statistical EUI
+List_Zone = ['Cold-dry', 'Cold-humid', 'Hot-dry', 'Hot-humid', 'Hot-marine', 'Mixed-dry', 'Mixed-humid', 'Mixed-marine']
+
+# The DECC regions of Japan and the climate regions of the U.S. (the rows of the group EUI of the layers)
+List_JP_Region = ['北海道', '東北', '北信越', '關東', '中部', '關西', '中國四國', '九州']
+List_US_Region = ['乾冷氣候區', '溼冷氣候區', '乾熱氣候區', '溼熱氣候區', '海洋性熱氣候區', '乾混合氣候區', '溼混合氣候區', '海洋性混合氣候區']
+
+def Get_DECC(n_Row, Seed=0):
+
+	"""
+	Get the raw rows of DECC (the columns of DECC.csv), with 1% of abnormal building IDs and 1% of missing values.
+	"""
+
+	Rng = np.random.default_rng(Seed)
+
+	Region = Rng.choice(list('ABCDEFGH'), n_Row)
+	Region[Rng.random(n_Row) < 0.01] = 'X'
+
+	Electricity = Rng.gamma(4, 25, n_Row)
+	Electricity[Rng.random(n_Row) < 0.01] = np.nan
+
+	return pd.DataFrame({\
+		'建物ID': pd.Series(Region, dtype=object) + pd.Series(np.arange(n_Row)).astype(str).str.zfill(7), \
+		'建物用途': Rng.choice(List_DECC_BuildingType, n_Row), \
+		'延床面積': Rng.lognormal(9, 1, n_Row), \
+		'電力_年合計(kWh/㎡・年)': Electricity, \
+		'一次エネルギー原単位_MJ/㎡・年': Electricity * Rng.normal(9, 1, n_Row), \
+		'備考': '', \
+	})
+
+def Get_EnergyStar(n_Row, Seed=0):
+
+	"""
+	Get the rows of Energy Star EUI (as read by Read_EUI_EnergyStar: Market Sector, Property type, EUI).
+	"""
+
+	Rng = np.random.default_rng(Seed)
+
+	Sector = Rng.choice(List_EnergyStar_Sector, n_Row)
+
+	return pd.DataFrame({\
+		'Market Sector': Sector, \
+		'Property type': pd.Series(Sector, dtype=object) + ' ' + pd.Series(Rng.integers(1, 5, n_Row)).astype(str), \
+		'EUI': Rng.gamma(4, 60, n_Row), \
+	})
+
+def Get_ClimateStatistical(n_Row, Seed=0):
+
+	"""
+	Get the climate statistical EUI in long format (Year, Sector, Zone, EUI), as many years as needed for n_Row rows.
+	"""
+
+	Rng = np.random.default_rng(Seed)
+
+	Index = np.arange(n_Row)
+
+	return pd.DataFrame({\
+		'Year': (2010 + Index // (2 * len(List_Zone))).astype(str), \
+		'Sector': np.where((Index // len(List_Zone)) % 2 == 0, 'Commercial', 'Residential'), \
+		'Zone': np.array(List_Zone)[Index % len(List_Zone)], \
+		'EUI': Rng.gamma(4, 50, n_Row), \
+	})
+
+def Get_Mapping(n_Source, List_Region, Label_Columns, Group_Size=5, Seed=0):
+
+	"""
+	Get a source table and the mapping configurations of space-class and collateral-class.
+	==================================================================================================
+	Input:
+
+		n_Source: The number of rows of the source table (one row per building type).
+
+		List_Region: The regions of the EUI columns of the source table (EUI_<region>).
+
+		Label_Columns: The label columns of the source table (e.g. ["建物用途"]).
+
+		Group_Size: The maximum number of source codes (space codes) of a space-class (collateral-class) mapping row.
+
+	Output:
+
+		df_Source: The source table (建物用途序號, the label columns and the EUI columns, 2% of missing values).
+
+		df_Mapping_SpaceClass: The mapping configurations of space-class (one row per Group_Size source rows).
+
+		df_Mapping_CollateralClass: The mapping configurations of collateral-class (one row per Group_Size space-classes).
+	"""
+
+	Rng = np.random.default_rng(Seed)
+
+	EUI = Rng.gamma(4, 25, (n_Source, len(List_Region)))
+	EUI[Rng.random(EUI.shape) < 0.02] = np.nan
+
+	df_Source = pd.DataFrame(EUI, columns=['EUI_{}'.format(i) for i in List_Region])
+	for i_Column in reversed(Label_Columns): df_Source.insert(0, i_Column, pd.Series(np.arange(n_Source) % 97).astype(str).radd('Type_').to_numpy())
+	df_Source.insert(0, '建物用途序號', np.arange(1, n_Source + 1).astype(str))
+
+	def Get_Code(List_Code, n_Mapping):
+
+		# Join 1 to Group_Size random codes per mapping row (a single code, or a group of codes such as "2, 3, 5")
+		Size = Rng.integers(1, Group_Size + 1, n_Mapping)
+		Code = np.array(List_Code, dtype=object)[Rng.integers(0, len(List_Code), Size.sum())]
+
+		return [', '.join(i) for i in np.split(Code.astype(str), np.cumsum(Size)[:-1])]
+
+	n_SpaceClass = max(1, n_Source // Group_Size)
+	df_Mapping_SpaceClass = pd.DataFrame({\
+		'空間代號': ['S{}'.format(i) for i in range(n_SpaceClass)], \
+		'使用空間名稱': ['Space_{}'.format(i) for i in range(n_SpaceClass)], \
+		'建築能耗原始分區': Get_Code(df_Source['建物用途序號'].tolist(), n_SpaceClass), \
+	})
+
+	n_CollateralClass = max(1, n_SpaceClass // Group_Size)
+	df_Mapping_CollateralClass = pd.DataFrame({\
+		'擔保品細項': np.arange(1, n_CollateralClass + 1), \
+		'細項名稱': ['Collateral_{}'.format(i) for i in range(n_CollateralClass)], \
+		'空間代號': Get_Code(df_Mapping_SpaceClass['空間代號'].tolist(), n_CollateralClass), \
+	})
+
+	return df_Source, df_Mapping_SpaceClass, df_Mapping_CollateralClass
+
+def Get_Group_EUI(List_Region, n_Class=78, Seed=0):
+
+	"""
+	Get the group EUI of the layers (one row "EUI_<region>" per region, one column "EUI_<class>" per class).
+	"""
+
+	Rng = np.random.default_rng(Seed)
+
+	return pd.DataFrame(\
+		Rng.gamma(4, 25, (len(List_Region), n_Class)).round(2), \
+		index=['EUI_{}'.format(i) for i in List_Region], \
+		columns=['EUI_{:02d}'.format(i) for i in range(1, n_Class + 1)], \
+	)
+
+def Get_Layer(n_Polygon, Dict_Column, Bounds=(-180, -60, 180, 80), n_Vertex=16, Seed=0):
+
+	"""
+	Get a polygon layer (EPSG:4326) of n_Polygon cells on a grid over the bounds.
+	==================================================================================================
+	Input:
+
+		n_Polygon: The number of polygons.
+
+		Dict_Column: The columns of the layer, each a constant, an array of n_Polygon values, or a list of values drawn at random.
+
+		Bounds: The bounds of the grid (min x, min y, max x, max y).
+
+		n_Vertex: The number of vertices of each polygon (cells inscribed as regular polygons).
+
+	Output:
+
+		gdf: The layer.
+	"""
+
+	Rng = np.random.default_rng(Seed)
+
+	n_Column = max(1, int(np.ceil(np.sqrt(n_Polygon))))
+	Width    = (Bounds[2] - Bounds[0]) / n_Column
+	Height   = (Bounds[3] - Bounds[1]) / n_Column
+
+	# The centre of each cell, and the vertices of the polygon inscribed in it
+	Index  = np.arange(n_Polygon)
+	X      = Bounds[0] + (Index % n_Column + 0.5) * Width
+	Y      = Bounds[1] + (Index // n_Column + 0.5) * Height
+	Angle  = np.linspace(0, 2 * np.pi, n_Vertex, endpoint=False)
+	Coord  = np.stack([X[:, np.newaxis] + 0.45 * Width * np.cos(Angle), Y[:, np.newaxis] + 0.45 * Height * np.sin(Angle)], axis=-1)
+
+	gdf = gpd.GeoDataFrame({\
+		i: (Rng.choice(np.array(j, dtype=object), n_Polygon) if isinstance(j, list) else j) for i, j in Dict_Column.items() \
+	}, index=pd.RangeIndex(n_Polygon), geometry=shapely.polygons(np.concatenate([Coord, Coord[:, :1]], axis=1)), crs='epsg:4326')
+
+	return gdf
@@ -0,0 +1,255 @@
+"""
+VectorTile.py
+=============
+Mapbox Vector Tile (MVT 2.1) encoder and MBTiles writer for the polygon layers, without any tile server or tiling tool.
+The polygons of each tile are clipped, quantized to the tile extent and encoded as protocol buffers directly.
+"""
+
+import numpy as np
+import shapely
+import sqlite3
+import struct
+import json
+import gzip
+import os
+
+# Half of the circumference of the Web Mercator world (m), and the latitude limit of Web Mercator
+Origin_Shift = 20037508.342789244
+Latitude_Max = 85.0511287798066
+
+def Get_Tile_Size(Zoom):
+
+	"""
+	Get the size (m, Web Mercator) of a tile at the zoom level.
+	"""
+
+	return 2 * Origin_Shift / (1 << Zoom)
+
+def Get_Tile_Bounds(Zoom, X, Y):
+
+	"""
+	Get the bounds (min x, min y, max x, max y; m, Web Mercator) of a tile (XYZ scheme, Y from the north).
+	"""
+
+	Size = Get_Tile_Size(Zoom)
+
+	return (-Origin_Shift + X * Size, Origin_Shift - (Y + 1) * Size, -Origin_Shift + (X + 1) * Size, Origin_Shift - Y * Size)
+
+def Get_Tile_Cover(Bounds, Zoom):
+
+	"""
+	Get the tiles covered by the bounding boxes.
+	==================================================================================================
+	Input:
+
+		Bounds: The 2-D array of bounding boxes (min x, min y, max x, max y; m, Web Mercator).
+
+		Zoom: The zoom level.
+
+	Output:
+
+		Set_Tile: The (X, Y) of the tiles intersecting any of the bounding boxes.
+	"""
+
+	n_Tile = 1 << Zoom
+	Size   = Get_Tile_Size(Zoom)
+
+	X_Min = np.clip(np.floor((Bounds[:, 0] + Origin_Shift) / Size), 0, n_Tile - 1).astype(int)
+	X_Max = np.clip(np.floor((Bounds[:, 2] + Origin_Shift) / Size), 0, n_Tile - 1).astype(int)
+	Y_Min = np.clip(np.floor((Origin_Shift - Bounds[:, 3]) / Size), 0, n_Tile - 1).astype(int)
+	Y_Max = np.clip(np.floor((Origin_Shift - Bounds[:, 1]) / Size), 0, n_Tile - 1).astype(int)
+
+	Set_Tile = set()
+	for i_X_Min, i_X_Max, i_Y_Min, i_Y_Max in zip(X_Min, X_Max, Y_Min, Y_Max):
+		Set_Tile.update((i_X, i_Y) for i_X in range(i_X_Min, i_X_Max + 1) for i_Y in range(i_Y_Min, i_Y_Max + 1))
+
+	return Set_Tile
+
+def Clip_Tile(Geometry, Bounds, Extent=4096, Buffer=64):
+
+	"""
+	Clip the polygons to a tile and convert them to tile coordinates.
+	==================================================================================================
+	Input:
+
+		Geometry: The array of polygons (m, Web Mercator).
+
+		Bounds: The bounds of the tile.
+
+		Extent: The size of the tile in tile coordinates.
+
+		Buffer: The width of the area clipped around the tile (in tile coordinates).
+
+	Output:
+
+		Geometry: The array of polygons in tile coordinates (integers, Y from the top, exterior rings of positive area).
+	"""
+
+	Size   = Bounds[2] - Bounds[0]
+	Margin = Size * Buffer / Extent
+
+	Geometry = shapely.clip_by_rect(Geometry, Bounds[0] - Margin, Bounds[1] - Margin, Bounds[2] + Margin, Bounds[3] + Margin)
+	Geometry = shapely.transform(Geometry, lambda Coord: np.column_stack([(Coord[:, 0] - Bounds[0]) / Size * Extent, (Bounds[3] - Coord[:, 1]) / Size * Extent]))
+
+	# Snap to the integer grid (collapsed rings are removed), and orient the rings as required by MVT
+	Geometry = shapely.set_precision(Geometry, 1.0)
+	Geometry = shapely.orient_polygons(Geometry, exterior_cw=False)
+
+	return Geometry
+
+def Encode_Varint(Value):
+
+	if (Value < 0x80): return bytes((Value,))
+
+	Buffer = bytearray()
+
+	while (Value > 0x7F):
+		Buffer.append((Value & 0x7F) | 0x80)
+		Value >>= 7
+	Buffer.append(Value)
+
+	return bytes(Buffer)
+
+def Encode_Key(Field, Wire_Type):
+
+	return Encode_Varint((Field << 3) | Wire_Type)
+
+def Encode_Bytes(Field, Data):
+
+	return Encode_Key(Field, 2) + Encode_Varint(len(Data)) + Data
+
+def Encode_Packed(Field, List_Value):
+
+	return Encode_Bytes(Field, b''.join(Encode_Varint(i) for i in List_Value))
+
+def Encode_Value(Value):
+
+	"""
+	Encode an attribute value (string, double or signed integer) as an MVT Value message.
+	"""
+
+	if isinstance(Value, str): return Encode_Bytes(1, Value.encode('utf-8'))
+
+	if isinstance(Value, (float, np.floating)): return Encode_Key(3, 1) + struct.pack('<d', Value)
+
+	return Encode_Key(6, 0) + Encode_Varint(2 * int(Value) if (Value >= 0) else -2 * int(Value) - 1)
+
+def Encode_Geometry(Geometry):
+
+	"""
+	Encode a polygon or multipolygon in tile coordinates as MVT geometry commands (MoveTo, LineTo, ClosePath).
+	"""
+
+	List_Command = []
+	Cursor = np.zeros((1, 2), dtype=np.int64)
+
+	for i_Polygon in shapely.get_parts(shapely.get_parts(Geometry)):
+
+		if (shapely.get_type_id(i_Polygon) != 3): continue
+
+		for i_Ring in [i_Polygon.exterior] + list(i_Polygon.interiors):
+
+			# The closing point is implied by ClosePath
+			Coord = shapely.get_coordinates(i_Ring).astype(np.int64)[:-1]
+			if (len(Coord) < 3): continue
+
+			Delta  = np.diff(Coord, axis=0, prepend=Cursor).ravel()
+			Cursor = Coord[-1:]
+			Param  = np.where(Delta >= 0, 2 * Delta, -2 * Delta - 1).tolist()
+
+			List_Command += [(1 | (1 << 3))] + Param[:2] + [(2 | ((len(Coord) - 1) << 3))] + Param[2:] + [(7 | (1 << 3))]
+
+	return List_Command
+
+def Get_Attribute_Records(df):
+
+	"""
+	Get the attributes of each feature as a list of (key, value) pairs, omitting NaN.
+	"""
+
+	return [[(i, j) for i, j in i_Row.items() if not ((j is None) or (isinstance(j, float) and np.isnan(j)))] for i_Row in df.to_dict('records')]
+
+def Encode_Layer(Layer_Name, Geometry, List_Attribute, Extent=4096):
+
+	"""
+	Encode the polygons and their attributes as an MVT layer.
+	==================================================================================================
+	Input:
+
+		Layer_Name: The name of the layer.
+
+		Geometry: The array of polygons in tile coordinates.
+
+		List_Attribute: The attributes of each polygon (see Get_Attribute_Records).
+
+		Extent: The size of the tile in tile coordinates.
+
+	Output:
+
+		Layer: The encoded layer (None if the layer has no feature).
+	"""
+
+	Dict_Key     = {}
+	Dict_Value   = {}
+	List_Feature = []
+
+	for i_Geometry, i_Attribute in zip(Geometry, List_Attribute):
+
+		List_Command = Encode_Geometry(i_Geometry)
+		if (len(List_Command) == 0): continue
+
+		List_Tag = []
+		for i_Key, i_Value in i_Attribute:
+
+			List_Tag += [\
+				Dict_Key.setdefault(i_Key, len(Dict_Key)), \
+				Dict_Value.setdefault((type(i_Value), i_Value), len(Dict_Value)), \
+			]
+
+		List_Feature.append(Encode_Bytes(2, Encode_Packed(2, List_Tag) + Encode_Key(3, 0) + Encode_Varint(3) + Encode_Packed(4, List_Command)))
+
+	if (len(List_Feature) == 0): return None
+
+	return \
+		Encode_Key(15, 0) + Encode_Varint(2) + \
+		Encode_Bytes(1, Layer_Name.encode('utf-8')) + \
+		b''.join(List_Feature) + \
+		b''.join(Encode_Bytes(3, i.encode('utf-8')) for i in Dict_Key) + \
+		b''.join(Encode_Bytes(4, Encode_Value(i[1])) for i in Dict_Value) + \
+		Encode_Key(5, 0) + Encode_Varint(Extent)
+
+def Encode_Tile(List_Layer):
+
+	"""
+	Encode the layers of a tile (gzip-compressed, as stored in MBTiles).
+	"""
+
+	return gzip.compress(b''.join(Encode_Bytes(3, i) for i in List_Layer), mtime=0)
+
+def Create_MBTiles(File_Path, Dict_Metadata):
+
+	"""
+	Create an empty MBTiles archive (removing the existing one) with the metadata.
+	"""
+
+	if os.path.exists(File_Path): os.remove(File_Path)
+
+	Connection = sqlite3.connect(File_Path)
+	Connection.execute('CREATE TABLE metadata (name TEXT, value TEXT)')
+	Connection.execute('CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)')
+	Connection.execute('CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)')
+	Connection.executemany('INSERT INTO metadata VALUES (?, ?)', [(i, j if isinstance(j, str) else json.dumps(j, ensure_ascii=False)) for i, j in Dict_Metadata.items()])
+	Connection.commit()
+
+	return Connection
+
+def Insert_Tiles(Connection, List_Tile):
+
+	"""
+	Insert the tiles ((Zoom, X, Y, Data), XYZ scheme) into the MBTiles archive (TMS scheme, Y from the south).
+	"""
+
+	Connection.executemany('INSERT INTO tiles VALUES (?, ?, ?, ?)', [(i_Zoom, i_X, (1 << i_Zoom) - 1 - i_Y, i_Data) for i_Zoom, i_X, i_Y, i_Data in List_Tile])
+	Connection.commit()
+
+	return
@@ -0,0 +1,6 @@
+"""
+Common
+======
+Shared tools for the calc scripts of each country/stage.
+The calc scripts are run from their own calc/ directory and import this package by adding the repository root ("../..") to sys.path.
+"""
@@ -4,33 +4,70 @@ calc.DECC.py
 Calculate and output the statistics of DECC data:
 1. The mean of primary energy (PE) consumption of each building type.
 2. The mean of electricity consumption of each building type.
-
-if there's any nan value in the data, the mean of the data will be filled.
+3. Optionally, the median, standard deviation and quantiles (Median_, Std_, Q<percent>_ columns) of both, from the same grouped pass.
+
+Optionally (Outlier_Method, off by default so that the published means are those of all records), before grouping,
+the records outside the robust fences of their group (median +/- Threshold x MAD, or the quartiles +/- Threshold x IQR,
+per building type, region and variable) are trimmed from the statistics (or only flagged), and the records lost by each group are reported.
+if there's any nan value in the data, the mean of the data will be filled (the other statistics are not filled).
+For large releases, the data can be read chunk by chunk (set Chunk_Size), accumulating the sums/counts of each group
+(the fences are then approximated from histograms of each group, built over the chunks before the statistics,
+so that a chunked run with screening may trim slightly different records than a run reading the whole file at once).
+With n_Resample > 0, the bootstrap confidence interval of each group mean is output next to the mean (Lower_/Upper_ columns);
+the groups without any sample have no interval, even though their mean is filled.
 """
 
+import numpy as np
 import pandas as pd
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append('../..')
+from Common.Cache import Read_Cached
+from Common.Reader import Read_Table
+from Common.Profiler import Profile_Stages
+
+# The columns of DECC used by the statistics (the other columns are never converted), and their compact dtypes
+List_Column_Raw = ['建物用途', '建物ID', '電力_年合計(kWh/㎡・年)', '一次エネルギー原単位_MJ/㎡・年']
+Dict_Dtype_Raw  = {'建物用途': 'category'}
+
+# The DECC regions (the first character of "建物ID")
+List_Region = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
+
+# The variables of the statistics (in the order of the output columns)
+List_Var = ['一次エネルギー原単位_kWh/㎡・年', '電力年合計(kWh/㎡・年)']
+
+# The default threshold of each outlier screening method (in MAD scaled to the standard deviation, or in IQR)
+Dict_Outlier_Threshold = {\
+	'MAD': 3.5, \
+	'IQR': 1.5, \
+}
+
+# The scale of the MAD to the standard deviation of a normal distribution
+MAD_Scale = 1.4826
 
-def Get_Data():
+# The bin edges of the histograms of the chunked screening (200 bins per decade from 0.01 to 1e6, on both sides of 0)
+Edges_Positive  = np.logspace(-2, 6, 8 * 200 + 1)
+Edges_Histogram = np.concatenate([-Edges_Positive[::-1], [0], Edges_Positive])
+
+def Clean_Data(df_DECC):
 
 	"""
-	Get the data of DECC and convert the unit of primary energy (PE) consumption to kWh/m2.
+	Keep the necessary columns, drop abnormal rows and convert the unit of primary energy (PE) consumption to kWh/m2.
 	=================================
+	Input:
+		df_DECC (dataframe): The raw data (or a chunk of the raw data) of DECC
 	Output:
 		df_DECC (dataframe): The data of DECC
 	"""
 
-	# Get data
-	df_DECC = pd.read_csv('../data/DECC/DECC.csv', encoding='shift_jisx0213')
-	df_DECC = df_DECC[[\
-		'建物用途', \
-		'建物ID', \
-		'電力_年合計(kWh/㎡・年)', \
-		'一次エネルギー原単位_MJ/㎡・年', \
-	]]
+	df_DECC = df_DECC[List_Column_Raw]
 
 	# Drop the rows that the first character of "建物ID" is abnormal
-	df_DECC = df_DECC[df_DECC['建物ID'].str[0].isin(['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H'])]
+	# and keep the region as a categorical code (extracted once, for all groupings)
+	Region  = pd.Categorical(df_DECC['建物ID'].str[0], categories=List_Region)
+	df_DECC = df_DECC[Region.notna()].assign(地域分區=Region[Region.notna()])
 
 	# Rename the column and convert unit
 	df_DECC = df_DECC.rename(columns={\
@@ -41,39 +78,517 @@ def Get_Data():
 
 	return df_DECC
 
-def Calc_Group(df_DECC):
+def Read_Data(File_Path, Encoding='shift_jisx0213'):
+
+	"""
+	Read and clean the data of DECC.
+	=================================
+	Input:
+		File_Path (string): The path of the DECC csv file
+		Encoding (string): The encoding of the DECC csv file
+	Output:
+		df_DECC (dataframe): The data of DECC
+	"""
+
+	df_DECC = Read_Table(File_Path, Columns=List_Column_Raw, Dtype=Dict_Dtype_Raw, Encoding=Encoding)
+
+	return Clean_Data(df_DECC)
+
+def Get_Data(Use_Cache=False):
+
+	"""
+	Get the data of DECC and convert the unit of primary energy (PE) consumption to kWh/m2.
+	=================================
+	Input:
+		Use_Cache (bool): Reuse the cleaned data cached as Parquet until DECC.csv changes
+	Output:
+		df_DECC (dataframe): The data of DECC
+	"""
+
+	# Get data
+	if (Use_Cache): return Read_Cached(Read_Data, '../data/DECC/DECC.csv', 'DECC', Encoding='shift_jisx0213')
+
+	return Read_Data('../data/DECC/DECC.csv')
+
+def Get_Data_Chunked(Chunk_Size=100000):
+
+	"""
+	Get the data of DECC chunk by chunk, so that the memory usage is bounded by the chunk size rather than the file size.
+	=================================
+	Input:
+		Chunk_Size (int): The number of rows of each chunk
+	Output:
+		df_DECC (dataframe): The data of DECC (one chunk per iteration)
+	"""
+
+	Reader = Read_Table(\
+		'../data/DECC/DECC.csv', \
+		Columns=List_Column_Raw, \
+		Dtype=Dict_Dtype_Raw, \
+		Encoding='shift_jisx0213', \
+		chunksize=Chunk_Size, \
+	)
+
+	for df_DECC in Reader: yield Clean_Data(df_DECC)
+
+def Get_Group_Code(df_DECC, List_Type):
+
+	# The position of the group of each record in the building type x region grid (-1 for a building type not in List_Type)
+	Code_Type = pd.Categorical(df_DECC['建物用途'], categories=List_Type).codes.astype(np.int64)
+
+	return np.where(Code_Type >= 0, Code_Type * len(List_Region) + df_DECC['地域分區'].cat.codes.to_numpy(), -1)
+
+def Get_Fence(Dict_Stat, Method='MAD', Threshold=None, Min_Sample=10):
+
+	"""
+	Get the outlier fences of each group from its robust statistics.
+	=================================
+	Input:
+		Dict_Stat (dict): The statistics of each group ("nSample", and "Median", "MAD" or "Q1", "Q3"), indexed by ("建物用途", region)
+			with one column per variable
+		Method (string): "MAD" (median +/- Threshold x scaled MAD) or "IQR" (Q1 - Threshold x IQR, Q3 + Threshold x IQR)
+		Threshold (float): The width of the fences (None: the default of the method, see Dict_Outlier_Threshold)
+		Min_Sample (int): The groups with fewer records (or without any spread) are not screened
+	Output:
+		df_Fence (dataframe): The lower/upper fence of each group (columns ("Lower"/"Upper", variable), NaN if not screened)
+	"""
+
+	if (Method not in Dict_Outlier_Threshold): raise ValueError('Unknown outlier screening method: {} (available: {})'.format(Method, ', '.join(Dict_Outlier_Threshold)))
+	if (Threshold is None): Threshold = Dict_Outlier_Threshold[Method]
+
+	if (Method == 'MAD'):
+		Spread = Dict_Stat['MAD'] * MAD_Scale
+		Lower  = Dict_Stat['Median'] - Threshold * Spread
+		Upper  = Dict_Stat['Median'] + Threshold * Spread
+	else:
+		Spread = Dict_Stat['Q3'] - Dict_Stat['Q1']
+		Lower  = Dict_Stat['Q1'] - Threshold * Spread
+		Upper  = Dict_Stat['Q3'] + Threshold * Spread
+
+	Is_Screened = (Dict_Stat['nSample'] >= Min_Sample) & (Spread > 0)
+
+	return pd.concat({'Lower': Lower.where(Is_Screened), 'Upper': Upper.where(Is_Screened)}, axis=1)
+
+def Calc_Fence(df_DECC, Method='MAD', Threshold=None, Min_Sample=10):
+
+	"""
+	Calculate the outlier fences of each building type and region from all the records at once.
+	=================================
+	Input:
+		df_DECC (dataframe): The data of DECC (with the categorical region "地域分區", see Clean_Data)
+		Method, Threshold, Min_Sample: See Get_Fence
+	Output:
+		df_Fence (dataframe): The fences of each group, over the building type x region grid
+	"""
+
+	Grouped = df_DECC[List_Var].groupby([df_DECC['建物用途'], df_DECC['地域分區']], observed=False)
+
+	if (Method == 'MAD'):
+
+		# The medians of all groups, then the medians of the absolute deviations of the records from the median of their group
+		df_DECC_Stat = Grouped.agg(['median', 'count'])
+		Median       = df_DECC_Stat.xs('median', axis=1, level=1)
+		Code         = Get_Group_Code(df_DECC, Median.index.get_level_values(0).unique())
+		Deviation    = (df_DECC[List_Var] - Median.to_numpy()[Code]).abs()
+
+		Dict_Stat = {\
+			'Median': Median, \
+			'MAD': Deviation.groupby([df_DECC['建物用途'], df_DECC['地域分區']], observed=False).median(), \
+			'nSample': df_DECC_Stat.xs('count', axis=1, level=1), \
+		}
+
+	else:
+
+		# The quartiles of all groups in one grouped quantile
+		df_DECC_Quantile = Grouped.quantile([0.25, 0.75])
+
+		Dict_Stat = {\
+			'Q1': df_DECC_Quantile.xs(0.25, level=2), \
+			'Q3': df_DECC_Quantile.xs(0.75, level=2), \
+			'nSample': Grouped.count(), \
+		}
+
+	return Get_Fence(Dict_Stat, Method=Method, Threshold=Threshold, Min_Sample=Min_Sample)
+
+def Calc_Histogram(Iter_DECC, df_Center=None):
+
+	"""
+	Count the records of each group in the bins of Edges_Histogram, chunk by chunk.
+	=================================
+	Input:
+		Iter_DECC (iterable): The chunks of the data of DECC (e.g. from Get_Data_Chunked)
+		df_Center (dataframe): The center of each group over the building type x region grid (None: count the values,
+			otherwise the absolute deviations of the values from the center of their group)
+	Output:
+		Dict_Count (dict): The counts of each variable, indexed by ("建物用途", region, bin)
+	"""
+
+	Dict_Count = {}
+	n_Bin      = len(Edges_Histogram) + 1
+
+	for df_DECC in Iter_DECC:
+
+		if (df_Center is not None): Code = Get_Group_Code(df_DECC, df_Center.index.get_level_values(0).unique())
+
+		for i_Var in List_Var:
+
+			Values = df_DECC[i_Var].to_numpy(dtype=float)
+			if (df_Center is not None): Values = np.abs(Values - np.append(df_Center[i_Var].to_numpy(dtype=float), np.nan)[Code])
+
+			# Count the records with value of each group and bin, numbered by the codes of the keys
+			Valid = ~np.isnan(Values)
+			Code_Type, Label_Type = pd.factorize(df_DECC['建物用途'].to_numpy()[Valid])
+			Key, Count = np.unique(\
+				(Code_Type * len(List_Region) + df_DECC['地域分區'].cat.codes.to_numpy()[Valid]) * n_Bin + np.searchsorted(Edges_Histogram, Values[Valid], side='right'), \
+				return_counts=True, \
+			)
+			Count = pd.Series(Count, index=pd.MultiIndex.from_arrays([\
+				Label_Type[Key // (len(List_Region) * n_Bin)], \
+				Key // n_Bin % len(List_Region), \
+				Key % n_Bin, \
+			]))
+
+			Dict_Count[i_Var] = Count if (i_Var not in Dict_Count) else Dict_Count[i_Var].add(Count, fill_value=0)
+
+	return Dict_Count
+
+def Get_Histogram_Quantile(Dict_Count, Quantile, Grid):
+
+	"""
+	Get the quantile of each group from the counts of its bins (interpolated linearly within the bin).
+	=================================
+	Input:
+		Dict_Count (dict): The counts of each variable (see Calc_Histogram)
+		Quantile (float): The quantile
+		Grid (MultiIndex): The building type x region grid
+	Output:
+		df_Quantile (dataframe): The quantile of each group (NaN without any record) and variable
+	"""
+
+	# The edges of each bin (the open bins at both ends take the outermost edge)
+	Edges = np.concatenate([Edges_Histogram[:1], Edges_Histogram, Edges_Histogram[-1:]])
+
+	# The groups of the grid, keyed as the counts (building type, region code)
+	Key = pd.MultiIndex.from_arrays([Grid.get_level_values(0), Grid.codes[1]])
+
+	df_Quantile = pd.DataFrame(np.nan, index=Grid, columns=List_Var)
+
+	for i_Var, i_Count in Dict_Count.items():
+
+		# The bin where the cumulative count of each group reaches the quantile
+		Count    = i_Count.sort_index()
+		Cum      = Count.groupby(level=[0, 1]).cumsum()
+		Target   = Quantile * Count.groupby(level=[0, 1]).transform('sum')
+		Is_Found = ((Cum >= Target) & (Cum - Count < Target)).to_numpy()
+
+		Bin   = Count.index.get_level_values(2).to_numpy()[Is_Found]
+		Frac  = ((Target - Cum + Count) / Count).to_numpy()[Is_Found]
+		Value = pd.Series(Edges[Bin] + Frac * (Edges[Bin + 1] - Edges[Bin]), index=Count.index[Is_Found].droplevel(2))
+
+		df_Quantile[i_Var] = Value.reindex(Key).to_numpy()
+
+	return df_Quantile
+
+def Calc_Fence_Chunked(Get_Iter, Method='MAD', Threshold=None, Min_Sample=10):
+
+	"""
+	Calculate the outlier fences of each building type and region from the histograms of the groups, built chunk by chunk
+	(IQR: one pass over the data; MAD: two passes, the second for the deviations from the medians).
+	The quantiles are approximated within a bin of the histograms (about 1% of the value), so the fences are approximate:
+	they may differ from those of Calc_Fence by a few kWh/m², and the records near the fences may be screened differently.
+	=================================
+	Input:
+		Get_Iter (function): Returns a new iterable of the chunks of the data of DECC (e.g. a call of Get_Data_Chunked)
+		Method, Threshold, Min_Sample: See Get_Fence
+	Output:
+		df_Fence (dataframe): The fences of each group, over the building type x region grid
+	"""
+
+	Dict_Count = Calc_Histogram(Get_Iter())
+
+	# The building type x region grid of all building types
+	List_Type = sorted(set(j for i in Dict_Count.values() for j in i.index.get_level_values(0)))
+	Grid      = pd.MultiIndex.from_product([List_Type, pd.CategoricalIndex(List_Region, categories=List_Region)], names=['建物用途', '地域分區'])
+	Key       = pd.MultiIndex.from_arrays([Grid.get_level_values(0), Grid.codes[1]])
+
+	Dict_Stat = {'nSample': pd.DataFrame({i: Dict_Count[i].groupby(level=[0, 1]).sum().reindex(Key, fill_value=0).to_numpy() if (i in Dict_Count) else 0 for i in List_Var}, index=Grid)}
+
+	if (Method == 'MAD'):
+
+		# The medians, then the medians of the absolute deviations from them (a second pass over the chunks)
+		Dict_Stat['Median'] = Get_Histogram_Quantile(Dict_Count, 0.5, Grid)
+		Dict_Stat['MAD']    = Get_Histogram_Quantile(Calc_Histogram(Get_Iter(), df_Center=Dict_Stat['Median']), 0.5, Grid)
+
+	else:
+
+		Dict_Stat['Q1'] = Get_Histogram_Quantile(Dict_Count, 0.25, Grid)
+		Dict_Stat['Q3'] = Get_Histogram_Quantile(Dict_Count, 0.75, Grid)
+
+	return Get_Fence(Dict_Stat, Method=Method, Threshold=Threshold, Min_Sample=Min_Sample)
+
+def Screen_Outlier(df_DECC, df_Fence, Action='Trim'):
+
+	"""
+	Screen the records outside the fences of their group, for all records and variables at once.
+	=================================
+	Input:
+		df_DECC (dataframe): The data (or a chunk of the data) of DECC
+		df_Fence (dataframe): The fences of each group (see Calc_Fence, Calc_Fence_Chunked)
+		Action (string): "Trim" (the outlying values are removed from the statistics, i.e. set to NaN)
+			or "Flag" (the values are kept, and flagged in the columns "Outlier_<variable>")
+	Output:
+		df_DECC (dataframe): The data of DECC
+		df_Outlier (dataframe): The number of records with value (nSample) and of outliers (nOutlier) of each group and variable
+	"""
+
+	if (Action not in ['Trim', 'Flag']): raise ValueError('Unknown outlier action: {} (available: Trim, Flag)'.format(Action))
+
+	# The fences of the group of each record (the building types without fences are not screened)
+	Code   = Get_Group_Code(df_DECC, df_Fence.index.get_level_values(0).unique())
+	Lower  = np.vstack([df_Fence['Lower'][List_Var].to_numpy(dtype=float), np.full(len(List_Var), np.nan)])[Code]
+	Upper  = np.vstack([df_Fence['Upper'][List_Var].to_numpy(dtype=float), np.full(len(List_Var), np.nan)])[Code]
+	Values = df_DECC[List_Var].to_numpy(dtype=float)
+
+	Is_Outlier = (Values < Lower) | (Values > Upper)
+
+	# Count the records and the outliers of each group
+	Is_Known   = Code >= 0
+	df_Outlier = pd.concat({\
+		'nSample': pd.DataFrame({j: np.bincount(Code[Is_Known], weights=~np.isnan(Values[Is_Known, i]), minlength=len(df_Fence)) for i, j in enumerate(List_Var)}, index=df_Fence.index), \
+		'nOutlier': pd.DataFrame({j: np.bincount(Code[Is_Known], weights=Is_Outlier[Is_Known, i], minlength=len(df_Fence)) for i, j in enumerate(List_Var)}, index=df_Fence.index), \
+	}, axis=1)
+
+	if (Action == 'Trim'):
+		df_DECC = df_DECC.assign(**{j: df_DECC[j].mask(Is_Outlier[:, i]) for i, j in enumerate(List_Var)})
+	else:
+		df_DECC = df_DECC.assign(**{'Outlier_' + j: Is_Outlier[:, i] for i, j in enumerate(List_Var)})
+
+	return df_DECC, df_Outlier
+
+def Bootstrap_Mean(Values, Group, n_Group, n_Resample, Seed, Batch_Size=2**22):
+
+	"""
+	Calculate the means of the bootstrap resamples of all groups at once.
+	Each resample draws the records of every group with replacement from the same group, as one index array over all records.
+	=================================
+	Input:
+		Values (array): The values of the records (without NaN), sorted by group
+		Group (array): The group number (0 to n_Group-1) of each record, sorted
+		n_Group (int): The number of groups
+		n_Resample (int): The number of resamples
+		Seed (SeedSequence): The seed of the random number generator
+		Batch_Size (int): The number of records drawn in a batch (bounding the memory of the index arrays)
+	Output:
+		Mean (array): The means of the groups (one row per resample, NaN for a group without any record)
+	"""
+
+	Rng   = np.random.default_rng(Seed)
+	Size  = np.bincount(Group, minlength=n_Group)
+	Start = np.cumsum(Size) - Size
+	Valid = Size > 0
+
+	Mean = np.full((n_Resample, n_Group), np.nan)
+	if (len(Values) == 0): return Mean
+
+	n_Batch = max(1, Batch_Size // len(Values))
+
+	for i_Start in range(0, n_Resample, n_Batch):
+
+		n = min(n_Batch, n_Resample - i_Start)
+
+		# Draw the records of each group from the same group (the groups are contiguous), and sum each group
+		Index = Start[Group] + Rng.integers(0, Size[Group], size=(n, len(Values)))
+		Mean[i_Start:i_Start+n, Valid] = np.add.reduceat(Values[Index], Start[Valid], axis=1) / Size[Valid]
+
+	return Mean
+
+def Calc_Bootstrap(df_DECC, Group, n_Group, n_Resample=1000, Confidence=0.95, Seed=0, n_Worker=os.cpu_count()):
+
+	"""
+	Calculate the bootstrap (percentile) confidence interval of the mean of each group, with the resamples spread across processes.
+	=================================
+	Input:
+		df_DECC (dataframe): The numeric columns of the data of DECC
+		Group (array): The group number (0 to n_Group-1) of each record
+		n_Group (int): The number of groups
+		n_Resample (int): The number of resamples
+		Confidence (float): The confidence level of the interval
+		Seed (int): The seed of the random number generator (the interval is reproducible for the same seed and number of workers)
+		n_Worker (int): The number of worker processes
+	Output:
+		Lower (array), Upper (array): The lower/upper bound of each group (row) and column
+	"""
+
+	Lower = np.full((n_Group, df_DECC.shape[1]), np.nan)
+	Upper = np.full((n_Group, df_DECC.shape[1]), np.nan)
+
+	# Split the resamples among the workers (each with an independent random stream)
+	List_n     = [len(i) for i in np.array_split(np.arange(n_Resample), n_Worker) if (len(i) > 0)]
+	List_Seed  = np.random.SeedSequence(Seed).spawn(df_DECC.shape[1] * len(List_n))
+
+	with ProcessPoolExecutor(max_workers=n_Worker) as Executor:
+
+		for i_Column, i_Var in enumerate(df_DECC.columns):
+
+			# Sort the records with value by group
+			Values = df_DECC[i_Var].to_numpy(dtype=float)
+			Valid  = ~np.isnan(Values)
+			Order  = np.argsort(Group[Valid], kind='stable')
+
+			List_Future = [Executor.submit(\
+				Bootstrap_Mean, \
+				Values[Valid][Order], \
+				Group[Valid][Order], \
+				n_Group, \
+				i_n, \
+				List_Seed[i_Column * len(List_n) + i_Worker], \
+			) for i_Worker, i_n in enumerate(List_n)]
+
+			Mean = np.concatenate([i.result() for i in List_Future])
+
+			Lower[:, i_Column] = np.quantile(Mean, (1 - Confidence) / 2, axis=0)
+			Upper[:, i_Column] = np.quantile(Mean, 1 - (1 - Confidence) / 2, axis=0)
+
+	return Lower, Upper
+
+def Get_Quantile_Name(Quantile):
+
+	# The statistic name of a quantile, e.g. "Q25" for 0.25
+	return 'Q{:g}'.format(round(Quantile * 100, 6))
+
+def Calc_Group(df_DECC, Output_Distribution=False, List_Quantile=None, n_Resample=0, Confidence=0.95, n_Worker=os.cpu_count()):
 
 	"""
-	Calculate the mean/nSample of primary energy (PE) consumption and electricity consumption of each building type.
+	Calculate the statistics of primary energy (PE) consumption and electricity consumption of each building type and region:
+	the mean, nSample, and optionally the median, standard deviation and quantiles, all from one grouping of the records.
 	=================================
 	Input:
+		df_DECC (dataframe): The data of DECC (with the categorical region "地域分區", see Clean_Data)
+		Output_Distribution (bool): Whether the median and the standard deviation of each group are output (Median_/Std_ columns)
+		List_Quantile (list): The quantiles of each group (e.g. [0.25, 0.75], output as Q25_/Q75_ columns; None: no quantile)
+		n_Resample (int): The number of bootstrap resamples of the confidence interval of the mean (0: no interval)
+		Confidence (float): The confidence level of the interval
+		n_Worker (int): The number of worker processes of the bootstrap
+	Output:
 		df_DECC (dataframe): The data of DECC
+	"""
+
+	# Group by the building type and the region, over all combinations (building type x region, in the order of the output)
+	Grouped = df_DECC[List_Var].groupby([df_DECC['建物用途'], df_DECC['地域分區']], observed=False)
+
+	if (List_Quantile is None): List_Quantile = []
+
+	# The moments and the order statistics of all groups and variables, each in one grouped aggregation
+	df_DECC_Stat     = Grouped.agg(['mean', 'count', 'median', 'std'] if (Output_Distribution) else ['mean', 'count'])
+	df_DECC_Quantile = Grouped.quantile(List_Quantile) if (len(List_Quantile) > 0) else None
+
+	Dict_Stat = {\
+		'Mean': df_DECC_Stat.xs('mean', axis=1, level=1), \
+		'nSample': df_DECC_Stat.xs('count', axis=1, level=1), \
+	}
+	if (Output_Distribution):
+		Dict_Stat['Median'] = df_DECC_Stat.xs('median', axis=1, level=1)
+		Dict_Stat['Std']    = df_DECC_Stat.xs('std', axis=1, level=1)
+	for i_Quantile in List_Quantile: Dict_Stat[Get_Quantile_Name(i_Quantile)] = df_DECC_Quantile.xs(i_Quantile, level=2)
+
+	if (n_Resample > 0):
+
+		# Number the group of each record by its position in the building type x region grid
+		Group = Get_Group_Code(df_DECC, Dict_Stat['Mean'].index.get_level_values(0).unique())
+
+		# Calculate the confidence interval of the mean of each group (the variables in the order of the data, each with its own seed)
+		List_Column  = [i for i in df_DECC.columns if (i in List_Var)]
+		Lower, Upper = Calc_Bootstrap(\
+			df_DECC[List_Column], \
+			Group, \
+			len(Dict_Stat['Mean']), \
+			n_Resample=n_Resample, \
+			Confidence=Confidence, \
+			n_Worker=n_Worker, \
+		)
+
+		Dict_Stat['Lower'] = pd.DataFrame(Lower, index=Dict_Stat['Mean'].index, columns=List_Column)
+		Dict_Stat['Upper'] = pd.DataFrame(Upper, index=Dict_Stat['Mean'].index, columns=List_Column)
+
+	return Format_Group(Dict_Stat)
+
+def Calc_Group_Chunked(Iter_DECC, df_Fence=None, Outlier_Action='Trim'):
+
+	"""
+	Calculate the mean/nSample of primary energy (PE) consumption and electricity consumption of each building type
+	by accumulating the running sums and counts of each group chunk by chunk (the other statistics need all the records at once).
+	=================================
+	Input:
+		Iter_DECC (iterable): The chunks of the data of DECC (e.g. from Get_Data_Chunked)
+		df_Fence (dataframe): The outlier fences of each group (see Calc_Fence_Chunked; None: not screened)
+		Outlier_Action (string): "Trim" or "Flag" (see Screen_Outlier)
 	Output:
 		df_DECC (dataframe): The data of DECC
+		df_Outlier (dataframe): The records and outliers of each group, added up over the chunks (None: not screened)
 	"""
 
-	# Group dataframe by column "建物用途" and the first character of "建物ID"
-	df_DECC_Grouped = df_DECC.groupby(['建物用途', df_DECC['建物ID'].str[0]]).mean(numeric_only=True)
-	df_DECC_nSample = df_DECC.groupby(['建物用途', df_DECC['建物ID'].str[0]]).count().drop(columns=['建物ID'])
+	df_DECC_Sum     = None
+	df_DECC_nSample = None
+	df_Outlier      = None
 
-	# Convert level 1 index to column
-	df_DECC_Grouped = df_DECC_Grouped.reset_index(level=1).rename(columns={'建物ID': '地域分區'})
-	df_DECC_nSample = df_DECC_nSample.reset_index(level=1).rename(columns={'建物ID': '地域分區'})
+	for df_DECC in Iter_DECC:
 
-	df_DECC_Grouped = pd.pivot_table(df_DECC_Grouped, index='建物用途', columns='地域分區', values=['電力年合計(kWh/㎡・年)', '一次エネルギー原単位_kWh/㎡・年'])
-	df_DECC_nSample = pd.pivot_table(df_DECC_nSample, index='建物用途', columns='地域分區', values=['電力年合計(kWh/㎡・年)', '一次エネルギー原単位_kWh/㎡・年'])
+		# Screen the outliers of the chunk, and add up the records lost by each group
+		if (df_Fence is not None):
+			df_DECC, df_Outlier_Chunk = Screen_Outlier(df_DECC, df_Fence, Action=Outlier_Action)
+			df_Outlier = df_Outlier_Chunk if (df_Outlier is None) else df_Outlier + df_Outlier_Chunk
 
-	# Get the list of the first level of column
-	for i_Var in df_DECC_Grouped.columns.get_level_values(0).unique():
-		
-		# Fill the missing values with the mean of row in df_DECC_Grouped
-		df_DECC_Grouped[i_Var] = df_DECC_Grouped[i_Var].T.fillna(df_DECC_Grouped[i_Var].mean(axis=1)).T
+		# Group the chunk by column "建物用途" and the region
+		Grouped = df_DECC[List_Var].groupby([df_DECC['建物用途'], df_DECC['地域分區']], observed=False)
 
-	# Fill the missing values with 0 in df_DECC_nSample
-	df_DECC_nSample = df_DECC_nSample.fillna(0)
+		# Update the running sums and counts
+		if (df_DECC_Sum is None):
+			df_DECC_Sum     = Grouped.sum()
+			df_DECC_nSample = Grouped.count()
+		else:
+			df_DECC_Sum     = df_DECC_Sum.add(Grouped.sum(), fill_value=0)
+			df_DECC_nSample = df_DECC_nSample.add(Grouped.count(), fill_value=0)
 
-	# Concatenate the two dataframes
-	df_DECC = pd.concat([df_DECC_Grouped, df_DECC_nSample], axis=1, keys=['Mean', 'nSample'])
+	if (df_DECC_Sum is None): raise ValueError('No chunk of the data of DECC to calculate the statistics from')
+
+	# Calculate the mean (the groups without any sample are NaN)
+	df_DECC_Grouped = df_DECC_Sum / df_DECC_nSample.where(df_DECC_nSample > 0)
+
+	return Format_Group({'Mean': df_DECC_Grouped, 'nSample': df_DECC_nSample.astype(int)}), df_Outlier
+
+def Format_Group(Dict_Stat):
+
+	"""
+	Arrange the statistics of the groups as one row per building type and fill the missing means.
+	=================================
+	Input:
+		Dict_Stat (dict): The statistics ("Mean", "nSample", and optionally "Lower", "Upper", "Median", "Std", "Q<percent>")
+			of each group, indexed by ("建物用途", region) with one column per variable;
+			the missing means are filled with the mean of the regions of the building type, the missing nSample with 0,
+			the other statistics are not filled
+	Output:
+		df_DECC (dataframe): The data of DECC (columns "<statistic>_<variable>_<region>")
+	"""
+
+	# One row per building type, one column per variable and region (all regions, in the order of List_Region)
+	Dict_Stat = {\
+		i: j.unstack(level=1).reindex(columns=pd.MultiIndex.from_product([List_Var, List_Region])).rename_axis(index='建物用途') \
+		for i, j in Dict_Stat.items() \
+	}
+
+	# Fill the missing means with the mean of the regions of the same building type and variable, for all rows at once
+	# (the regions are summed one after another, as DataFrame.mean of each row)
+	Array = Dict_Stat['Mean'].to_numpy(dtype=float).reshape(len(Dict_Stat['Mean']), len(List_Var), len(List_Region))
+	Count = (~np.isnan(Array)).sum(axis=2, keepdims=True)
+	with np.errstate(invalid='ignore', divide='ignore'): Mean = np.nancumsum(Array, axis=2)[:, :, -1:] / Count
+	Dict_Stat['Mean'] = pd.DataFrame(np.where(np.isnan(Array), Mean, Array).reshape(len(Array), -1), index=Dict_Stat['Mean'].index, columns=Dict_Stat['Mean'].columns)
+
+	# Fill the missing values with 0 in nSample
+	Dict_Stat['nSample'] = Dict_Stat['nSample'].astype(float).fillna(0)
+
+	# Concatenate the statistics (the confidence interval next to the mean, the distribution after nSample)
+	List_Stat = [i for i in ['Mean', 'Lower', 'Upper', 'nSample'] if (i in Dict_Stat)] + [i for i in Dict_Stat if (i not in ['Mean', 'Lower', 'Upper', 'nSample'])]
+	df_DECC = pd.concat([Dict_Stat[i] for i in List_Stat], axis=1, keys=List_Stat)
 
 	# Convert multilevel column to single level column by joining all levels by '_'
 	df_DECC.columns = df_DECC.columns.map('_'.join)
@@ -148,13 +663,88 @@ def Output_File(Data, Output_Language='Japanese'):
 
 	return
 
+def Output_Outlier(df_Outlier, df_Fence):
+
+	"""
+	Output the report of the outlier screening as csv file: the fences, the records with value (nSample)
+	and the records lost (nOutlier) of each building type, region and variable (the groups without any record are left out).
+	=================================
+	Input:
+		df_Outlier (dataframe): The records and outliers of each group (see Screen_Outlier)
+		df_Fence (dataframe): The fences of each group
+	"""
+
+	df_Report = pd.concat([df_Fence, df_Outlier.astype(int)], axis=1)
+	df_Report = df_Report[df_Outlier['nSample'].sum(axis=1).to_numpy() > 0]
+
+	print('[Outlier] {} of {} values screened out ({} of {} groups)'.format(\
+		int(df_Outlier['nOutlier'].to_numpy().sum()), \
+		int(df_Outlier['nSample'].to_numpy().sum()), \
+		int((df_Outlier['nOutlier'].sum(axis=1) > 0).sum()), \
+		len(df_Report), \
+	))
+
+	# Convert multilevel column to single level column by joining all levels by '_'
+	df_Report.columns = df_Report.columns.map('_'.join)
+
+	Output_Path = '../output/output_data/DECC/'
+	if not os.path.exists(Output_Path):	os.makedirs(Output_Path)
+
+	df_Report.reset_index().round(2).to_csv(Output_Path + 'DECC.Outlier.csv', encoding='utf-8-sig', index=False)
+
+	return
+
 if (__name__ == '__main__'):
 
-	# Get data
-	df_DECC = Get_Data()
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
+
+	# Set the chunk size of the streaming ingestion (None: read the whole file at once)
+	Chunk_Size = None
+
+	# Set the outlier screening of the records before grouping (Outlier_Method: "MAD", "IQR" or None: not screened, the default;
+	# Outlier_Threshold: None for the default of the method; Outlier_Action: "Trim" the outliers from the statistics or only "Flag" them)
+	# Trimming changes the published means; with Chunk_Size set, the fences are approximated (see Calc_Fence_Chunked)
+	Outlier_Method    = None
+	Outlier_Threshold = None
+	Outlier_Action    = 'Trim'
+
+	# Set the distribution statistics of each group (Output_Distribution: the median and standard deviation; List_Quantile: the quantiles,
+	# e.g. [0.25, 0.75]; not output by default, and not mapped to CTBC classes; needs the whole file at once)
+	Output_Distribution = False
+	List_Quantile       = []
+
+	# Set the number of bootstrap resamples of the confidence interval of the mean (0: no interval; needs the whole file at once)
+	n_Resample = 0
+	Confidence = 0.95
+
+	if (Chunk_Size is None):
+
+		# Get data
+		df_DECC = Get_Data(Use_Cache=True)
+
+		# Screen the outliers of each building type and region
+		if (Outlier_Method is not None):
+			df_Fence = Calc_Fence(df_DECC, Method=Outlier_Method, Threshold=Outlier_Threshold)
+			df_DECC, df_Outlier = Screen_Outlier(df_DECC, df_Fence, Action=Outlier_Action)
+
+		# Calculate the statistics of primary energy (PE) consumption and electricity consumption of each building type
+		df_DECC = Calc_Group(df_DECC, Output_Distribution=Output_Distribution, List_Quantile=List_Quantile, n_Resample=n_Resample, Confidence=Confidence)
+
+	else:
+
+		# Calculate the outlier fences from the histograms of the groups (reading the data chunk by chunk)
+		df_Fence = Calc_Fence_Chunked(lambda: Get_Data_Chunked(Chunk_Size=Chunk_Size), Method=Outlier_Method, Threshold=Outlier_Threshold) if (Outlier_Method is not None) else None
+
+		# Read the data chunk by chunk, screen the outliers and accumulate the mean/nSample of each building type
+		df_DECC, df_Outlier = Calc_Group_Chunked(\
+			Get_Data_Chunked(Chunk_Size=Chunk_Size), \
+			df_Fence=df_Fence, \
+			Outlier_Action=Outlier_Action, \
+		)
 
-	# Calculate the mean/nSample of primary energy (PE) consumption and electricity consumption of each building type
-	df_DECC = Calc_Group(df_DECC)
+	# Save the report of the outlier screening
+	if (Outlier_Method is not None): Output_Outlier(df_Outlier, df_Fence)
 
 	# Save as csv file
 	Output_File(\
@@ -2,21 +2,15 @@
 calc.Mapping.CTBC.py
 ============================
 Mapping the data of DECC to CTBC space-class and collateral-class.
+The mapping stages are those of the country engine (Common/Country.py); only the source EUI table is specific to JP.
 """
 
 import pandas as pd
-import os
+import sys
 
-def Get_Mapping():
-
-	"""
-	Get the mapping configurations of CTBC space-class and collateral-class.
-	"""
-
-	df_Mapping_SpaceClass      = pd.read_csv('../data/Mapping.Config/Mapping.CTBC.Space.Config.csv')
-	df_Mapping_CollateralClass = pd.read_csv('../data/Mapping.Config/Mapping.CTBC.Collateral.Config.csv')
-
-	return df_Mapping_SpaceClass, df_Mapping_CollateralClass
+sys.path.append('../..')
+from Common.Country import Get_Mapping, Mapping_to_SpaceClass, Mapping_to_CollateralClass, Save_Output
+from Common.Profiler import Profile_Stages
 
 def Get_DECC_BuildingType_Mean():
 
@@ -26,8 +20,14 @@ def Get_DECC_BuildingType_Mean():
 
 	df_DECC_BuildingType_Mean = pd.read_csv('../output/output_data/DECC/DECC.BuildingType_Mean.csv')
 
-	# Keep only the columns that contain "建物用途" and "Mean_電力年合計(kWh/㎡・年)_"
-	df_DECC_BuildingType_Mean = df_DECC_BuildingType_Mean[[i for i in df_DECC_BuildingType_Mean.columns if any(substring in i for substring in ['建物用途', 'Mean_電力年合計(kWh/㎡・年)'])]]
+	# The statistics of electricity consumption calculated by calc.DECC.py that are mapped (averaged over the building types of a class):
+	# Mean, and if calculated, Lower/Upper (the confidence interval of the mean, mapped as the average of the bounds of the building types,
+	# a conservative approximation of the interval of the class, see Common/Country.py Mapping_EUI); the distribution of the records
+	# (Median, Std, Q<percent>) is not mapped, as the average over the building types is not the statistic of the class
+	List_Statistic = [i for i in ['Mean', 'Lower', 'Upper'] if ('{}_電力年合計(kWh/㎡・年)_A'.format(i) in df_DECC_BuildingType_Mean.columns)]
+
+	# Keep only the columns that contain "建物用途" and "<statistic>_電力年合計(kWh/㎡・年)_"
+	df_DECC_BuildingType_Mean = df_DECC_BuildingType_Mean[[i for i in df_DECC_BuildingType_Mean.columns if ('建物用途' in i) or any(i.startswith(j + '_電力年合計(kWh/㎡・年)_') for j in List_Statistic)]]
 	df_DECC_BuildingType_Mean = df_DECC_BuildingType_Mean.rename(columns={\
 		'Mean_電力年合計(kWh/㎡・年)_A': 'EUI_北海道'  , \
 		'Mean_電力年合計(kWh/㎡・年)_B': 'EUI_東北'    , \
@@ -38,6 +38,11 @@ def Get_DECC_BuildingType_Mean():
 		'Mean_電力年合計(kWh/㎡・年)_G': 'EUI_中國四國', \
 		'Mean_電力年合計(kWh/㎡・年)_H': 'EUI_九州'    , \
 	})
+	df_DECC_BuildingType_Mean = df_DECC_BuildingType_Mean.rename(columns={\
+		'{}_電力年合計(kWh/㎡・年)_{}'.format(i_Statistic, i_Letter): 'EUI_{}_{}'.format(i_Statistic, i_Region) \
+		for i_Statistic in List_Statistic if (i_Statistic != 'Mean') \
+		for i_Letter, i_Region in zip('ABCDEFGH', ['北海道', '東北', '北信越', '關東', '中部', '關西', '中國四國', '九州']) \
+	})
 
 	df_DECC_BuildingType_Mean['建物用途序號'] = df_DECC_BuildingType_Mean['建物用途序號'].astype(int).astype(str)
 	
@@ -47,105 +52,11 @@ def Get_DECC_BuildingType_Mean():
 
 	return df_DECC_BuildingType_Mean
 
-def Mapping_to_SpaceClass(df_Mapping, df_DECC_BuildingType_Mean):
-
-	"""
-	Mapping the data of DECC to CTBC space-class.
-	==================================================================================================
-	Input:
-
-		df_Mapping: The mapping configurations of CTBC space-class.
-
-		df_DECC_BuildingType_Mean: The raw data of DECC energy comsumption data.
-
-	Output:
-
-		df_EUI: The data of DECC energy comsumption mapped to CTBC space-class (with group-mean).
-	"""
-
-	# Create new list to store the mapping data
-	df_EUI = []
-
-	for _, i_Mapping in df_Mapping.iterrows():
-
-		if (', ' in str(i_Mapping['建築能耗原始分區'])):
-
-			df_EUI_New = df_DECC_BuildingType_Mean[df_DECC_BuildingType_Mean['建物用途序號'].isin(i_Mapping['建築能耗原始分區'].split(', '))].drop(columns=['建物用途序號'])
-			df_EUI_New = pd.concat([df_EUI_New.mean(axis=0, numeric_only=True).to_frame().T, df_EUI_New], axis=0, ignore_index=True)
-			df_EUI_New['空間代號'] = i_Mapping['空間代號']
-			df_EUI_New['使用空間名稱'] = i_Mapping['使用空間名稱']
-			df_EUI_New.loc[0, '建物用途'] = '全部平均'
-
-		else:
-
-			df_EUI_New  = df_DECC_BuildingType_Mean[df_DECC_BuildingType_Mean['建物用途序號'] == i_Mapping['建築能耗原始分區']].drop(columns=['建物用途序號'])
-			if (df_EUI_New.shape[0] == 0): df_EUI_New = pd.DataFrame(index=[0])
-			df_EUI_New['空間代號'] = i_Mapping['空間代號']
-			df_EUI_New['使用空間名稱'] = i_Mapping['使用空間名稱']
-			df_EUI_New['建物用途'] = '全部平均'
-
-		df_EUI.append(df_EUI_New)
-	
-	# Convert the list to dataframe
-	df_EUI = pd.concat(df_EUI).round(2)
-
-	# Rearrange the last two columns to the first two columns
-	df_EUI = df_EUI[df_EUI.columns[-2:].tolist() + df_EUI.columns[:-2].tolist()]
-
-	return df_EUI
-
-def Mapping_to_CollateralClass(df_Mapping_CollateralClass, df_EUI_SpaceClass):
-
-	# Create new list to store the mapping data
-	df_EUI = []
-
-	for _, i_Mapping in df_Mapping_CollateralClass.iterrows():
-
-		if (', ' in str(i_Mapping['空間代號'])):
-
-			df_EUI_New = df_EUI_SpaceClass[(df_EUI_SpaceClass['空間代號'].isin(i_Mapping['空間代號'].split(', ')))&(df_EUI_SpaceClass['建物用途']=='全部平均')].drop(columns=['空間代號', '建物用途'])
-			df_EUI_New = pd.concat([df_EUI_New.mean(axis=0, numeric_only=True).to_frame().T, df_EUI_New], axis=0, ignore_index=True)
-			df_EUI_New['擔保品細項'] = str(int(i_Mapping['擔保品細項'])).zfill(2)
-			df_EUI_New['細項名稱'] = str(i_Mapping['細項名稱'])
-			df_EUI_New.loc[0, '使用空間名稱'] = '全部平均'
-
-		else:
-		
-			df_EUI_New  = df_EUI_SpaceClass[(df_EUI_SpaceClass['空間代號'] == i_Mapping['空間代號'])&(df_EUI_SpaceClass['建物用途']=='全部平均')].drop(columns=['空間代號', '建物用途'])
-			df_EUI_New['擔保品細項'] = str(int(i_Mapping['擔保品細項'])).zfill(2)
-			df_EUI_New['細項名稱'] = str(i_Mapping['細項名稱'])
-			df_EUI_New['使用空間名稱'] = '全部平均'
-
-		df_EUI.append(df_EUI_New)
-	
-	# Convert the list to dataframe
-	df_EUI = pd.concat(df_EUI).round(2)
-
-	# Rearrange the last two columns to the first two columns
-	df_EUI = df_EUI[df_EUI.columns[-2:].tolist() + df_EUI.columns[:-2].tolist()]
-
-	return df_EUI
-
-def Save_Output(df_EUI, Output_File):
-
-	"""
-	Save the output data.
-	==================================================================================================
-	Input:
-
-		df_EUI: The output dataframe.
-
-		Output_File: The output file name.
-	"""
-
-	Output_Path = '../output/output_data/Mapping.CTBC/'
-	if not os.path.exists(Output_Path): os.makedirs(Output_Path)
-	df_EUI.to_csv(Output_Path + Output_File, index=False, encoding='utf-8-sig')
-
-	return
-
 if (__name__ == '__main__'):
 
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
+
 	# Get the mapping table
 	df_Mapping_SpaceClass, df_Mapping_CollateralClass = Get_Mapping()
 
@@ -0,0 +1,193 @@
+"""
+calc.Layer_Output.Country.py
+======================
+Country engine: run basic CIE coef method, the mapping and layer stages of country EUI method of any set of countries and the merge
+in one process, instead of one process per stage re-importing geopandas and re-reading the shared inputs.
+The world boundaries, the CIE table and the EUI of basic CIE coef method are loaded once, and the behaviour of each country
+(the region key, the source EUI table and the mapping configurations) is supplied by its configuration file
+Layer_Output/Country/<country code>.json (see Common/Country.py), so that a country is added with one configuration file.
+The source EUI tables are those of the data stages of each country (e.g. calc.DECC.py, calc.EUI.ClimateAdjusted.py);
+the countries of country EUI method without configuration file (e.g. TW) are read from their layers.
+The outputs are those of the stages: the mapping tables and the layer of each country, the layer of basic CIE coef method and the merged layer.
+"""
+
+import os
+import sys
+import json
+import time
+
+sys.path.append('../..')
+from Common.Country import Root_Path, List_Country_Config, Get_Country_Config, Get_Country_Path, Read_Country_Layer, Read_Country_Source, Get_Mapping, Calc_Country, Save_Output, Get_Output_Layer, Get_Lookup_File, Output_Lookup, Output_Shapefile
+from Common.Output import Get_Output_Format, Get_Output_Profile, Get_Output_Dissolve
+from Common.Script import Load_Script, In_Directory
+from Common.Profiler import Profile_Stages
+
+# The calc scripts of the stages shared by all countries (relative to Layer_Output/calc)
+Dict_Script_Path = {\
+	'Basic': '../../Basic_Coef/calc/Calc.Layer_Output.CTBC.py', \
+	'Merge': '../../Layer_Output/calc/calc.Layer_Output.Merge.py', \
+}
+
+def Get_Resources(List_Country, Output_Format='Shapefile', Load_Basic=True):
+
+	"""
+	Load the inputs of all countries once.
+	==================================================================================================
+	Input:
+
+		List_Country: The countries of country EUI method.
+
+		Output_Format: The output format preferred for the layers of the countries without configuration file.
+
+		Load_Basic: Whether the inputs of basic CIE coef method are loaded (not needed by a run of a subset of the countries).
+
+	Output:
+
+		Scripts: The calc scripts (modules) of the stages shared by all countries.
+
+		Resources: The inputs (the world boundaries, the EUI and the CIE table of basic CIE coef method, and the configuration,
+			the source EUI table, the mapping configurations and the layer of each country).
+	"""
+
+	Scripts   = {i: Load_Script(j, Prefix='Country') for i, j in Dict_Script_Path.items()}
+	Resources = {'Config': {}, 'Source': {}, 'Mapping': {}, 'Layer': {}}
+
+	# Basic CIE coef method: the countries, the EUI and the CIE table
+	if (Load_Basic):
+		with In_Directory('../../Basic_Coef/calc'):
+			Resources['Basic_Country'] = Scripts['Basic'].Get_Shapefile()
+			Resources['Basic_EUI']     = Scripts['Basic'].Get_EUI()
+			Resources['CIE_Table']     = Scripts['Basic'].Get_Coef_CarbonIntensity()
+
+	# The mapping configurations, read once per directory (shared by the countries of the same directory)
+	Dict_Mapping = {}
+	List_Config  = List_Country_Config()
+
+	for i_Country in List_Country:
+
+		if (i_Country not in List_Config):
+
+			# The layer of the country as output by its own stage
+			Resources['Layer'][i_Country] = Scripts['Merge'].Read_Shapefile_Country(i_Country, Output_Format=Output_Format)[0]
+			continue
+
+		Config = Get_Country_Config(i_Country)
+		if (Config['Mapping_Config'] not in Dict_Mapping): Dict_Mapping[Config['Mapping_Config']] = Get_Mapping(Config_Path=os.path.join(Root_Path, Config['Mapping_Config'], ''))
+
+		Resources['Config'][i_Country]  = Config
+		Resources['Source'][i_Country]  = Read_Country_Source(Config)
+		Resources['Mapping'][i_Country] = Dict_Mapping[Config['Mapping_Config']]
+		Resources['Layer'][i_Country]   = Read_Country_Layer(Config)
+
+	return Scripts, Resources
+
+def Get_Merge_Layer(gdf):
+
+	"""
+	Get a layer as read by calc.Layer_Output.Merge.py from the layer file: the values as written (1 digit),
+	the geometry as the last column, in EPSG:4326.
+	"""
+
+	gdf = gdf.round(1)
+	gdf = gdf[[i for i in gdf.columns if (i != gdf.geometry.name)] + [gdf.geometry.name]]
+
+	return gdf.to_crs('epsg:4326') if (gdf.crs is None) or (gdf.crs.to_epsg() != 4326) else gdf.set_crs('epsg:4326', allow_override=True)
+
+def Calc_Countries(Resources, Output_Format='Shapefile', Output_Profile=False, Output_Dissolve=False):
+
+	"""
+	Run the mapping and layer stages of each country with a configuration file, and output their mapping tables and layers.
+	==================================================================================================
+	Input:
+
+		Resources: The inputs (see Get_Resources).
+
+		Output_Format, Output_Profile, Output_Dissolve: The output options selected in Config.json.
+
+	Output:
+
+		gdf_CountryEUI: The layer of each country, as read by calc.Layer_Output.Merge.py.
+	"""
+
+	gdf_CountryEUI = {}
+	for i_Country, i_gdf in Resources['Layer'].items():
+
+		if (i_Country not in Resources['Config']):
+			gdf_CountryEUI[i_Country] = i_gdf
+			continue
+
+		Time_Start = time.perf_counter()
+		Config     = Resources['Config'][i_Country]
+
+		df_EUI_SpaceClass, df_EUI_CollateralClass, gdf, df_Lookup = Calc_Country(\
+			Config, \
+			Resources['Source'][i_Country], \
+			*Resources['Mapping'][i_Country], \
+			i_gdf, \
+			Output_Dissolve=Output_Dissolve, \
+		)
+
+		# Output the mapping tables (as calc.Mapping.CTBC.py), and the layer and its lookup table (as Calc.Layer_Output.CTBC.py)
+		Save_Output(df_EUI_SpaceClass, 'Mapping.CTBC.Space.Mean.csv', Output_Path=Get_Country_Path(Config, 'output/output_data/Mapping.CTBC/'))
+		Save_Output(df_EUI_CollateralClass, 'Mapping.CTBC.Collateral.Mean.csv', Output_Path=Get_Country_Path(Config, 'output/output_data/Mapping.CTBC/'))
+
+		Output_Path, Output_Name = Get_Output_Layer(Config)
+		Output_Lookup(df_Lookup, Get_Lookup_File(Output_Path, Output_Name))
+		Output_Shapefile(gdf, Output_Path, Output_Name, Output_Format=Output_Format, Output_Profile=Output_Profile)
+
+		gdf_CountryEUI[i_Country] = Get_Merge_Layer(gdf)
+		print('[Country] {}: {:.3f}s ({} features)'.format(i_Country, time.perf_counter() - Time_Start, len(gdf)))
+
+	return gdf_CountryEUI
+
+if (__name__ == '__main__'):
+
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
+
+	# Get configuration files
+	with open('../Config.json', 'r', encoding='utf-8') as f: config = json.load(f)
+	Output_Format   = Get_Output_Format()
+	Output_Profile  = Get_Output_Profile()
+	Output_Dissolve = Get_Output_Dissolve()
+
+	# Set the countries run (None: all countries of country EUI method in Config.json; or a subset of them, e.g. ['JP'],
+	# which only outputs the mapping tables and the layers of those countries, not the layer of basic CIE coef method nor the merged layer)
+	List_Country = None
+
+	if (List_Country is None): List_Country = config['Method2_CountryEUI']
+	List_Unknown = [i for i in List_Country if (i not in config['Method2_CountryEUI'])]
+	if (len(List_Unknown) > 0): raise ValueError('Not a country of country EUI method in Config.json: {}'.format(', '.join(List_Unknown)))
+
+	Is_Merge = (set(List_Country) == set(config['Method2_CountryEUI']))
+	if not (Is_Merge): print('[Country] Subset run of {}: the layer of basic CIE coef method and the merged layer are not output'.format(', '.join(List_Country)))
+
+	# Load the inputs of the countries (and of basic CIE coef method, for the merged layer)
+	Scripts, Resources = Get_Resources(List_Country, Output_Format=Output_Format, Load_Basic=Is_Merge)
+
+	# Basic CIE coef method
+	if (Is_Merge):
+
+		gdf_BasicCIE = Scripts['Basic'].Mapping_EUI(Resources['Basic_Country'], Resources['Basic_EUI'], Resources['CIE_Table'])
+		Scripts['Basic'].Output_Shapefile(\
+			gdf_BasicCIE, \
+			'../../Basic_Coef/output/output_result/Shapefile/EUI.Prediction.CTBC.Global/', \
+			'EUI.Prediction.CTBC.Global.Basic_Coef.shp', \
+			Output_Format=Output_Format, \
+			Output_Profile=Output_Profile, \
+		)
+
+	# Country EUI method
+	gdf_CountryEUI = Calc_Countries(Resources, Output_Format=Output_Format, Output_Profile=Output_Profile, Output_Dissolve=Output_Dissolve)
+
+	# ==================================================================================================
+	# Combine the layers, and output the merged layer (or in the output format selected in Config.json)
+	if (Is_Merge):
+
+		Scripts['Merge'].Output_Shapefile(\
+			Scripts['Merge'].Combine_Shapefile(Get_Merge_Layer(gdf_BasicCIE), gdf_CountryEUI), \
+			'../output/output_result/Shapefile/EUI.Prediction.CTBC.Global/', \
+			'EUI.Prediction.CTBC.Global.shp', \
+			Output_Format=Output_Format, \
+			Output_Profile=Output_Profile, \
+		)
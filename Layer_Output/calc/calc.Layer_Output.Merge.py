@@ -4,42 +4,100 @@ calc.Layer_Output.Merge.py
 Merge the shapefiles created by (1) basic CIE coef method and (2) country EUI method.
 """
 
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import os
+import sys
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def Get_Shapefile_BasicCIE():
+sys.path.append('../..')
+from Common.Output import Get_Output_Format, Get_Output_Profile, Get_Layer_File, Read_Layer, Output_Layer
+from Common.Profiler import Profile_Stages
 
-	# Read shapefile created by basic CIE coef method
-	gdf_BasicCIE = gpd.read_file('../../Basic_Coef/output/output_result/Shapefile/EUI.Prediction.CTBC.Global/EUI.Prediction.CTBC.Global.Basic_Coef.shp', encoding='utf-8')
+def Get_Shapefile_BasicCIE(Output_Format='Shapefile'):
+
+	# Read shapefile (or the layer in another output format) created by basic CIE coef method
+	gdf_BasicCIE = Read_Layer(Get_Layer_File('../../Basic_Coef/output/output_result/Shapefile/EUI.Prediction.CTBC.Global/', Output_Format=Output_Format))
 
 	return gdf_BasicCIE
 
-def Get_Shapefile_CountryEUI(List_Country):
+def Read_Shapefile_Country(Country, Output_Format='Shapefile'):
+
+	"""
+	Read the shapefile created by country EUI method of a country, and reproject it to EPSG:4326.
+	==================================================================================================
+	Input:
+
+		Country: The country code, e.g. "JP".
+
+		Output_Format: The output format preferred if the layer of the country exists in several formats.
+
+	Output:
+
+		gdf: The shapefile of the country (EPSG:4326).
+
+		Time_Read: The time of reading the shapefile.
+
+		Time_Reproject: The time of reprojection (0 if the shapefile is already in EPSG:4326).
+	"""
+
+	# Find the layer under the folder
+	File_Path = Get_Layer_File('../../{}/output/output_result/Shapefile/EUI.Prediction.CTBC.Global/'.format(Country), Output_Format=Output_Format)
+
+	Time_Start = time.perf_counter()
+	gdf = Read_Layer(File_Path)
+	Time_Read = time.perf_counter() - Time_Start
+
+	# Reproject only if the shapefile is not in EPSG:4326 yet (otherwise only the CRS is relabelled)
+	Time_Start = time.perf_counter()
+	if (gdf.crs is not None) and (gdf.crs.to_epsg() == 4326):
+		gdf = gdf.set_crs('epsg:4326', allow_override=True)
+	else:
+		gdf = gdf.to_crs('epsg:4326')
+	Time_Reproject = time.perf_counter() - Time_Start
+
+	return gdf, Time_Read, Time_Reproject
 
-	# Read shapefile created by country EUI method
+def Get_Shapefile_CountryEUI(List_Country, Output_Format='Shapefile', n_Worker=os.cpu_count()):
+
+	# Read shapefile created by country EUI method (the countries are read concurrently)
 	gdf_CountryEUI = {}
 
+	with ThreadPoolExecutor(max_workers=max(1, min(n_Worker, len(List_Country)))) as Executor:
+
+		Dict_Future = {i_Country: Executor.submit(Read_Shapefile_Country, i_Country, Output_Format) for i_Country in List_Country}
+
 	for i_Country in List_Country:
-		
-		# List file under the folder
-		File_Name = os.listdir('../../{}/output/output_result/Shapefile/EUI.Prediction.CTBC.Global/'.format(i_Country))
-		File_Name = [i for i in File_Name if i.endswith('.shp')][0]
-		gdf_CountryEUI[i_Country] = gpd.read_file('../../{}/output/output_result/Shapefile/EUI.Prediction.CTBC.Global/{}'.format(i_Country, File_Name), encoding='utf-8').to_crs('epsg:4326')
+
+		gdf_CountryEUI[i_Country], Time_Read, Time_Reproject = Dict_Future[i_Country].result()
+		print('[Merge] {}: read {:.3f}s, reproject {:.3f}s ({} features)'.format(i_Country, Time_Read, Time_Reproject, len(gdf_CountryEUI[i_Country])))
 
 	return gdf_CountryEUI
 
 def Combine_Shapefile(gdf_BasicCIE, gdf_CountryEUI):
 
-	# Inquire CIE coef of each country, add column into gdf_CountryEUI, and remove the country from gdf_BasicCIE
-	for i_Country in list(gdf_CountryEUI.keys()):
+	# Parse the country code of each row once, and index the CIE coef of each country (the first row of the country) on it
+	Country_Code = gdf_BasicCIE['COUNTRY'].str.split('-', n=1).str[0].to_numpy()
+	Is_First     = ~pd.Series(Country_Code).duplicated().to_numpy()
+	Coef_CIE     = pd.Series(gdf_BasicCIE['Coef_CIE'].to_numpy()[Is_First], index=Country_Code[Is_First])
 
-		gdf_CountryEUI[i_Country].insert(0, 'Coef_CIE', gdf_BasicCIE.loc[gdf_BasicCIE['COUNTRY'].str.split('-').str[0]==i_Country, 'Coef_CIE'].values[0])
-		gdf_BasicCIE = gdf_BasicCIE[gdf_BasicCIE['COUNTRY'].str.split('-').str[0]!=i_Country]
-	
-	# Combine the shapefiles
-	List_gdf = [gdf_BasicCIE] + list(gdf_CountryEUI.values())
+	# Report the countries of country EUI method missing from the shapefile of basic CIE coef method
+	List_Missing = [i for i in gdf_CountryEUI if (i not in Coef_CIE.index)]
+	if (len(List_Missing) > 0): print('[Merge] Not found in basic CIE coef method (Coef_CIE left empty): {}'.format(', '.join(List_Missing)))
+
+	List_gdf = [gdf_BasicCIE.loc[~np.isin(Country_Code, list(gdf_CountryEUI))]]
+
+	if (len(gdf_CountryEUI) > 0):
+
+		# Combine the shapefiles of country EUI method, and add the CIE coef of each country with one join
+		gdf_Country = pd.concat(list(gdf_CountryEUI.values()), keys=list(gdf_CountryEUI.keys()))
+		gdf_Country.insert(0, 'Coef_CIE', Coef_CIE.reindex(gdf_Country.index.get_level_values(0)).to_numpy())
+		List_gdf.append(gdf_Country)
+
+	# Combine the shapefiles (the countries of country EUI method are removed from gdf_BasicCIE)
 	gdf_EUI = gpd.GeoDataFrame(pd.concat(List_gdf, ignore_index=True), crs=gdf_BasicCIE.crs)
 
 	# Rearrange the columns
@@ -47,36 +105,42 @@ def Combine_Shapefile(gdf_BasicCIE, gdf_CountryEUI):
 
 	return gdf_EUI
 
-def Output_Shapefile(gdf, Output_Path, Output_Name):
-
-	# Set output path
-	if not os.path.exists(Output_Path):	os.makedirs(Output_Path)
+def Output_Shapefile(gdf, Output_Path, Output_Name, Output_Format='Shapefile', Output_Profile=False):
 
 	# Round the number columns to 1 digits
 	gdf = gdf.round(1)
 
-	gdf.to_file(Output_Path + Output_Name, encoding='utf-8')
+	# Output in the selected format (Shapefile, GeoParquet or FlatGeobuf)
+	# With the profile table, the EUI columns are written once per distinct profile instead of once per polygon
+	Output_Layer(gdf, Output_Path, Output_Name, Output_Format=Output_Format, Profile_Columns=([i for i in gdf.columns if i.startswith(('EUI_', 'Lower_', 'Upper_'))] if (Output_Profile) else None))
 
 	return
 
 if (__name__ == '__main__'):
 
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
+
 	# Get configuration files
 	with open('../Config.json', 'r', encoding='utf-8') as f: config = json.load(f)
+	Output_Format = Get_Output_Format()
+	Output_Profile = Get_Output_Profile()
 
 	# Get shapefile created by basic CIE coef method
-	gdf_BasicCIE = Get_Shapefile_BasicCIE()
+	gdf_BasicCIE = Get_Shapefile_BasicCIE(Output_Format=Output_Format)
 
 	# Get shapefile created by country EUI method
-	gdf_CountryEUI = Get_Shapefile_CountryEUI(List_Country=config['Method2_CountryEUI'])
+	gdf_CountryEUI = Get_Shapefile_CountryEUI(List_Country=config['Method2_CountryEUI'], Output_Format=Output_Format)
 
 	# Combine the shapefiles
 	gdf_EUI = Combine_Shapefile(gdf_BasicCIE, gdf_CountryEUI)
 
 	# ==================================================================================================
-	# Output geopandas dataframe to shape file
+	# Output geopandas dataframe to shape file (or the output format selected in Config.json)
 	Output_Shapefile(\
 		gdf_EUI, \
 		'../output/output_result/Shapefile/EUI.Prediction.CTBC.Global/', \
 		'EUI.Prediction.CTBC.Global.shp', \
+		Output_Format=Output_Format, \
+		Output_Profile=Output_Profile, \
 	)
\ No newline at end of file
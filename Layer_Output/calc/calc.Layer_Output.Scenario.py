@@ -0,0 +1,272 @@
+"""
+calc.Layer_Output.Scenario.py
+======================
+Scenario engine: compute the merged global layer of all scenarios in "Scenario" of Layer_Output/Config.json in one process,
+and output them as one scenario cube (Scenario x Region x Class, see Common/Scenario.py) instead of one layer per run.
+Each scenario selects the CIE table of basic CIE coef method, the projection year of the U.S. climate-adjusted EUI and the
+mapping configurations of each country; the geometry and the parsed inputs are loaded once and shared by all scenarios,
+and the stages are the functions of the calc scripts of each country (run on the data in memory).
+The countries of country EUI method without calc scripts (e.g. TW) are read from their layers and the same in all scenarios.
+"""
+
+import pandas as pd
+import os
+import sys
+import json
+import time
+
+sys.path.append('../..')
+from Common.Output import Get_Output_Format, Get_Output_Profile, Get_Output_Dissolve
+from Common.Scenario import Dict_Store_Extension, Get_Scenario_Store, Calc_Cube, Output_Cube, Output_Scenario_Layer
+from Common.Geometry import Union_Group
+from Common.Script import Load_Script, In_Directory
+from Common.Profiler import Profile_Stages
+
+# The calc scripts of the stages (relative to Layer_Output/calc)
+Dict_Script_Path = {\
+	'Basic'     : '../../Basic_Coef/calc/Calc.Layer_Output.CTBC.py', \
+	'Merge'     : '../../Layer_Output/calc/calc.Layer_Output.Merge.py', \
+	'JP_Mapping': '../../JP/calc/calc.Mapping.CTBC.py', \
+	'JP_Layer'  : '../../JP/calc/Calc.Layer_Output.CTBC.py', \
+	'US_EUI'    : '../../US/calc/calc.EUI.ClimateAdjusted.py', \
+	'US_Mapping': '../../US/calc/calc.Mapping.CTBC.py', \
+	'US_Layer'  : '../../US/calc/Calc.Layer_Output.CTBC.py', \
+}
+
+# The default definition of a scenario (the inputs of the pipeline); the paths are relative to the repository root
+Dict_Scenario_Default = {\
+	'CIE_Table': 'Basic_Coef/data/Coef_CarbonIntensity_Electricity/Coef_CarbonIntensity_Electricity.csv', \
+	'Projection_Year': '2010', \
+	'Mapping_Config': {}, \
+}
+
+def Get_Scenario(Config_File='../Config.json'):
+
+	"""
+	Get the definitions of the scenarios.
+	==================================================================================================
+	Input:
+
+		Config_File: The configuration file, whose "Scenario" is a list of scenarios, each with
+			Name: The name of the scenario.
+			CIE_Table: The CIE table of basic CIE coef method.
+			Projection_Year: The projection year of the U.S. climate-adjusted EUI.
+			Mapping_Config: The directory of the mapping configurations of each country (e.g. {"JP": "JP/data/Mapping.Config"}).
+			The keys not set are those of the pipeline (Dict_Scenario_Default).
+
+	Output:
+
+		Dict_Scenario: The definition of each scenario.
+	"""
+
+	with open(Config_File, 'r', encoding='utf-8') as f: config = json.load(f)
+
+	Dict_Scenario = {}
+	for i_Scenario in config.get('Scenario', []):
+
+		if ('Name' not in i_Scenario): raise ValueError('Scenario without name: {}'.format(i_Scenario))
+		if (i_Scenario['Name'] in Dict_Scenario): raise ValueError('Duplicated scenario: {}'.format(i_Scenario['Name']))
+
+		Dict_Scenario[i_Scenario['Name']] = {**Dict_Scenario_Default, **{i: j for i, j in i_Scenario.items() if (i != 'Name')}}
+		Dict_Scenario[i_Scenario['Name']]['Projection_Year'] = str(Dict_Scenario[i_Scenario['Name']]['Projection_Year'])
+
+	if (len(Dict_Scenario) == 0): raise ValueError('No scenario in {}'.format(Config_File))
+
+	return Dict_Scenario
+
+def Get_Resources(Dict_Scenario, List_Country, Output_Format='Shapefile', Output_Dissolve=False):
+
+	"""
+	Load the inputs shared by all scenarios once.
+	==================================================================================================
+	Input:
+
+		Dict_Scenario: The definition of each scenario (see Get_Scenario).
+
+		List_Country: The countries of country EUI method.
+
+		Output_Format: The output format preferred for the layers of the countries without calc scripts.
+
+		Output_Dissolve: Whether the U.S. counties are dissolved into the climate regions (see Get_Output_Dissolve).
+
+	Output:
+
+		Scripts: The calc scripts (modules) of the stages.
+
+		Resources: The shared inputs (the geometry of each layer, reprojected to EPSG:4326, and the parsed tables).
+	"""
+
+	Scripts   = {i: Load_Script(j, Prefix='Scenario') for i, j in Dict_Script_Path.items()}
+	Resources = {'Country': {}}
+
+	# Basic CIE coef method: the countries and the EUI (the CIE tables are read per scenario, once per file)
+	with In_Directory('../../Basic_Coef/calc'):
+		Resources['Basic_Country'] = Scripts['Basic'].Get_Shapefile()
+		Resources['Basic_EUI']     = Scripts['Basic'].Get_EUI()
+
+	Resources['CIE_Table'] = {i: pd.read_csv('../../' + i, encoding='utf-8') for i in dict.fromkeys(j['CIE_Table'] for j in Dict_Scenario.values())}
+
+	for i_Country in List_Country:
+
+		# The mapping configurations used by the scenarios (the directory of the pipeline if not set)
+		List_Config = dict.fromkeys(j['Mapping_Config'].get(i_Country, '{}/data/Mapping.Config'.format(i_Country)) for j in Dict_Scenario.values())
+
+		if (i_Country == 'JP'):
+
+			with In_Directory('../../JP/calc'):
+				gdf = Scripts['JP_Layer'].Get_Shapefile()
+				Resources['JP_DECC'] = Scripts['JP_Mapping'].Get_DECC_BuildingType_Mean()
+
+		elif (i_Country == 'US'):
+
+			with In_Directory('../../US/calc'):
+				gdf = Scripts['US_Layer'].Get_Shapefile()
+
+				# The factor table of all projection years of the scenarios, calculated in one pass
+				df_EUI_ClimateStatistical = Scripts['US_EUI'].Get_EUI_ClimateStatistical(List_Year=list(dict.fromkeys(j['Projection_Year'] for j in Dict_Scenario.values())), Use_Cache=True)
+				Resources['US_EnergyStar'] = Scripts['US_EUI'].Get_EUI_EnergyStar(Use_Cache=True)
+				Resources['US_Factor']     = Scripts['US_EUI'].Calc_Factor(Scripts['US_EUI'].Calc_NormalizedEUI(df_EUI_ClimateStatistical))
+
+		else:
+
+			# The layer of the country as output by its own stage (the same in all scenarios)
+			Resources['Country'][i_Country] = Scripts['Merge'].Read_Shapefile_Country(i_Country, Output_Format=Output_Format)[0]
+			continue
+
+		# The counties dissolved into the climate regions (unioned once for all scenarios, as by the stage before the Merge)
+		if (i_Country == 'US') and (Output_Dissolve):
+			Resources['US_Lookup'] = Scripts['US_Layer'].Get_Lookup(gdf)
+			Resources['US_Region'] = Union_Group(gdf.geometry, Resources['US_Lookup']['CLIMATEREGION'])
+			Resources['US_Region'] = Resources['US_Region'].to_crs('epsg:4326') if (gdf.crs is None) or (gdf.crs.to_epsg() != 4326) else Resources['US_Region'].set_crs('epsg:4326', allow_override=True)
+
+		Resources['{}_Mapping'.format(i_Country)] = {i: Scripts['{}_Mapping'.format(i_Country)].Get_Mapping(Config_Path='../../{}/'.format(i)) for i in List_Config}
+
+		# Reproject once (as Read_Shapefile_Country), the geometry is the last column as read from a layer file
+		gdf = gdf.to_crs('epsg:4326') if (gdf.crs is None) or (gdf.crs.to_epsg() != 4326) else gdf.set_crs('epsg:4326', allow_override=True)
+		Resources['Country'][i_Country] = gdf
+
+	return Scripts, Resources
+
+def Calc_Scenario(Scenario, Scripts, Resources):
+
+	"""
+	Calculate the merged global layer of a scenario (as calc.Layer_Output.Merge.py on the layers of each stage).
+	==================================================================================================
+	Input:
+
+		Scenario: The definition of the scenario.
+
+		Scripts, Resources: The calc scripts and the shared inputs (see Get_Resources).
+
+	Output:
+
+		gdf_EUI: The merged layer of the scenario (rounded to 1 digit, as written by each stage).
+	"""
+
+	def Get_Layer(gdf):
+
+		# The values as written to the layer file, the geometry as the last column (as read by Read_Layer)
+		gdf = gdf.round(1)
+
+		return gdf[[i for i in gdf.columns if (i != gdf.geometry.name)] + [gdf.geometry.name]]
+
+	# Basic CIE coef method
+	gdf_BasicCIE = Get_Layer(Scripts['Basic'].Mapping_EUI(Resources['Basic_Country'], Resources['Basic_EUI'], Resources['CIE_Table'][Scenario['CIE_Table']]))
+
+	# Country EUI method
+	gdf_CountryEUI = {}
+	for i_Country, i_gdf in Resources['Country'].items():
+
+		if (i_Country not in ['JP', 'US']):
+			gdf_CountryEUI[i_Country] = i_gdf
+			continue
+
+		df_Mapping_SpaceClass, df_Mapping_CollateralClass = Resources['{}_Mapping'.format(i_Country)][Scenario['Mapping_Config'].get(i_Country, '{}/data/Mapping.Config'.format(i_Country))]
+
+		if (i_Country == 'JP'):
+			df_Source = Resources['JP_DECC']
+		else:
+			# The climate-adjusted EUI of the projection year, as written by calc.EUI.ClimateAdjusted.py
+			df_Source = Scripts['US_EUI'].Format_File(Scripts['US_EUI'].Calc_Adjusted(Resources['US_EnergyStar'].copy(), Resources['US_Factor'].loc[Scenario['Projection_Year']]), Output_Language='Chinese')
+
+		df_EUI_SpaceClass      = Scripts['{}_Mapping'.format(i_Country)].Mapping_to_SpaceClass(df_Mapping_SpaceClass, df_Source)
+		df_EUI_CollateralClass = Scripts['{}_Mapping'.format(i_Country)].Mapping_to_CollateralClass(df_Mapping_CollateralClass, df_EUI_SpaceClass)
+		df_Group_EUI           = Scripts['{}_Layer'.format(i_Country)].Get_Group_EUI(df_EUI_SpaceClass, df_EUI_CollateralClass)
+
+		gdf = Scripts['{}_Layer'.format(i_Country)].Mapping_EUI(i_gdf, df_Group_EUI)
+		if ('{}_Lookup'.format(i_Country) in Resources): gdf = Scripts['{}_Layer'.format(i_Country)].Dissolve_County(gdf, Resources['{}_Lookup'.format(i_Country)], Resources['{}_Region'.format(i_Country)])
+
+		gdf_CountryEUI[i_Country] = Get_Layer(gdf)
+
+	gdf_EUI = Scripts['Merge'].Combine_Shapefile(gdf_BasicCIE, gdf_CountryEUI).round(1)
+
+	return gdf_EUI
+
+def Calc_Scenarios(Dict_Scenario, Scripts, Resources):
+
+	# Calculate the merged layer of all scenarios
+	Dict_Layer = {}
+	for i_Name, i_Scenario in Dict_Scenario.items():
+
+		Time_Start = time.perf_counter()
+		Dict_Layer[i_Name] = Calc_Scenario(i_Scenario, Scripts, Resources)
+		print('[Scenario] {}: {:.3f}s ({} features)'.format(i_Name, time.perf_counter() - Time_Start, len(Dict_Layer[i_Name])))
+
+	return Dict_Layer
+
+if (__name__ == '__main__'):
+
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
+
+	# Build the cube of all scenarios (False: only export from the existing cube),
+	# and the scenarios exported to a layer in the output format (e.g. ["Base"])
+	Is_Build    = True
+	List_Export = []
+
+	# Get configuration files
+	with open('../Config.json', 'r', encoding='utf-8') as f: config = json.load(f)
+	Output_Format   = Get_Output_Format()
+	Output_Profile  = Get_Output_Profile()
+	Output_Dissolve = Get_Output_Dissolve()
+	Scenario_Store  = Get_Scenario_Store()
+
+	Output_Path = '../output/output_result/Scenario/'
+	Output_Name = 'EUI.Prediction.CTBC.Global.Scenario.zarr'
+	Cube_File   = Output_Path + os.path.splitext(Output_Name)[0] + Dict_Store_Extension[Scenario_Store]
+
+	if (Is_Build):
+
+		# Get the definitions of the scenarios
+		Dict_Scenario = Get_Scenario()
+
+		# Load the inputs shared by all scenarios
+		Scripts, Resources = Get_Resources(Dict_Scenario, config['Method2_CountryEUI'], Output_Format=Output_Format, Output_Dissolve=Output_Dissolve)
+
+		# Calculate all scenarios
+		Dict_Layer = Calc_Scenarios(Dict_Scenario, Scripts, Resources)
+
+		# ==================================================================================================
+		# Output the cube (and the geometry of its regions)
+		Output_Cube(\
+			Calc_Cube(Dict_Layer, Dict_Attribute=Dict_Scenario), \
+			next(iter(Dict_Layer.values())), \
+			Output_Path, \
+			Output_Name, \
+			Scenario_Store=Scenario_Store, \
+			Output_Format=Output_Format, \
+		)
+		print('[Scenario] {} scenarios output to {}'.format(len(Dict_Layer), Cube_File))
+
+	# ==================================================================================================
+	# Export the scenarios to layers (in the output format selected in Config.json)
+	for i_Scenario in List_Export:
+
+		Output_Scenario_Layer(\
+			Cube_File, \
+			i_Scenario, \
+			'../output/output_result/Shapefile/EUI.Prediction.CTBC.Global.Scenario/', \
+			'EUI.Prediction.CTBC.Global.{}.shp'.format(i_Scenario), \
+			Output_Format=Output_Format, \
+			Output_Profile=Output_Profile, \
+		)
\ No newline at end of file
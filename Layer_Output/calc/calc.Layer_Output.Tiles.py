@@ -0,0 +1,236 @@
+"""
+calc.Layer_Output.Tiles.py
+======================
+Cut the layers into vector tiles (MBTiles archive of MVT tiles) for the map front-end:
+(1) the country polygons created by basic CIE coef method at the low zoom levels (layer "World"),
+(2) the merged layer (with the prefectures/counties of country EUI method) at the high zoom levels (layer "Region").
+The polygons are simplified at each zoom level, and the tiles are built in parallel processes.
+"""
+
+import shapely
+import os
+import sys
+import time
+import fnmatch
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append('../..')
+from Common.Output import Get_Output_Format, Get_Layer_File, Read_Layer
+from Common.VectorTile import Latitude_Max, Get_Tile_Size, Get_Tile_Bounds, Get_Tile_Cover, Clip_Tile, Get_Attribute_Records, Encode_Layer, Encode_Tile, Create_MBTiles, Insert_Tiles
+from Common.Profiler import Profile_Stages
+
+# The layers, simplified geometry and spatial index of each zoom level, held by each worker process
+Dict_Worker = {}
+
+def Get_Layer(Layer_Path, List_Attribute, Output_Format='Shapefile'):
+
+	"""
+	Get a layer with the requested attributes, projected to Web Mercator.
+	==================================================================================================
+	Input:
+
+		Layer_Path: The directory of the layer.
+
+		List_Attribute: The attributes carried into the tiles (wildcards allowed, e.g. "EUI_*"), besides COUNTRY and REGNAME.
+
+		Output_Format: The output format preferred if the layer exists in several formats.
+
+	Output:
+
+		gdf: The layer (EPSG:3857).
+	"""
+
+	gdf = Read_Layer(Get_Layer_File(Layer_Path, Output_Format=Output_Format))
+
+	# Keep only the requested attributes
+	List_Column = ['COUNTRY', 'REGNAME'] + [i for i in gdf.columns if (i not in ['COUNTRY', 'REGNAME', 'geometry']) and any(fnmatch.fnmatchcase(i, j) for j in List_Attribute)]
+	gdf = gdf[List_Column + ['geometry']]
+
+	# Clip to the latitude range of Web Mercator, and project
+	if (gdf.crs is not None) and (gdf.crs.to_epsg() != 4326): gdf = gdf.to_crs('epsg:4326')
+	gdf['geometry'] = shapely.clip_by_rect(gdf['geometry'].values, -180, -Latitude_Max, 180, Latitude_Max)
+	gdf = gdf.loc[~gdf.is_empty].set_crs('epsg:4326', allow_override=True).to_crs('epsg:3857').reset_index(drop=True)
+
+	return gdf
+
+def Init_Worker(Dict_Layer, Extent, Tolerance):
+
+	Dict_Worker['Layer']     = Dict_Layer
+	Dict_Worker['Attribute'] = {i: Get_Attribute_Records(j[0].drop(columns=['geometry'])) for i, j in Dict_Layer.items()}
+	Dict_Worker['Extent']    = Extent
+	Dict_Worker['Tolerance'] = Tolerance
+
+	return
+
+def Get_Zoom_Layer(Layer_Name, Zoom):
+
+	"""
+	Get the layer simplified for the zoom level (tolerance: Tolerance units of the tile extent) and its spatial index.
+	"""
+
+	if ((Layer_Name, Zoom) not in Dict_Worker):
+
+		gdf, _, _ = Dict_Worker['Layer'][Layer_Name]
+		Geometry  = shapely.simplify(gdf['geometry'].values, Get_Tile_Size(Zoom) / Dict_Worker['Extent'] * Dict_Worker['Tolerance'], preserve_topology=True)
+		Dict_Worker[(Layer_Name, Zoom)] = (Geometry, shapely.STRtree(Geometry))
+
+	return Dict_Worker[(Layer_Name, Zoom)]
+
+def Build_Tiles(Zoom, List_Tile):
+
+	"""
+	Build the tiles of the zoom level.
+	==================================================================================================
+	Input:
+
+		Zoom: The zoom level.
+
+		List_Tile: The (X, Y) of the tiles.
+
+	Output:
+
+		List_Data: The (Zoom, X, Y, Data) of the tiles containing any feature.
+	"""
+
+	List_Data = []
+
+	for i_X, i_Y in List_Tile:
+
+		Bounds     = Get_Tile_Bounds(Zoom, i_X, i_Y)
+		List_Layer = []
+
+		for i_Layer, (_, Min_Zoom, Max_Zoom) in Dict_Worker['Layer'].items():
+
+			if not (Min_Zoom <= Zoom <= Max_Zoom): continue
+
+			Geometry, Tree = Get_Zoom_Layer(i_Layer, Zoom)
+			Index = Tree.query(shapely.box(*Bounds), predicate='intersects')
+			if (len(Index) == 0): continue
+
+			Index.sort()
+			Layer = Encode_Layer(\
+				i_Layer, \
+				Clip_Tile(Geometry[Index], Bounds, Extent=Dict_Worker['Extent']), \
+				[Dict_Worker['Attribute'][i_Layer][i] for i in Index], \
+				Extent=Dict_Worker['Extent'], \
+			)
+			if (Layer is not None): List_Layer.append(Layer)
+
+		if (len(List_Layer) > 0): List_Data.append((Zoom, i_X, i_Y, Encode_Tile(List_Layer)))
+
+	return List_Data
+
+def Get_Metadata(Dict_Layer, Output_Name):
+
+	"""
+	Get the metadata of the MBTiles archive (including the vector_layers description read by the map front-end).
+	"""
+
+	List_Vector_Layer = [{\
+		'id': i_Layer, \
+		'fields': {i: ('String' if (gdf[i].dtype == object) else 'Number') for i in gdf.columns if (i != 'geometry')}, \
+		'minzoom': Min_Zoom, \
+		'maxzoom': Max_Zoom, \
+	} for i_Layer, (gdf, Min_Zoom, Max_Zoom) in Dict_Layer.items()]
+
+	return {\
+		'name': Output_Name, \
+		'format': 'pbf', \
+		'type': 'overlay', \
+		'minzoom': str(min(i['minzoom'] for i in List_Vector_Layer)), \
+		'maxzoom': str(max(i['maxzoom'] for i in List_Vector_Layer)), \
+		'bounds': '-180,{0:.6f},180,{1:.6f}'.format(-Latitude_Max, Latitude_Max), \
+		'center': '0,0,{}'.format(min(i['minzoom'] for i in List_Vector_Layer)), \
+		'json': {'vector_layers': List_Vector_Layer}, \
+	}
+
+def Output_Tiles(Dict_Layer, Output_Path, Output_Name, Extent=4096, Tolerance=1, Chunk_Size=256, n_Worker=os.cpu_count()):
+
+	"""
+	Build the tiles of all zoom levels in parallel processes and output them to an MBTiles archive.
+	==================================================================================================
+	Input:
+
+		Dict_Layer: The layer (EPSG:3857), minimum and maximum zoom level of each tile layer.
+
+		Output_Path: The output directory.
+
+		Output_Name: The output file name.
+
+		Extent: The size of the tile in tile coordinates.
+
+		Tolerance: The simplification tolerance of each zoom level (in units of the tile extent at that zoom level).
+
+		Chunk_Size: The number of tiles built in a task.
+
+		n_Worker: The number of worker processes.
+
+	Output:
+
+		None
+	"""
+
+	if not os.path.exists(Output_Path): os.makedirs(Output_Path)
+
+	Time_Start = time.perf_counter()
+
+	# Split the tiles covered by any layer into tasks
+	List_Task = []
+	for i_Zoom in range(min(i[1] for i in Dict_Layer.values()), max(i[2] for i in Dict_Layer.values()) + 1):
+
+		Set_Tile = set()
+		for gdf, Min_Zoom, Max_Zoom in Dict_Layer.values():
+			if (Min_Zoom <= i_Zoom <= Max_Zoom): Set_Tile |= Get_Tile_Cover(gdf['geometry'].bounds.to_numpy(), i_Zoom)
+
+		List_Tile = sorted(Set_Tile)
+		List_Task += [(i_Zoom, List_Tile[i:i+Chunk_Size]) for i in range(0, len(List_Tile), Chunk_Size)]
+
+	# Build the tiles (written to a temporary file, replaced when all tiles are built)
+	Connection = Create_MBTiles(Output_Path + Output_Name + '.tmp', Get_Metadata(Dict_Layer, os.path.splitext(Output_Name)[0]))
+	Dict_Count = {}
+
+	with ProcessPoolExecutor(max_workers=n_Worker, initializer=Init_Worker, initargs=(Dict_Layer, Extent, Tolerance)) as Executor:
+
+		for i_Future in as_completed([Executor.submit(Build_Tiles, *i) for i in List_Task]):
+
+			List_Data = i_Future.result()
+			Insert_Tiles(Connection, List_Data)
+			for i_Zoom, _, _, i_Data in List_Data: Dict_Count[i_Zoom] = [Dict_Count.get(i_Zoom, [0, 0])[0] + 1, Dict_Count.get(i_Zoom, [0, 0])[1] + len(i_Data)]
+
+	Connection.close()
+	os.replace(Output_Path + Output_Name + '.tmp', Output_Path + Output_Name)
+
+	for i_Zoom in sorted(Dict_Count): print('[Tiles] Zoom {}: {} tiles, {:.1f} kB'.format(i_Zoom, Dict_Count[i_Zoom][0], Dict_Count[i_Zoom][1] / 1024))
+	print('[Tiles] Finished in {:.1f}s ({} workers)'.format(time.perf_counter() - Time_Start, n_Worker))
+
+	return
+
+if (__name__ == '__main__'):
+
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
+
+	# Get the output format selected in Config.json
+	Output_Format = Get_Output_Format()
+
+	# Set the attributes carried into the tiles (wildcards allowed)
+	List_Attribute = ['Coef_CIE', 'EUI_*']
+
+	# Set the zoom levels: basic CIE coef method below Zoom_Region, the merged layer from Zoom_Region to Zoom_Max
+	Zoom_Min    = 0
+	Zoom_Region = 4
+	Zoom_Max    = 8
+
+	# Get the layers
+	Dict_Layer = {\
+		'World': (Get_Layer('../../Basic_Coef/output/output_result/Shapefile/EUI.Prediction.CTBC.Global/', List_Attribute, Output_Format=Output_Format), Zoom_Min, Zoom_Region - 1), \
+		'Region': (Get_Layer('../output/output_result/Shapefile/EUI.Prediction.CTBC.Global/', List_Attribute, Output_Format=Output_Format), Zoom_Region, Zoom_Max), \
+	}
+
+	# ==================================================================================================
+	# Output the tiles to MBTiles archive
+	Output_Tiles(\
+		Dict_Layer, \
+		'../output/output_result/Tiles/', \
+		'EUI.Prediction.CTBC.Global.mbtiles', \
+	)
@@ -0,0 +1,355 @@
+"""
+calc.Pipeline.py
+======================
+Rebuild the global layer by running every stage of the pipeline (Basic_Coef -> countries -> Layer_Output/Merge).
+The stage dependency graph is built from Config.json:
+1. The stages of each directory (Pipeline_Stage) run in the listed order.
+2. Basic_Coef (Method1_BasicCIE) and the countries (Method2_CountryEUI) are independent of each other and run concurrently.
+3. The stages of Layer_Output run after all of them.
+Each stage is run as a separate Python process from its own calc/ directory, exactly as when it is run by hand.
+Each stage declares its input and output files (or directories) in Config.json, and the content hashes of its code,
+inputs and outputs are recorded in a manifest after it is done. A stage is only re-executed when its code or any input
+has changed since then (or its outputs have been modified or removed), so editing one country's mapping configuration
+only reruns the Mapping and Layer_Output stages of that country and the Merge.
+An input "<file>:<key>,<key>,..." is a JSON configuration file of which only the listed keys are read by the stage
+(e.g. "Layer_Output/Config.json:Output_Format,Output_Profile"), so editing its other keys does not rerun the stage.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+sys.path.append('../..')
+from Common.Cache import Hash_File
+
+# The root directory of the repository (the paths in Config.json are relative to it)
+Root_Path = '../../'
+
+def Get_Config():
+
+	with open('../Config.json', 'r', encoding='utf-8') as f: config = json.load(f)
+
+	return config
+
+def Get_Stage_Graph(config):
+
+	"""
+	Build the stage dependency graph.
+	==================================================================================================
+	Input:
+
+		config: The configurations in Config.json.
+
+	Output:
+
+		Dict_Stage: The directory, script, inputs and outputs of each stage, keyed by the stage name "<directory>/<script>".
+
+		Dict_Dependency: The names of the stages that each stage depends on.
+	"""
+
+	# Get the directories to be rebuilt
+	List_Directory = (['Basic_Coef'] if (len(config['Method1_BasicCIE']) > 0) else []) + config['Method2_CountryEUI']
+
+	Dict_Stage      = {}
+	Dict_Dependency = {}
+	Dict_Last       = {}
+
+	for i_Directory in List_Directory + ['Layer_Output']:
+
+		# The first stage of Layer_Output depends on the last stage of every other directory
+		List_Previous = list(Dict_Last.values()) if (i_Directory == 'Layer_Output') else []
+
+		# The stages of the same directory run in the listed order
+		for i_Stage in config['Pipeline_Stage'].get(i_Directory, []):
+
+			Stage_Name = '{}/{}'.format(i_Directory, i_Stage['Script'])
+			Dict_Stage[Stage_Name]      = dict(i_Stage, Directory=i_Directory)
+			Dict_Dependency[Stage_Name] = List_Previous
+			List_Previous = [Stage_Name]
+			Dict_Last[i_Directory] = Stage_Name
+
+	return Dict_Stage, Dict_Dependency
+
+def Get_Files(List_Path):
+
+	"""
+	Get the files of the paths (a directory is expanded to all files under it), relative to the root directory.
+	A path that does not exist is kept as it is.
+	"""
+
+	List_File = []
+
+	for i_Path in List_Path:
+
+		if os.path.isdir(Root_Path + i_Path):
+			for i_Root, _, i_Files in os.walk(Root_Path + i_Path):
+				List_File += [os.path.relpath(os.path.join(i_Root, i), Root_Path).replace(os.sep, '/') for i in i_Files]
+		else:
+			List_File.append(i_Path)
+
+	return sorted(set(List_File))
+
+def Get_Code_Files(Stage_Directory, Stage_Script):
+
+	"""
+	Get the code files of a stage: the script and the modules of Common imported by it (directly or indirectly).
+	"""
+
+	List_File = ['{}/calc/{}'.format(Stage_Directory, Stage_Script)]
+
+	for i_File in List_File:
+
+		if not os.path.exists(Root_Path + i_File): continue
+
+		with open(Root_Path + i_File, 'r', encoding='utf-8') as f: Code = f.read()
+
+		for i_Module in re.findall(r'^\s*(?:from|import)\s+Common\.(\w+)', Code, flags=re.M):
+			if ('Common/{}.py'.format(i_Module) not in List_File): List_File.append('Common/{}.py'.format(i_Module))
+
+	return List_File
+
+def Hash_Files(List_File):
+
+	"""
+	Get the content hash of each file ("Missing" for a file that does not exist).
+	"""
+
+	return {i: Hash_File(Root_Path + i) if os.path.isfile(Root_Path + i) else 'Missing' for i in List_File}
+
+def Hash_Config_Keys(Config_Input):
+
+	"""
+	Get the content hash of the keys of a JSON configuration file read by a stage, from the input "<file>:<key>,<key>,..."
+	("Missing" for a file that does not exist; a key that is not set is hashed as null).
+	"""
+
+	Config_File, Keys = Config_Input.split(':', 1)
+	if not os.path.isfile(Root_Path + Config_File): return 'Missing'
+
+	with open(Root_Path + Config_File, 'r', encoding='utf-8') as f: config = json.load(f)
+
+	return hashlib.sha256(json.dumps({i: config.get(i) for i in Keys.split(',')}, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+def Get_Stage_Hash(Stage):
+
+	"""
+	Get the content hashes of the code and the inputs of a stage (the inputs "<file>:<key>,..." by the listed keys only).
+	"""
+
+	List_Config = [i for i in Stage['Input'] if (':' in i)]
+
+	return {\
+		'Code': Hash_Files(Get_Code_Files(Stage['Directory'], Stage['Script'])), \
+		'Input': dict(Hash_Files(Get_Files([i for i in Stage['Input'] if (i not in List_Config)])), **{i: Hash_Config_Keys(i) for i in List_Config}), \
+	}
+
+def Get_Changed_Files(Stage, Dict_Hash, Dict_Record):
+
+	"""
+	Compare a stage against its record in the manifest.
+	==================================================================================================
+	Input:
+
+		Stage: The directory, script, inputs and outputs of the stage.
+
+		Dict_Hash: The current content hashes of the code and the inputs of the stage.
+
+		Dict_Record: The record of the stage in the manifest (None if the stage has never been done).
+
+	Output:
+
+		List_Changed: The code, input and output files changed since the stage was last done (empty if the stage is up to date).
+	"""
+
+	if (Dict_Record is None): return ['(not built)']
+
+	List_Changed = []
+
+	for i_Type, Dict_Current in [('Code', Dict_Hash['Code']), ('Input', Dict_Hash['Input']), ('Output', Hash_Files(Get_Files(Stage['Output'])))]:
+
+		Dict_Previous = Dict_Record.get(i_Type, {})
+		List_Changed += sorted(i for i in set(Dict_Current) | set(Dict_Previous) if (Dict_Current.get(i) != Dict_Previous.get(i)))
+
+	return List_Changed
+
+def Get_Manifest(Manifest_File='../output/output_data/Pipeline.Manifest.json'):
+
+	if not os.path.exists(Manifest_File): return {}
+
+	with open(Manifest_File, 'r', encoding='utf-8') as f: Dict_Manifest = json.load(f)
+
+	return Dict_Manifest
+
+def Output_Manifest(Dict_Manifest, Manifest_File='../output/output_data/Pipeline.Manifest.json'):
+
+	"""
+	Output the manifest (written to a temporary file first, so that an interrupted run never leaves a broken manifest).
+	"""
+
+	if not os.path.exists(os.path.dirname(Manifest_File)): os.makedirs(os.path.dirname(Manifest_File))
+
+	with open(Manifest_File + '.tmp', 'w', encoding='utf-8') as f: json.dump(Dict_Manifest, f, indent=4, ensure_ascii=False, sort_keys=True)
+	os.replace(Manifest_File + '.tmp', Manifest_File)
+
+	return
+
+def Run_Stage(Stage_Directory, Stage_Script, Log_Path='../output/output_log/'):
+
+	"""
+	Run a stage as a separate Python process from its own calc/ directory.
+	==================================================================================================
+	Input:
+
+		Stage_Directory: The directory of the stage, e.g. "JP".
+
+		Stage_Script: The script of the stage, e.g. "calc.DECC.py".
+
+		Log_Path: The directory of the log files (stdout and stderr of each stage).
+
+	Output:
+
+		Return_Code: The return code of the process.
+
+		Time_Elapsed: The wall time of the stage.
+	"""
+
+	if not os.path.exists(Log_Path): os.makedirs(Log_Path)
+	Log_File = os.path.abspath(Log_Path + '{}.{}.log'.format(Stage_Directory, Stage_Script))
+
+	Time_Start = time.perf_counter()
+
+	with open(Log_File, 'w', encoding='utf-8') as f:
+		Return_Code = subprocess.run([sys.executable, Stage_Script], cwd='../../{}/calc/'.format(Stage_Directory), stdout=f, stderr=subprocess.STDOUT).returncode
+
+	return Return_Code, time.perf_counter() - Time_Start
+
+def Output_Run_Report(Dict_Stage, Dict_Status, Report_File='../output/output_log/Pipeline.Profile.json', n_Slowest=5):
+
+	"""
+	Combine the run reports of the stages done in this run (written by Common/Profiler.py) into one report, and print the slowest functions.
+	"""
+
+	Dict_Report = {}
+
+	for i_Stage, i_Status in Dict_Status.items():
+
+		Report_Stage = Root_Path + '{}/output/output_log/{}.Profile.json'.format(Dict_Stage[i_Stage]['Directory'], os.path.splitext(Dict_Stage[i_Stage]['Script'])[0])
+		if (i_Status != 'Done') or not (os.path.exists(Report_Stage)): continue
+
+		with open(Report_Stage, 'r', encoding='utf-8') as f: Dict_Report[i_Stage] = json.load(f)
+
+	if (len(Dict_Report) == 0): return
+
+	if not os.path.exists(os.path.dirname(Report_File)): os.makedirs(os.path.dirname(Report_File))
+	with open(Report_File, 'w', encoding='utf-8') as f: json.dump(Dict_Report, f, ensure_ascii=False, indent=4)
+
+	# The slowest top-level functions of all stages
+	List_Record = [(i_Stage, i) for i_Stage, i_Report in Dict_Report.items() for i in i_Report['Stage'] if (i['Depth'] == 0)]
+	for i_Stage, i_Record in sorted(List_Record, key=lambda i: -i[1]['Wall'])[:n_Slowest]:
+		print('[Pipeline] Slowest {}:{} {:.1f}s (CPU {:.1f}s, peak RSS {} MB)'.format(i_Stage, i_Record['Stage'], i_Record['Wall'], i_Record['CPU'], '{:.0f}'.format(i_Record['Peak_RSS']) if (i_Record['Peak_RSS'] is not None) else '-'))
+
+	return
+
+def Run_Pipeline(Dict_Stage, Dict_Dependency, Dict_Manifest, n_Worker=os.cpu_count(), Force_Rebuild=False):
+
+	"""
+	Run the stages concurrently, each as soon as all stages it depends on are finished.
+	A stage whose code, inputs and outputs are unchanged since it was last done is not re-executed.
+	==================================================================================================
+	Input:
+
+		Dict_Stage: The directory, script, inputs and outputs of each stage.
+
+		Dict_Dependency: The names of the stages that each stage depends on.
+
+		Dict_Manifest: The content hashes recorded for each stage when it was last done (updated in place).
+
+		n_Worker: The maximum number of stages running at the same time.
+
+		Force_Rebuild: Whether to re-execute every stage regardless of the manifest.
+
+	Output:
+
+		Dict_Status: The status of each stage ("Done", "Unchanged", "Failed" or "Skipped").
+	"""
+
+	Dict_Status = {}
+	Dict_Future = {}
+	Dict_Hash   = {}
+
+	Time_Start = time.perf_counter()
+
+	with ThreadPoolExecutor(max_workers=n_Worker) as Executor:
+
+		while (len(Dict_Status) < len(Dict_Stage)):
+
+			for i_Stage in Dict_Stage:
+
+				if (i_Stage in Dict_Status) or (i_Stage in Dict_Future.values()): continue
+
+				# Skip the stage if any stage it depends on is failed or skipped
+				if any(Dict_Status.get(i) in ['Failed', 'Skipped'] for i in Dict_Dependency[i_Stage]):
+					Dict_Status[i_Stage] = 'Skipped'
+					print('[Pipeline] Skipped {}'.format(i_Stage))
+
+				# Submit the stage if all stages it depends on are finished and anything it reads has changed
+				elif all(Dict_Status.get(i) in ['Done', 'Unchanged'] for i in Dict_Dependency[i_Stage]):
+
+					Dict_Hash[i_Stage] = Get_Stage_Hash(Dict_Stage[i_Stage])
+					List_Changed = ['(forced)'] if (Force_Rebuild) else Get_Changed_Files(Dict_Stage[i_Stage], Dict_Hash[i_Stage], Dict_Manifest.get(i_Stage))
+
+					if (len(List_Changed) == 0):
+						Dict_Status[i_Stage] = 'Unchanged'
+						print('[Pipeline] Unchanged {}'.format(i_Stage))
+						continue
+
+					Dict_Future[Executor.submit(Run_Stage, Dict_Stage[i_Stage]['Directory'], Dict_Stage[i_Stage]['Script'])] = i_Stage
+					print('[Pipeline] Started {} (changed: {}{})'.format(i_Stage, ', '.join(List_Changed[:3]), ', ...' if (len(List_Changed) > 3) else ''))
+
+			if (len(Dict_Future) == 0): continue
+
+			# Wait for any running stage to finish
+			Set_Done, _ = wait(Dict_Future, return_when=FIRST_COMPLETED)
+
+			for i_Future in Set_Done:
+
+				i_Stage = Dict_Future.pop(i_Future)
+				Return_Code, Time_Elapsed = i_Future.result()
+				Dict_Status[i_Stage] = 'Done' if (Return_Code == 0) else 'Failed'
+				print('[Pipeline] {} {} ({:.1f}s)'.format(Dict_Status[i_Stage], i_Stage, Time_Elapsed))
+
+				# Record the hashes of the stage (a failed stage is always re-executed next time)
+				if (Dict_Status[i_Stage] == 'Done'):
+					Dict_Manifest[i_Stage] = dict(Dict_Hash[i_Stage], Output=Hash_Files(Get_Files(Dict_Stage[i_Stage]['Output'])))
+				else:
+					Dict_Manifest.pop(i_Stage, None)
+
+				Output_Manifest(Dict_Manifest)
+
+	print('[Pipeline] Finished in {:.1f}s'.format(time.perf_counter() - Time_Start))
+
+	return Dict_Status
+
+if (__name__ == '__main__'):
+
+	# Get configuration files
+	config = Get_Config()
+
+	# Build the stage dependency graph
+	Dict_Stage, Dict_Dependency = Get_Stage_Graph(config)
+
+	# Get the content hashes recorded when each stage was last done
+	Dict_Manifest = Get_Manifest()
+
+	# Run the stages whose code or inputs have changed (Force_Rebuild: run all stages)
+	Dict_Status = Run_Pipeline(Dict_Stage, Dict_Dependency, Dict_Manifest, Force_Rebuild=False)
+
+	# Combine the run reports of the stages
+	Output_Run_Report(Dict_Stage, Dict_Status)
+
+	if any(i not in ['Done', 'Unchanged'] for i in Dict_Status.values()): sys.exit(1)
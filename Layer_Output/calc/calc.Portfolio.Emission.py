@@ -0,0 +1,317 @@
+"""
+calc.Portfolio.Emission.py
+======================
+Calculate the electricity use and CO2e emission of each asset of a portfolio (floor area x EUI x Coef_CIE),
+and the aggregates of each country, region and collateral class.
+The portfolio CSV is read in chunks, so that the memory use is bounded regardless of the number of assets:
+(1) the EUI of the collateral class in the region (Mapping.CTBC.Collateral.Mean.csv of each country of country EUI method),
+	or of basic CIE coef method for the other countries, the assets without a known region and the classes without regional EUI,
+(2) the carbon intensity of electricity of the country (Coef_CarbonIntensity_Electricity.csv),
+are looked up through index arrays precomputed once.
+"""
+
+import numpy as np
+import pandas as pd
+import os
+import sys
+import json
+import time
+
+sys.path.append('../..')
+from Common.Cache import Is_Parquet_Available
+from Common.Country import Label_Mean
+from Common.Profiler import Profile_Stages
+
+if (Is_Parquet_Available):
+	import pyarrow
+	import pyarrow.csv
+
+def Get_EUI_Table(List_Country):
+
+	"""
+	Get the EUI tables of the collateral classes as arrays indexed by class (and region).
+	==================================================================================================
+	Input:
+
+		List_Country: The countries of country EUI method.
+
+	Output:
+
+		Dict_Table: The index of the collateral classes ("Class"), the index of the (country, region) pairs ("Region"),
+			the EUI of each region and class ("EUI_Region"), the EUI of each class by basic CIE coef method ("EUI_Basic"),
+			and the countries with regional EUI ("Country_Region").
+	"""
+
+	# EUI of basic CIE coef method
+	df_Basic = pd.read_csv('../../Basic_Coef/data/EEWH_EUI/Mapping.CTBC.Collateral.Mean.csv')
+	df_Basic['擔保品細項'] = df_Basic['擔保品細項'].astype(int).astype(str).str.zfill(2)
+
+	# EUI of each region of country EUI method (one row per country, region and class)
+	List_df = []
+	for i_Country in List_Country:
+
+		File_Path = '../../{}/output/output_data/Mapping.CTBC/Mapping.CTBC.Collateral.Mean.csv'.format(i_Country)
+		if not os.path.exists(File_Path):
+			print('[Portfolio] {}: no Mapping.CTBC.Collateral.Mean.csv, basic CIE coef method is used'.format(i_Country))
+			continue
+
+		# Only the group-mean row of each class (the other rows are the EUI of its member spaces),
+		# and only the EUI_<region> columns (not the EUI_<statistic>_<region> columns, e.g. EUI_Lower_北海道)
+		df = pd.read_csv(File_Path, dtype={'擔保品細項': str})
+		df = df[df['使用空間名稱']==Label_Mean]
+		df = df.melt(id_vars=['擔保品細項'], value_vars=[i for i in df.columns if i.startswith('EUI_') and ('_' not in i[len('EUI_'):])], var_name='Region', value_name='EUI')
+		df['Region']  = df['Region'].str[len('EUI_'):]
+		df['Country'] = i_Country
+		List_df.append(df)
+
+	df_Region = pd.concat(List_df, ignore_index=True) if (len(List_df) > 0) else pd.DataFrame(columns=['擔保品細項', 'Region', 'EUI', 'Country'])
+
+	# One EUI per country, region and class
+	Is_Duplicated = df_Region.duplicated(['Country', 'Region', '擔保品細項'])
+	if (Is_Duplicated.any()): raise ValueError('Duplicated EUI of (country, region, class): {}'.format(', '.join(str(i) for i in df_Region.loc[Is_Duplicated, ['Country', 'Region', '擔保品細項']].drop_duplicates().itertuples(index=False, name=None))))
+
+	# Precompute the indices
+	Index_Class  = pd.Index(sorted(set(df_Basic['擔保品細項']) | set(df_Region['擔保品細項'])))
+	Index_Region = pd.MultiIndex.from_frame(df_Region[['Country', 'Region']].drop_duplicates())
+
+	Array_EUI_Region = np.full((len(Index_Region), len(Index_Class)), np.nan)
+	Array_EUI_Region[\
+		Index_Region.get_indexer(pd.MultiIndex.from_frame(df_Region[['Country', 'Region']])), \
+		Index_Class.get_indexer(df_Region['擔保品細項']), \
+	] = df_Region['EUI'].to_numpy(dtype=float)
+
+	return {\
+		'Class': Index_Class, \
+		'Region': Index_Region, \
+		'EUI_Region': Array_EUI_Region, \
+		'EUI_Basic': df_Basic.set_index('擔保品細項')['EUI_Mean'].reindex(Index_Class).to_numpy(dtype=float), \
+		'Country_Region': pd.Index(df_Region['Country'].unique()), \
+	}
+
+def Get_Coef_CarbonIntensity():
+
+	# Read carbon intensity data (kgCO2e/kWh, indexed by the country code)
+	df_CarbonIntensity = pd.read_csv('../../Basic_Coef/data/Coef_CarbonIntensity_Electricity/Coef_CarbonIntensity_Electricity.csv', encoding='utf-8')
+
+	return df_CarbonIntensity.set_index('國家/地區代號')['電力排碳係數_公斤CO2e/度']
+
+def Get_Key(df, Column_Country='國家/地區代號', Column_Region='區域', Column_Class='擔保品細項'):
+
+	"""
+	Get the country code (upper case), region (empty if not given) and collateral class (2 digits) of each asset.
+	Each column is factorized first, so that only its distinct values are normalized.
+	==================================================================================================
+	Output:
+
+		Dict_Key: The (codes, labels) of "Country", "Region" and "Class" (the key of each asset is labels[codes]).
+	"""
+
+	Dict_Normalize = {\
+		'Country': (Column_Country, lambda x: x.str.strip().str.upper()), \
+		'Region': (Column_Region, lambda x: x.str.strip()), \
+		'Class': (Column_Class, lambda x: x.str.strip().map(lambda y: y.zfill(2) if (y != '') else y)), \
+	}
+
+	Dict_Key = {}
+
+	for i_Key, (i_Column, i_Normalize) in Dict_Normalize.items():
+
+		Column = df[i_Column] if (i_Column in df.columns) else pd.Series('', index=df.index)
+		Codes, Uniques = pd.factorize(Column, use_na_sentinel=False)
+
+		# Distinct values equal after normalization share one label
+		Codes_Label, Labels = pd.factorize(i_Normalize(pd.Series(Uniques, dtype=object).fillna('').astype(str)))
+		Dict_Key[i_Key] = (Codes_Label[Codes], pd.Index(Labels))
+
+	return Dict_Key
+
+def Calc_Emission(df, Dict_Table, Coef_CIE, Column_Country='國家/地區代號', Column_Region='區域', Column_Class='擔保品細項', Column_Area='樓地板面積'):
+
+	"""
+	Calculate the electricity use and CO2e emission of each asset.
+	==================================================================================================
+	Input:
+
+		df: The assets (a chunk of the portfolio).
+
+		Dict_Table: The EUI tables (see Get_EUI_Table).
+
+		Coef_CIE: The carbon intensity of electricity of each country.
+
+		Column_Country, Column_Region, Column_Class, Column_Area: The columns of the country code, region (EUI region of
+			the country, e.g. "北海道"; optional), collateral class and floor area (m2) of the portfolio.
+
+	Output:
+
+		df: The assets with EUI (kWh/m2.yr), EUI_Source ("Region", "Basic" or empty), Coef_CIE (kgCO2e/kWh),
+			Electricity (kWh/yr) and Emission (kgCO2e/yr).
+	"""
+
+	Dict_Key = Get_Key(df, Column_Country=Column_Country, Column_Region=Column_Region, Column_Class=Column_Class)
+	Code_Country, Label_Country = Dict_Key['Country']
+	Code_Region, Label_Region   = Dict_Key['Region']
+	Code_Class, Label_Class     = Dict_Key['Class']
+
+	# Look up the distinct keys of the chunk, and broadcast them to the assets
+	Index_Class = Dict_Table['Class'].get_indexer(Label_Class)[Code_Class]
+	Index_CIE   = Coef_CIE.index.get_indexer(Label_Country)[Code_Country]
+
+	Pair, Code_Pair = np.unique(Code_Country * len(Label_Region) + Code_Region, return_inverse=True)
+	Index_Region = Dict_Table['Region'].get_indexer(pd.MultiIndex.from_arrays([\
+		Label_Country[Pair // len(Label_Region)], \
+		Label_Region[Pair % len(Label_Region)], \
+	]))[Code_Pair]
+
+	# The EUI of the region if the region is known and has an EUI of the class, otherwise the EUI of basic CIE coef method
+	Is_Region = (Index_Region >= 0) & (Index_Class >= 0)
+	Is_Region[Is_Region] = ~np.isnan(Dict_Table['EUI_Region'][Index_Region[Is_Region], Index_Class[Is_Region]])
+	Is_Basic  = ~Is_Region & (Index_Class >= 0)
+
+	EUI = np.full(len(df), np.nan)
+	EUI[Is_Region] = Dict_Table['EUI_Region'][Index_Region[Is_Region], Index_Class[Is_Region]]
+	EUI[Is_Basic]  = Dict_Table['EUI_Basic'][Index_Class[Is_Basic]]
+
+	df = df.assign(\
+		EUI = EUI, \
+		EUI_Source = np.where(Is_Region, 'Region', np.where(Is_Basic, 'Basic', '')), \
+		Coef_CIE = np.where(Index_CIE >= 0, Coef_CIE.to_numpy(dtype=float)[Index_CIE], np.nan), \
+	)
+	df['Electricity'] = df[Column_Area].to_numpy(dtype=float) * df['EUI'].to_numpy()
+	df['Emission']    = df['Electricity'].to_numpy() * df['Coef_CIE'].to_numpy()
+
+	return df
+
+def Calc_Group(df, Column_Country='國家/地區代號', Column_Region='區域', Column_Class='擔保品細項', Column_Area='樓地板面積'):
+
+	"""
+	Calculate the sums of each country, region and collateral class of a chunk (to be added up over the chunks).
+	"""
+
+	Dict_Key = Get_Key(df, Column_Country=Column_Country, Column_Region=Column_Region, Column_Class=Column_Class)
+	Code_Country, Label_Country = Dict_Key['Country']
+	Code_Region, Label_Region   = Dict_Key['Region']
+	Code_Class, Label_Class     = Dict_Key['Class']
+
+	# Number the groups by the codes of the keys, and sum each column with one pass
+	Group, Code_Group = np.unique((Code_Country * len(Label_Region) + Code_Region) * len(Label_Class) + Code_Class, return_inverse=True)
+
+	Dict_Sum = {}
+	for i_Column, i_Value in [(Column_Area, df[Column_Area].to_numpy(dtype=float)), ('Electricity', df['Electricity'].to_numpy()), ('Emission', df['Emission'].to_numpy())]:
+		Dict_Sum[i_Column] = np.bincount(Code_Group, weights=np.nan_to_num(i_Value), minlength=len(Group))
+	Dict_Sum['n_Asset']   = np.bincount(Code_Group, minlength=len(Group))
+	Dict_Sum['n_Missing'] = np.bincount(Code_Group, weights=np.isnan(df['Emission'].to_numpy()), minlength=len(Group)).astype(int)
+
+	return pd.DataFrame(Dict_Sum, index=pd.MultiIndex.from_arrays([\
+		Label_Country[Group // (len(Label_Region) * len(Label_Class))], \
+		Label_Region[Group // len(Label_Class) % len(Label_Region)], \
+		Label_Class[Group % len(Label_Class)], \
+	], names=[Column_Country, Column_Region, Column_Class]))
+
+def Output_Chunk(df, f, Header=True):
+
+	"""
+	Output a chunk of the assets to the open CSV file (with the CSV writer of pyarrow if available).
+	"""
+
+	if (Is_Parquet_Available):
+		pyarrow.csv.write_csv(pyarrow.Table.from_pandas(df, preserve_index=False), f, write_options=pyarrow.csv.WriteOptions(include_header=Header, quoting_style='needed'))
+	else:
+		f.write(df.to_csv(index=False, header=Header).encode('utf-8'))
+
+	return
+
+def Calc_Portfolio(Portfolio_File, Dict_Table, Coef_CIE, Output_File=None, Chunk_Size=1000000, **Columns):
+
+	"""
+	Calculate the emission of the portfolio in chunks.
+	==================================================================================================
+	Input:
+
+		Portfolio_File: The path of the portfolio CSV.
+
+		Dict_Table: The EUI tables (see Get_EUI_Table).
+
+		Coef_CIE: The carbon intensity of electricity of each country.
+
+		Output_File: The path of the per-asset output CSV (None: not output).
+
+		Chunk_Size: The number of assets read at a time.
+
+		Columns: The column names of the portfolio (see Calc_Emission).
+
+	Output:
+
+		df_Group: The sums of each country, region and collateral class.
+	"""
+
+	df_Group   = None
+	n_Asset    = 0
+	Time_Start = time.perf_counter()
+
+	f = open(Output_File, 'wb') if (Output_File is not None) else None
+	if (f is not None): f.write('\ufeff'.encode('utf-8'))
+
+	try:
+
+		for i_Chunk, df_Chunk in enumerate(pd.read_csv(Portfolio_File, chunksize=Chunk_Size, dtype={Columns.get('Column_Class', '擔保品細項'): str})):
+
+			df_Chunk = Calc_Emission(df_Chunk, Dict_Table, Coef_CIE, **Columns)
+
+			# Output the assets of the chunk, and add up the sums of the groups
+			if (f is not None): Output_Chunk(df_Chunk.round({'Electricity': 2, 'Emission': 2}), f, Header=(i_Chunk == 0))
+
+			df_Group_Chunk = Calc_Group(df_Chunk, **Columns)
+			df_Group = df_Group_Chunk if (df_Group is None) else df_Group.add(df_Group_Chunk, fill_value=0)
+
+			n_Asset += len(df_Chunk)
+			print('[Portfolio] {} assets ({:.1f}s)'.format(n_Asset, time.perf_counter() - Time_Start))
+
+	finally:
+
+		if (f is not None): f.close()
+
+	df_Group[['n_Asset', 'n_Missing']] = df_Group[['n_Asset', 'n_Missing']].astype(int)
+
+	return df_Group
+
+def Output_Group(df_Group, Output_Path, Output_File):
+
+	if not os.path.exists(Output_Path): os.makedirs(Output_Path)
+
+	df_Group.round(2).to_csv(Output_Path + Output_File, encoding='utf-8-sig')
+
+	return
+
+if (__name__ == '__main__'):
+
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
+
+	# Get configuration files
+	with open('../Config.json', 'r', encoding='utf-8') as f: config = json.load(f)
+
+	# Set the portfolio (columns: 國家/地區代號, 區域, 擔保品細項, 樓地板面積 [m2])
+	Portfolio_File = '../data/Portfolio/Portfolio.csv'
+	Output_Path    = '../output/output_data/Portfolio/'
+	if not os.path.exists(Output_Path): os.makedirs(Output_Path)
+
+	# Get EUI tables and carbon intensity of electricity
+	Dict_Table = Get_EUI_Table(List_Country=config['Method2_CountryEUI'])
+	Coef_CIE   = Get_Coef_CarbonIntensity()
+
+	# Calculate the emission of each asset and the sums of each group
+	df_Group = Calc_Portfolio(\
+		Portfolio_File, \
+		Dict_Table, \
+		Coef_CIE, \
+		Output_File=Output_Path + 'Portfolio.Emission.csv', \
+		Chunk_Size=1000000, \
+	)
+
+	# ==================================================================================================
+	# Output the sums of each country, region and collateral class
+	Output_Group(\
+		df_Group, \
+		Output_Path, \
+		'Portfolio.Emission.Group.csv', \
+	)
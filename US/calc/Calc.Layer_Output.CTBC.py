@@ -2,21 +2,27 @@
 Calc.Layer_Output.CTBC
 ======================
 Output shapefiles for CTBC EUI prediction
+With "Output_Dissolve" in Layer_Output/Config.json, the counties are dissolved into one feature per climate region
+(the EUI of a county depends only on its climate region), and the climate region of each county is output as a lookup table.
+The stages are those of the country engine (Common/Country.py), configured in Layer_Output/Country/US.json.
 """
 
-import pandas as pd
-import geopandas as gpd
-import os
+import sys
 
-def Get_Shapefile():
+sys.path.append('../..')
+from Common.Country import Get_Country_Config, Get_Group_EUI, Mapping_EUI as Mapping_Region_EUI, Get_Lookup as Get_Region_Lookup, Dissolve_Region, Get_Lookup_File, Output_Lookup, Output_Shapefile
+from Common.Geometry import Read_Level
+from Common.Output import Get_Output_Format, Get_Output_Profile, Get_Output_Dissolve
+from Common.Profiler import Profile_Stages
 
-	# Read shapefile: Building America and IECC Climate Zones by U.S. County Boundaries
-	gdf = gpd.read_file('../data/Shapefile.County/Building_America_and_IECC_Climate_Zones_by_US_County_Boundaries.shp')
+# The configuration of US in the country engine (the climate region of each IECC climate zone)
+Config_Country = Get_Country_Config('US')
 
-	# Simplify the geometry
-	gdf['geometry'] = gdf['geometry'].simplify(0.001, preserve_topology=True)
+def Get_Shapefile(Tolerance=0.001):
 
-	# Remove unnecessary columns
+	# Read shapefile: Building America and IECC Climate Zones by U.S. County Boundaries
+	# The geometry is simplified at the tolerance (cached in the geometry pyramid), only the necessary columns are read
+	gdf = Read_Level('../data/Shapefile.County/Building_America_and_IECC_Climate_Zones_by_US_County_Boundaries.shp', 'County', Tolerance=Tolerance, Columns=['NAME', 'STATE_NAME', 'IECC_Clima', 'IECC_Moist'])
 	gdf = gdf[['NAME', 'STATE_NAME', 'IECC_Clima', 'IECC_Moist', 'geometry']]
 	
 	# Create REGNAME (region name) column
@@ -24,7 +30,7 @@ def Get_Shapefile():
 	del gdf['STATE_NAME'], gdf['NAME']
 
 	# Create COUNTRYNAME (ISO 3166-1 alpha-2 code + country name) column
-	gdf.insert(0, 'COUNTRY', 'US-美國')
+	gdf.insert(0, 'COUNTRY', Config_Country['Country'])
 
 	# Create CLIMATEZONE column by combining IECC_Clima and IECC_Moist
 	gdf['IECC_Moist'] = gdf['IECC_Moist'].str.replace('N/A', '')
@@ -33,65 +39,36 @@ def Get_Shapefile():
 
 	return gdf
 
-def Get_Group_EUI():
-
-	# Get CTBC space-class and collateral-class data
-	df_Mapping_SpaceClass      = pd.read_csv('../output/output_data/Mapping.CTBC/Mapping.CTBC.Space.Mean.csv')
-	df_Mapping_CollateralClass = pd.read_csv('../output/output_data/Mapping.CTBC/Mapping.CTBC.Collateral.Mean.csv')
-
-	# Filter the data
-	df_Mapping_SpaceClass      = df_Mapping_SpaceClass[df_Mapping_SpaceClass['建物用途']=='全部平均'].drop(columns=['使用空間名稱', '建物用途'])
-	df_Mapping_CollateralClass = df_Mapping_CollateralClass[df_Mapping_CollateralClass['使用空間名稱']=='全部平均'].drop(columns=['細項名稱', '使用空間名稱'])
-	df_Mapping_CollateralClass['擔保品細項'] = df_Mapping_CollateralClass['擔保品細項'].astype(str).str.zfill(2)
-
-	# Transpose the data can concatenate along the column
-	df_Mapping_SpaceClass['空間代號']        = 'EUI_' + df_Mapping_SpaceClass['空間代號']
-	df_Mapping_CollateralClass['擔保品細項'] = 'EUI_' + df_Mapping_CollateralClass['擔保品細項']
-
-	df_EUI = pd.concat([df_Mapping_SpaceClass.set_index('空間代號').T, df_Mapping_CollateralClass.set_index('擔保品細項').T], axis=1)
-
-	return df_EUI
-
 def Mapping_EUI(gdf_County, df_Group_EUI):
-	
-	# Set county mapping function
-	def Mapping_County(IECC_ClimateZone):
 
-		if (IECC_ClimateZone in ['1A', '2A', '3A']): ClimateZone = '溼熱氣候區'
-		elif (IECC_ClimateZone in ['2B', '3B']): ClimateZone = '乾熱氣候區'
-		elif (IECC_ClimateZone in ['3C']): ClimateZone = '海洋性熱氣候區'
-		elif (IECC_ClimateZone in ['4A']): ClimateZone = '溼混合氣候區'
-		elif (IECC_ClimateZone in ['4B']): ClimateZone = '乾混合氣候區'
-		elif (IECC_ClimateZone in ['4C']): ClimateZone = '海洋性混合氣候區'
-		elif (IECC_ClimateZone in ['5A', '6A']): ClimateZone = '溼冷氣候區'
-		elif (IECC_ClimateZone in ['5B', '6B']): ClimateZone = '乾冷氣候區'
-		elif (IECC_ClimateZone in ['7', '8']): ClimateZone = '乾冷氣候區'
+	# Attach the EUI of the climate region of each county (the CLIMATEZONE column is removed)
+	return Mapping_Region_EUI(gdf_County, df_Group_EUI, Config_Country)
 
-		return ClimateZone
+def Get_Lookup(gdf_County):
 
-	for i_Column in df_Group_EUI.columns: gdf_County[i_Column] = gdf_County.apply(lambda x: df_Group_EUI.loc['EUI_'+Mapping_County(x['CLIMATEZONE']), i_Column], axis=1)
+	# The climate region of each county (the counties of the IECC climate zones without climate region are left empty)
+	return Get_Region_Lookup(gdf_County, Config_Country)
 
-	# Remove unnecessary columns
-	gdf_County = gdf_County.drop(columns=['CLIMATEZONE'])
-	
-	return gdf_County
+def Dissolve_County(gdf_County, df_Lookup, gs_Region=None):
 
-def Output_Shapefile(gdf, Output_Path, Output_Name):
+	# Dissolve the counties into one feature per climate region (see Dissolve_Region)
+	return Dissolve_Region(gdf_County, df_Lookup, Config_Country, gs_Region=gs_Region)
 
-	# Set output path
-	if not os.path.exists(Output_Path):	os.makedirs(Output_Path)
+if (__name__ == '__main__'):
 
-	# Round the number columns to 1 digits
-	gdf = gdf.round(1)
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
 
-	gdf.to_file(Output_Path + Output_Name, encoding='utf-8')
+	# Get the output format (and whether to output the profile table) selected in Config.json
+	Output_Format = Get_Output_Format()
+	Output_Profile = Get_Output_Profile()
 
-	return
-
-if (__name__ == '__main__'):
+	# Get whether the counties are dissolved into the climate regions, selected in Config.json
+	Output_Dissolve = Get_Output_Dissolve()
 
 	# Read shapefile
 	gdf_County = Get_Shapefile()
+	df_Lookup  = Get_Lookup(gdf_County)
 
 	# Get group EUI
 	df_Group_EUI = Get_Group_EUI()
@@ -99,10 +76,19 @@ if (__name__ == '__main__'):
 	# Mapping the attributes of each prefecture to the EUI table
 	gdf_County = Mapping_EUI(gdf_County, df_Group_EUI)
 
+	# Dissolve the counties into the climate regions, and output the climate region of each county
+	# (the lookup table of a previous dissolved output is removed otherwise)
+	Lookup_File = Get_Lookup_File('../output/output_result/Shapefile/EUI.Prediction.CTBC.Global/', 'EUI.Prediction.CTBC.Global.US-美國.shp')
+
+	if (Output_Dissolve): gdf_County = Dissolve_County(gdf_County, df_Lookup)
+	Output_Lookup(df_Lookup if (Output_Dissolve) else None, Lookup_File)
+
 	# ==================================================================================================
-	# Output geopandas dataframe to shape file
+	# Output geopandas dataframe to shape file (or the output format selected in Config.json)
 	Output_Shapefile(\
 		gdf_County, \
 		'../output/output_result/Shapefile/EUI.Prediction.CTBC.Global/', \
 		'EUI.Prediction.CTBC.Global.US-美國.shp', \
+		Output_Format=Output_Format, \
+		Output_Profile=Output_Profile, \
 	)
\ No newline at end of file
@@ -4,29 +4,70 @@ calc.EUI.ClimateAdjusted.py
 Calculate the climate adjusted EUI for a building.
 1. Calibrate climate statistical EUI (Fonseca et al., 2020) to Energy Star EUI, yielding a climate adjusted EUI for 8 climate zones.
 2. Calculate the commercial-to-residential EUI ratio for each climate zone, and apply to the climate adjusted EUI to yield a residential EUI.
+3. The normalized EUI of all projection years can be calculated in one pass (Year x Sector x Zone factor table), yielding one output file per year.
 """
 
 import numpy as np
 import pandas as pd
 import os
+import sys
 from string import ascii_uppercase
 
-def Get_EUI_ClimateStatistical():
+sys.path.append('../..')
+from Common.Cache import Read_Cached
+from Common.Reader import Read_Table
+from Common.Profiler import Profile_Stages
 
-	df_EUI_ClimateStatistical = pd.read_csv('../data/EUI_ClimateAdjusted/EUI_CliamteProjection.csv')[['Sector', 'Zone', 'EUI [kWh/m2.yr] (% growth) 2010']]
+def Get_EUI_ClimateStatistical(List_Year=['2010'], Use_Cache=False):
 
-	# Convert data format of EUI
-	df_EUI_ClimateStatistical['EUI [kWh/m2.yr] (% growth) 2010'] = df_EUI_ClimateStatistical['EUI [kWh/m2.yr] (% growth) 2010'].str.split(' ').str[0].astype(float)
-	df_EUI_ClimateStatistical = df_EUI_ClimateStatistical.rename(columns={'EUI [kWh/m2.yr] (% growth) 2010': 'EUI'})
+	"""
+	Get the climate statistical EUI of the projection years.
+	===========================
+	Input:
+
+		List_Year (list): The projection years to be read (None: all years in the file)
+
+		Use_Cache (bool): Reuse the cleaned data cached as Parquet until the source file changes
+
+	Output:
+
+		df_EUI_ClimateStatistical (DataFrame): EUI for each year, sector and climate zone
+	"""
+
+	if (Use_Cache): return Read_Cached(Read_EUI_ClimateStatistical, '../data/EUI_ClimateAdjusted/EUI_CliamteProjection.csv', 'EUI_ClimateStatistical', List_Year=List_Year)
+
+	return Read_EUI_ClimateStatistical('../data/EUI_ClimateAdjusted/EUI_CliamteProjection.csv', List_Year=List_Year)
+
+def Read_EUI_ClimateStatistical(File_Path, List_Year=['2010']):
+
+	# Read only the sector, the zone and the EUI column of each projection year
+	df_EUI_ClimateStatistical = Read_Table(File_Path, Columns=lambda i: (i in ['Sector', 'Zone']) or (i.startswith('EUI [kWh/m2.yr] (% growth) ') and ((List_Year is None) or (i.split(' ')[-1] in [str(k) for k in List_Year]))))
+
+	# Get the EUI column of each projection year
+	Dict_Column = {i: i.split(' ')[-1] for i in df_EUI_ClimateStatistical.columns if i.startswith('EUI [kWh/m2.yr] (% growth) ')}
 
 	# Fill the first column
-	df_EUI_ClimateStatistical['Sector'] = df_EUI_ClimateStatistical['Sector'].fillna(method='ffill')
+	df_EUI_ClimateStatistical['Sector'] = df_EUI_ClimateStatistical['Sector'].ffill()
+
+	# Convert to long format (one row per year, sector and climate zone)
+	df_EUI_ClimateStatistical = df_EUI_ClimateStatistical[['Sector', 'Zone'] + list(Dict_Column.keys())].rename(columns=Dict_Column)
+	df_EUI_ClimateStatistical = df_EUI_ClimateStatistical.melt(id_vars=['Sector', 'Zone'], var_name='Year', value_name='EUI')
+
+	# Convert data format of EUI (keep the leading number, drop "(% growth)" and the confidence interval)
+	df_EUI_ClimateStatistical['EUI'] = df_EUI_ClimateStatistical['EUI'].str.split(' ').str[0].astype(float)
+	df_EUI_ClimateStatistical = df_EUI_ClimateStatistical[['Year', 'Sector', 'Zone', 'EUI']]
 
 	return df_EUI_ClimateStatistical
 
-def Get_EUI_EnergyStar():
+def Get_EUI_EnergyStar(Use_Cache=False):
+
+	if (Use_Cache): return Read_Cached(Read_EUI_EnergyStar, '../data/EUI_EnergyStar/EUI_EnergyStar.csv', 'EUI_EnergyStar')
+
+	return Read_EUI_EnergyStar('../data/EUI_EnergyStar/EUI_EnergyStar.csv')
+
+def Read_EUI_EnergyStar(File_Path):
 
-	df_EUI_EnergyStar = pd.read_csv('../data/EUI_EnergyStar/EUI_EnergyStar.csv')[['Market Sector', 'Property type', 'Site EUI (kBtu/ft2)']]
+	df_EUI_EnergyStar = Read_Table(File_Path, Columns=['Market Sector', 'Property type', 'Site EUI (kBtu/ft2)'])[['Market Sector', 'Property type', 'Site EUI (kBtu/ft2)']]
 
 	# Convert unit from kBtu/ft2 to kWh/m2
 	df_EUI_EnergyStar['EUI'] = df_EUI_EnergyStar['Site EUI (kBtu/ft2)'] * 3.15459
@@ -48,11 +89,33 @@ def Calc_NormalizedEUI(df_EUI_ClimateStatistical):
 		df_EUI_ClimateStatistical (DataFrame): The original dataframe with new normalized EUI for each climate zone
 	"""
 
-	df_EUI_ClimateStatistical['EUI_Normalized'] = df_EUI_ClimateStatistical.apply(lambda x: x['EUI'] / df_EUI_ClimateStatistical[df_EUI_ClimateStatistical['Sector']==x['Sector']].mean(numeric_only=True)['EUI'], axis=1)
+	# Divide by the mean EUI of the same year and sector in one grouped pass
+	df_EUI_ClimateStatistical['EUI_Normalized'] = df_EUI_ClimateStatistical['EUI'] / df_EUI_ClimateStatistical.groupby(['Year', 'Sector'])['EUI'].transform('mean')
 
 	return df_EUI_ClimateStatistical
 
-def Calc_Adjusted(df_EUI_ClimateAdjusted, df_EUI_ClimateStatistical):
+def Calc_Factor(df_EUI_ClimateStatistical):
+
+	"""
+	Arrange the normalized EUI as a factor table.
+	===========================
+	Input:
+		
+		df_EUI_ClimateStatistical (DataFrame): Normalized EUI for each year, sector and climate zone
+	
+	Output:
+		
+		df_Factor (DataFrame): Normalized EUI with (Year, Sector) as index and climate zones as columns
+	"""
+
+	# Zones are kept in the order of appearance
+	List_Zone = df_EUI_ClimateStatistical['Zone'].unique()
+	df_Factor = df_EUI_ClimateStatistical.pivot_table(index=['Year', 'Sector'], columns='Zone', values='EUI_Normalized', aggfunc='first')[List_Zone]
+	df_Factor.columns.name = None
+
+	return df_Factor
+
+def Calc_Adjusted(df_EUI_ClimateAdjusted, df_Factor):
 
 	"""
 	Calculate the climate adjusted EUI for each climate zone.
@@ -61,37 +124,41 @@ def Calc_Adjusted(df_EUI_ClimateAdjusted, df_EUI_ClimateStatistical):
 		
 		df_EUI_ClimateAdjusted (DataFrame): EUI for each building
 		
-		df_EUI_ClimateStatistical (DataFrame): EUI for each climate zone
+		df_Factor (DataFrame): Normalized EUI of one year with sectors as index and climate zones as columns
 	
 	Output:
 		
 		df_EUI_ClimateAdjusted (DataFrame): The original dataframe with new climate adjusted EUI for each climate zone
 	"""
 
-	for i_Zone in df_EUI_ClimateStatistical['Zone'].unique():
-		
-		# Calculate the climate adjusted EUI for each climate zone
-		df_EUI_ClimateAdjusted['EUI_{}'.format(i_Zone)] = df_EUI_ClimateAdjusted.apply(lambda x: x['EUI'] * df_EUI_ClimateStatistical.loc[(df_EUI_ClimateStatistical['Sector']=='Commercial')&(df_EUI_ClimateStatistical['Zone']==i_Zone), 'EUI_Normalized'].values[0], axis=1)
+	# Pick the residential factors for "Lodging/Residential" and the commercial factors for the others
+	Sector = np.where(df_EUI_ClimateAdjusted['Market Sector']=='Lodging/Residential', 'Residential', 'Commercial')
+	Array_Factor = df_Factor.to_numpy()[df_Factor.index.get_indexer(Sector)]
 
-		# Calculate the residential EUI for each climate zone
-		df_EUI_ClimateAdjusted.loc[df_EUI_ClimateAdjusted['Market Sector']=='Lodging/Residential', 'EUI_{}'.format(i_Zone)] = df_EUI_ClimateAdjusted.apply(lambda x: x['EUI'] * df_EUI_ClimateStatistical.loc[(df_EUI_ClimateStatistical['Sector']=='Residential')&(df_EUI_ClimateStatistical['Zone']==i_Zone), 'EUI_Normalized'].values[0], axis=1)
+	# Calculate the climate adjusted EUI for all buildings and climate zones at once
+	Array_EUI = df_EUI_ClimateAdjusted['EUI'].to_numpy()[:, np.newaxis] * Array_Factor
+	df_EUI_ClimateAdjusted = pd.concat([\
+		df_EUI_ClimateAdjusted, \
+		pd.DataFrame(Array_EUI, index=df_EUI_ClimateAdjusted.index, columns=['EUI_{}'.format(i_Zone) for i_Zone in df_Factor.columns]), \
+	], axis=1)
 
 	# Remove the original EUI column
 	df_EUI_ClimateAdjusted = df_EUI_ClimateAdjusted.drop(columns=['EUI'])
 
 	return df_EUI_ClimateAdjusted
 
-def Output_File(Data, Output_Language='English'):
+def Format_File(Data, Output_Language='English'):
 
 	"""
-	Output the data to csv file.
+	Format the data as written to the output file (translated, renamed, indexed and rounded to 2 digits).
 	===========================
 	Input:
 		Data (DataFrame): The data to be output
 		Output_Language (str): The language of the output file
+	Output:
+		Data (DataFrame): The formatted data
 	"""
 
-	# Output the data to csv file
 	if (Output_Language == 'Chinese'):
 		
 		# Translate the market sector
@@ -189,26 +256,70 @@ def Output_File(Data, Output_Language='English'):
 	# Rearrange the last columns to the first columns
 	Data = Data[Data.columns[-1:].tolist() + Data.columns[:-1].tolist()]
 
+	return Data.round(2)
+
+def Output_File(Data, Output_Language='English', Output_File='EUI_ClimateAdjusted.csv'):
+
+	"""
+	Output the data to csv file.
+	===========================
+	Input:
+		Data (DataFrame): The data to be output
+		Output_Language (str): The language of the output file
+		Output_File (str): The name of the output file
+	"""
+
 	# Save the data
 	Output_Path = '../output/output_data/EUI_ClimateAdjusted/'
-	Output_File = 'EUI_ClimateAdjusted.csv'
 	if not os.path.exists(Output_Path):	os.makedirs(Output_Path)
-	Data.round(2).to_csv(Output_Path + Output_File, index=False, encoding='utf-8-sig')
+	Format_File(Data, Output_Language=Output_Language).to_csv(Output_Path + Output_File, index=False, encoding='utf-8-sig')
+
+def Output_Factor(df_Factor):
+
+	"""
+	Output the factor table (normalized EUI of each year, sector and climate zone) to csv file.
+	===========================
+	Input:
+		df_Factor (DataFrame): The factor table
+	"""
+
+	Output_Path = '../output/output_data/EUI_ClimateAdjusted/'
+	Output_File = 'EUI_ClimateFactor.csv'
+	if not os.path.exists(Output_Path):	os.makedirs(Output_Path)
+	df_Factor.round(4).to_csv(Output_Path + Output_File, encoding='utf-8-sig')
+
+	return
 
 if (__name__ == '__main__'):
 
+	# Instrument the stages of the script (run report in output_log, see Common/Profiler.py)
+	Profile_Stages(globals())
+
+	# Set the base year (output to EUI_ClimateAdjusted.csv) and the projection years (None: all years in the file)
+	Base_Year = '2010'
+	List_Year = [Base_Year]
+
 	# Get data
-	df_EUI_ClimateStatistical = Get_EUI_ClimateStatistical()
-	df_EUI_EnergyStar         = Get_EUI_EnergyStar()
+	df_EUI_ClimateStatistical = Get_EUI_ClimateStatistical(List_Year=List_Year, Use_Cache=True)
+	df_EUI_EnergyStar         = Get_EUI_EnergyStar(Use_Cache=True)
 
 	# Calculate normalized EUI for climate zones relative to mean EUI (divided by mean EUI)
 	df_EUI_ClimateStatistical = Calc_NormalizedEUI(df_EUI_ClimateStatistical)
 
-	# Create new dataframe for all climate adjusted EUI
-	df_EUI_ClimateAdjusted = df_EUI_EnergyStar.copy()
+	# Arrange the normalized EUI as a Year x Sector x Zone factor table
+	df_Factor = Calc_Factor(df_EUI_ClimateStatistical)
+
+	for i_Year in df_Factor.index.get_level_values('Year').unique():
+
+		# Calculate climate adjusted EUI for each climate zone
+		df_EUI_ClimateAdjusted = Calc_Adjusted(df_EUI_EnergyStar.copy(), df_Factor.loc[i_Year])
 
-	# Calculate climate adjusted EUI for each climate zone
-	df_EUI_ClimateAdjusted = Calc_Adjusted(df_EUI_ClimateAdjusted, df_EUI_ClimateStatistical)
+		# Save output
+		Output_File(\
+			df_EUI_ClimateAdjusted, \
+			Output_Language='Chinese', \
+			Output_File='EUI_ClimateAdjusted.csv' if (i_Year == Base_Year) else 'EUI_ClimateAdjusted.{}.csv'.format(i_Year), \
+		)
 
-	# Save output
-	Output_File(df_EUI_ClimateAdjusted, Output_Language='Chinese')
\ No newline at end of file
+	# Save the factor table
+	Output_Factor(df_Factor)